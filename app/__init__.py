@@ -1,2 +1,108 @@
 # This file makes the app directory a Python package
-# Import necessary modules to make them available when importing the app package
\ No newline at end of file
+import importlib
+import os
+
+from flask import Flask
+
+from app.config import BASE_DIR, Config
+from app.services.database import is_memory_database
+
+# (module, blueprint attribute, url prefix); imported when an app is created
+BLUEPRINTS = [
+    ('app.controllers.user_controller', 'user_bp', '/user'),
+    ('app.controllers.student_controller', 'student_bp', '/student'),
+    ('app.controllers.class_controller', 'class_bp', '/class'),
+    ('app.controllers.attendance_controller', 'attendance_bp', '/attendance'),
+    ('app.controllers.exam_controller', 'exam_bp', '/exam'),
+    ('app.controllers.message_controller', 'message_bp', '/message'),
+    ('app.controllers.assignment_controller', 'assignment_bp', '/assignment'),
+    ('app.controllers.announcement_controller', 'announcement_bp', '/announcement'),
+    ('app.controllers.common_controller', 'common_bp', '/common'),
+    ('app.controllers.teacher_controller', 'teacher_bp', '/teacher'),
+    ('app.controllers.parent_controller', 'parent_bp', '/parent'),
+]
+
+# Used instead of the file-backed stores for TESTING apps and in-memory databases
+EPHEMERAL_DEFAULTS = {
+    'SESSION_TYPE': 'memory',
+    'SESSION_SWEEP_INTERVAL': 0,
+    'REALTIME_BUS': 'memory',
+    'REPORT_JOBS_BACKEND': 'memory',
+}
+
+
+def _apply_config(app, config):
+    if isinstance(config, dict):
+        app.config.update(config)
+    elif config is not None:
+        app.config.from_object(config)
+
+
+def create_app(config=None):
+    """Build the Flask app.
+
+    ``config`` may be a mapping or a config object; its values override
+    :class:`app.config.Config`. No database work happens here: tables and the
+    default admin are created with ``flask init-db`` / ``flask seed-admin``.
+    With ``TESTING`` set or an in-memory database, sessions and real-time
+    events default to in-process stores (see ``EPHEMERAL_DEFAULTS``).
+    """
+    app = Flask(
+        'main',
+        root_path=BASE_DIR,
+        instance_path=os.path.join(BASE_DIR, 'instance'),
+        template_folder='app/templates',
+        static_folder='app/static',
+    )
+    app.config.from_object(Config)
+    _apply_config(app, config)
+    if app.config.get('TESTING') or is_memory_database(app.config['SQLALCHEMY_DATABASE_URI']):
+        # Tests and one-off scripts keep sessions and real-time events in
+        # process, so building an app leaves no files or threads behind;
+        # values passed in ``config`` still win
+        app.config.update(EPHEMERAL_DEFAULTS)
+        _apply_config(app, config)
+
+    # Ensure directories exist
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    if app.config['SESSION_TYPE'] == 'filesystem':
+        os.makedirs(app.config['SESSION_FILE_DIR'], exist_ok=True)
+
+    # Initialize extensions
+    from app.extensions import bcrypt, csrf, login_manager
+    from app.services.database import configure_database
+    from app.services.exam_stats import exam_stats_cache
+    from app.services.identity import identity_cache
+    from app.services.messaging import contacts_cache
+    from app.services.rankings import rankings_cache
+    from app.services.report_cache import report_cache
+    from app.services.report_cards import report_card_cache, report_jobs
+    from app.services.presence import last_seen_buffer
+    from app.services.realtime import realtime
+    from app.services.sessions import init_sessions
+
+    configure_database(app)
+    bcrypt.init_app(app)
+    csrf.init_app(app)
+    init_sessions(app)
+    last_seen_buffer.init_app(app)
+    identity_cache.init_app(app)
+    exam_stats_cache.init_app(app)
+    rankings_cache.init_app(app)
+    report_card_cache.init_app(app)
+    report_jobs.init_app(app)
+    report_cache.init_app(app)
+    contacts_cache.init_app(app)
+    login_manager.init_app(app)
+    realtime.init_app(app)
+
+    # Core pages, blueprints and CLI commands
+    from app import cli
+    from app.controllers import main_controller
+    main_controller.init_app(app)
+    for module_name, attribute, url_prefix in BLUEPRINTS:
+        blueprint = getattr(importlib.import_module(module_name), attribute)
+        app.register_blueprint(blueprint, url_prefix=url_prefix)
+    cli.init_app(app)
+
+    return app
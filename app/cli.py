@@ -0,0 +1,122 @@
+# Database management commands: flask --app main <command>
+from datetime import datetime
+
+import click
+from flask import current_app
+
+from app.extensions import bcrypt
+from app.models.models import db, User, Admin
+
+
+def seed_admin(email, password):
+    """Create the default admin account if there are no users. Returns it or None."""
+    if User.query.count() > 0:
+        return None
+
+    hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+    admin = User(
+        full_name='Admin User',
+        email=email,
+        password=hashed_password,
+        role='admin',
+        created_at=datetime.now()
+    )
+    db.session.add(admin)
+    db.session.flush()
+
+    admin_profile = Admin(user_id=admin.id, admin_id='ADM001', department='Administration')
+    db.session.add(admin_profile)
+    db.session.commit()
+    return admin
+
+
+@click.command('init-db')
+@click.option('--seed/--no-seed', default=True, help='Also create the default admin account.')
+def init_db_command(seed):
+    """Create all tables and indexes (idempotent)."""
+    _migrate_indexes()
+    click.echo('Database tables and indexes are up to date.')
+    if seed:
+        _seed_admin()
+
+
+@click.command('seed-admin')
+def seed_admin_command():
+    """Create the default admin account when the database has no users."""
+    _seed_admin()
+
+
+def _migrate_indexes(dedupe=False):
+    from app.services.migrations import DuplicateRowsError, migrate_indexes
+    try:
+        created, deleted = migrate_indexes(dedupe=dedupe)
+    except DuplicateRowsError as exc:
+        for table, index, groups in exc.conflicts:
+            click.echo(f'{table}: {len(groups)} groups of duplicate rows block {index}', err=True)
+            for values, ids in groups:
+                click.echo(f"  ({', '.join(map(str, values))}): ids {ids}", err=True)
+        raise click.ClickException(
+            'Nothing was changed. Resolve the duplicates, or run `migrate-indexes --dedupe` '
+            'to keep the newest row of each group and delete the others.'
+        )
+    for table, ids in deleted.items():
+        click.echo(f'Deleted {len(ids)} duplicate rows from {table}: ids {ids}')
+    return created
+
+
+@click.command('migrate-indexes')
+@click.option('--dedupe', is_flag=True,
+              help='Delete duplicate rows (keeping the newest) that block a unique index.')
+def migrate_indexes_command(dedupe):
+    """Add the indexes declared on the models to an existing database."""
+    created = _migrate_indexes(dedupe)
+    if created:
+        for name in created:
+            click.echo(f'Created index {name}')
+    else:
+        click.echo('All indexes are up to date.')
+
+
+@click.command('rebuild-attendance-summary')
+def rebuild_attendance_summary_command():
+    """Recompute the monthly attendance rollup from the attendance table."""
+    from app.services.attendance import rebuild_monthly_summaries
+    written = rebuild_monthly_summaries()
+    db.session.commit()
+    click.echo(f'Rebuilt {written} monthly attendance summaries.')
+
+
+@click.command('rebuild-attendance-archive')
+def rebuild_attendance_archive_command():
+    """Re-pack the yearly bit-packed attendance archive from the attendance table."""
+    from app.services.attendance_archive import rebuild_archives
+    written = rebuild_archives()
+    db.session.commit()
+    click.echo(f'Rebuilt {written} attendance archives.')
+
+
+@click.command('repair-unread-counters')
+def repair_unread_counters_command():
+    """Recompute every user's unread message counter from the messages table."""
+    from app.services.messaging import rebuild_unread_counters
+    written = rebuild_unread_counters()
+    db.session.commit()
+    click.echo(f'Rebuilt unread counters for {written} users.')
+
+
+def _seed_admin():
+    email = current_app.config['DEFAULT_ADMIN_EMAIL']
+    admin = seed_admin(email, current_app.config['DEFAULT_ADMIN_PASSWORD'])
+    if admin:
+        click.echo(f'Created default admin {email}')
+    else:
+        click.echo('Users already exist; no admin created.')
+
+
+def init_app(app):
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(seed_admin_command)
+    app.cli.add_command(migrate_indexes_command)
+    app.cli.add_command(rebuild_attendance_summary_command)
+    app.cli.add_command(rebuild_attendance_archive_command)
+    app.cli.add_command(repair_unread_counters_command)
@@ -0,0 +1,84 @@
+import os
+from datetime import timedelta
+
+# Repository root; templates, static files and instance/ live relative to it
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Config:
+    SECRET_KEY = 'your-super-secret-key-change-in-production-2024'
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///school_management.db'
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # SQLite engine profile: 'production' (WAL, synchronous=NORMAL, mmap, ...) or 'default'
+    SQLITE_PROFILE = 'production'
+    SQLITE_PRAGMAS = {}  # per-pragma overrides, e.g. {'busy_timeout': 10000}
+    SQLITE_POOL_SIZE = 5  # connections kept open per worker
+    SQLITE_MAX_OVERFLOW = 10
+    DB_BUSY_RETRIES = 3  # retries for writes that still hit "database is locked"
+    UPLOAD_FOLDER = os.path.join(BASE_DIR, 'app/static/uploads')
+
+    # Session configuration for persistent login
+    # SESSION_TYPE: 'sqlite' (default), 'memory' (single-process dev) or any Flask-Session type
+    SESSION_TYPE = 'sqlite'
+    SESSION_SQLITE_PATH = os.path.join(BASE_DIR, 'instance', 'sessions.db')
+    SESSION_FILE_DIR = os.path.join(BASE_DIR, 'instance', 'sessions')
+    SESSION_SWEEP_INTERVAL = 600  # seconds between expired-session sweeps
+    SESSION_TOUCH_INTERVAL = 3600  # unmodified sessions extend their expiry at most this often
+    SESSION_PERMANENT = True
+    PERMANENT_SESSION_LIFETIME = timedelta(days=30)  # 30 days persistent login
+    SESSION_USE_SIGNER = True
+    SESSION_KEY_PREFIX = 'school_management:'
+
+    # Presence tracking: last_seen is buffered in memory and written in bulk
+    LAST_SEEN_STALENESS = 60  # seconds a last_seen value may lag
+    LAST_SEEN_FLUSH_INTERVAL = 30  # seconds between bulk writes
+    LAST_SEEN_FLUSH_SIZE = 200  # flush early once this many users are pending
+
+    # Per-worker cache of logged-in users and their role profiles
+    IDENTITY_CACHE_TTL = 300  # seconds; edits in other workers show up after this
+    IDENTITY_CACHE_SIZE = 5000
+
+    # Cached per-exam statistics (exam detail page and stats JSON)
+    EXAM_STATS_CACHE_TTL = 300
+    EXAM_STATS_CACHE_SIZE = 1000
+
+    # Per-class exam and term leaderboards
+    RANKINGS_CACHE_TTL = 600
+    RANKINGS_CACHE_SIZE = 500
+
+    # Messages: conversation page size ("load older" fetches the next page) and the cached sidebar directory
+    MESSAGE_PAGE_SIZE = 50
+    CONTACTS_CACHE_TTL = 60  # seconds; new users and online dots show up after this
+    CONTACTS_CACHE_SIZE = 1
+
+    # Real-time pushes over Socket.IO (needs flask-socketio; pages work without it)
+    REALTIME_ENABLED = True
+    REALTIME_BUS = 'sqlite'  # fan-out between workers through REALTIME_SQLITE_PATH, or 'memory' for one process
+    REALTIME_SQLITE_PATH = os.path.join(BASE_DIR, 'instance', 'realtime.db')
+    REALTIME_POLL_INTERVAL = 0.5  # seconds between bus reads in each worker
+    REALTIME_EVENT_TTL = 300  # seconds events are kept on the bus
+
+    # Rows per page in list views (keyset pagination, ?per_page= up to 100)
+    LIST_PAGE_SIZE = 25
+
+    # Batch PDF report cards: render processes per web worker (0 or 1 renders in-process)
+    REPORT_CARD_WORKERS = min(4, os.cpu_count() or 1)
+    REPORT_CARD_CACHE_TTL = 3600  # rendered cards kept per student while their data is unchanged
+    REPORT_CARD_CACHE_SIZE = 2000
+    REPORT_JOBS_BACKEND = 'sqlite'  # progress shared by all workers through REPORT_JOBS_SQLITE_PATH, or 'memory'
+    REPORT_JOBS_SQLITE_PATH = os.path.join(BASE_DIR, 'instance', 'report_jobs.db')
+    REPORT_JOBS_TTL = 3600  # how long batch progress stays available
+    REPORT_JOBS_SIZE = 200  # jobs kept by the 'memory' backend
+
+    # Single-student report downloads, keyed by the student's data version
+    REPORT_CACHE_BACKEND = 'memory'  # or 'disk' to share files under REPORT_CACHE_DIR between workers
+    REPORT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+    REPORT_CACHE_DIR = os.path.join(BASE_DIR, 'instance', 'report_cache')
+
+    # Grade bands, lowest first: (minimum %, letter, GPA points, badge colour, dashboard tier).
+    # Leave unset to use app.services.grading.DEFAULT_GRADE_SCALE.
+    # GRADE_SCALE = [(0, 'F', 0.0, 'danger', 'poor'), (50, 'D', 1.0, 'warning', 'poor'), ...]
+
+    # Account created by `flask seed-admin`
+    DEFAULT_ADMIN_EMAIL = 'admin@school.com'
+    DEFAULT_ADMIN_PASSWORD = 'admin123'
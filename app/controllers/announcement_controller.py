@@ -1,10 +1,19 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from datetime import datetime
-from app.models.models import db, Announcement, Class, Student
+from app.models.models import db, Announcement, Class
+from app.services.identity import get_profile
+from app.services.pagination import paginate
+from app.services.realtime import publish_announcement
+from sqlalchemy.orm import joinedload
 
 announcement_bp = Blueprint('announcement', __name__)
 
+ANNOUNCEMENT_SORTS = {
+    'created': (Announcement.created_at, 'desc'),
+    'title': (Announcement.title, 'asc'),
+}
+
 @announcement_bp.route('/announcement', methods=['GET'])
 @login_required
 def list():
@@ -12,22 +21,24 @@ def list():
     # Determine class filter for students/parents
     class_ids = []
     if role == 'student':
-        student = Student.query.filter_by(user_id=current_user.id).first()
+        student = get_profile()
         if student and student.class_id:
             class_ids = [student.class_id]
     # For simplicity, parents see role-targeted and all announcements
-    query = Announcement.query
-    if role in ['admin', 'teacher']:
+    query = Announcement.query.options(joinedload(Announcement.class_rel))
+    if role not in ['admin', 'teacher']:
         # Admins/teachers see all
-        announcements = query.order_by(Announcement.created_at.desc()).all()
-    else:
-        announcements = query.filter(
+        query = query.filter(
             (Announcement.audience_role == 'all') | (Announcement.audience_role == role)
-        ).order_by(Announcement.created_at.desc()).all()
+        )
         if class_ids:
-            announcements = [a for a in announcements if (a.class_id in class_ids) or (a.class_id is None)]
+            query = query.filter(Announcement.class_id.in_(class_ids) | Announcement.class_id.is_(None))
+    search = request.args.get('q', '').strip()
+    if search:
+        query = query.filter(Announcement.title.ilike(f'%{search}%'))
 
-    return render_template('announcement/list.html', announcements=announcements)
+    page = paginate(query, ANNOUNCEMENT_SORTS, Announcement.id, 'created')
+    return render_template('announcement/list.html', announcements=page, page=page)
 
 @announcement_bp.route('/announcement/create', methods=['GET', 'POST'])
 @login_required
@@ -56,6 +67,7 @@ def create():
             )
             db.session.add(ann)
             db.session.commit()
+            publish_announcement(ann, current_user.full_name)
             flash('Announcement published', 'success')
             return redirect(url_for('announcement.list'))
 
@@ -1,10 +1,18 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from datetime import datetime
-from app.models.models import db, Assignment, Class, Subject, Student
+from app.models.models import db, Assignment, Class, Subject
+from app.services.identity import get_profile
+from app.services.pagination import paginate
+from sqlalchemy.orm import joinedload
 
 assignment_bp = Blueprint('assignment', __name__)
 
+ASSIGNMENT_SORTS = {
+    'created': (Assignment.created_at, 'desc'),
+    'due': (Assignment.due_date, 'asc'),
+}
+
 @assignment_bp.route('/assignment/manage', methods=['GET', 'POST'])
 @login_required
 def manage():
@@ -40,8 +48,17 @@ def manage():
             flash('Assignment created successfully', 'success')
             return redirect(url_for('assignment.manage'))
 
-    assignments = Assignment.query.order_by(Assignment.created_at.desc()).all()
-    return render_template('assignment/manage.html', assignments=assignments, classes=classes, subjects=subjects)
+    # Filters run in SQL; the page is fetched with a keyset cursor
+    query = Assignment.query.options(joinedload(Assignment.class_rel))
+    search = request.args.get('q', '').strip()
+    if search:
+        query = query.filter(Assignment.title.ilike(f'%{search}%'))
+    class_id = request.args.get('class_id', type=int)
+    if class_id:
+        query = query.filter(Assignment.class_id == class_id)
+
+    page = paginate(query, ASSIGNMENT_SORTS, Assignment.id, 'created')
+    return render_template('assignment/manage.html', assignments=page, page=page, classes=classes, subjects=subjects)
 
 @assignment_bp.route('/assignment/my')
 @login_required
@@ -50,7 +67,7 @@ def my_assignments():
         flash('Access denied. Only students can view their assignments.', 'danger')
         return redirect(url_for('dashboard'))
 
-    student = Student.query.filter_by(user_id=current_user.id).first()
+    student = get_profile()
     class_id = student.class_id if student else None
     assignments = Assignment.query.filter_by(class_id=class_id).order_by(Assignment.due_date).all() if class_id else []
     return render_template('assignment/my.html', assignments=assignments)
\ No newline at end of file
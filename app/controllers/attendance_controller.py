@@ -1,6 +1,11 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, abort, Response, stream_with_context
 from flask_login import current_user, login_required
-from app.models.models import Attendance, Student, Class, User, db
+from app.models.models import Student, Class, User, db
+from app.services.attendance import AttendancePivot, mark_class_attendance, statuses_for_day
+from app.services.attendance_archive import range_stats
+from app.services.database import run_with_retry
+from app.services.identity import get_profile
+from app.services.exports import EXPORT_FORMATS, class_month_rows, range_rows, stream_export
 from datetime import datetime, timedelta
 import calendar
 from sqlalchemy.orm import joinedload
@@ -26,15 +31,8 @@ def class_attendance(class_id):
         date = datetime.now().date()
     
     # Get attendance records for the class on the specified date
-    attendance_records = {}
-    for student in students:
-        attendance = Attendance.query.filter_by(
-            student_id=student.id,
-            class_id=class_id,
-            date=date
-        ).first()
-        
-        attendance_records[student.id] = attendance.status if attendance else 'not_marked'
+    marked = statuses_for_day(class_id, date)
+    attendance_records = {student.id: marked.get(student.id, 'not_marked') for student in students}
     
     return render_template('attendance/class_attendance.html',
                           class_obj=class_obj,
@@ -57,48 +55,25 @@ def mark_attendance(class_id):
         date_str = request.form.get('date')
         date = datetime.strptime(date_str, '%Y-%m-%d').date()
         
-        # Delete existing attendance records for this class and date
-        for student in students:
-            existing = Attendance.query.filter_by(
-                student_id=student.id,
-                class_id=class_id,
-                date=date
-            ).first()
-            
-            if existing:
-                db.session.delete(existing)
+        statuses = {student.id: request.form.get(f'status_{student.id}') for student in students}
         
-        # Create new attendance records
-        for student in students:
-            status = request.form.get(f'status_{student.id}')
-            
-            attendance = Attendance(
-                student_id=student.id,
-                class_id=class_id,
-                date=date,
-                status=status,
-                marked_by=current_user.id
-            )
-            
-            db.session.add(attendance)
+        def save_attendance():
+            counts = mark_class_attendance(class_id, date, statuses, current_user.id)
+            db.session.commit()
+            return counts
         
-        db.session.commit()
-        flash('Attendance marked successfully!', 'success')
+        # Every teacher submits at the same time in the morning
+        counts = run_with_retry(save_attendance)
+        flash(f"Attendance marked successfully! {counts['inserted']} new, "
+              f"{counts['changed']} updated, {counts['unchanged']} unchanged.", 'success')
         return redirect(url_for('attendance.class_attendance', class_id=class_id, date=date_str))
     
     # Default to today's date
     date = datetime.now().date()
     
     # Check if attendance already marked
-    attendance_records = {}
-    for student in students:
-        attendance = Attendance.query.filter_by(
-            student_id=student.id,
-            class_id=class_id,
-            date=date
-        ).first()
-        
-        attendance_records[student.id] = attendance.status if attendance else 'not_marked'
+    marked = statuses_for_day(class_id, date)
+    attendance_records = {student.id: marked.get(student.id, 'not_marked') for student in students}
     
     return render_template('attendance/mark_attendance.html',
                           class_obj=class_obj,
@@ -127,39 +102,43 @@ def student_attendance(student_id):
     month = request.args.get('month', datetime.now().month, type=int)
     year = request.args.get('year', datetime.now().year, type=int)
     
-    # Get all days in the month
-    num_days = calendar.monthrange(year, month)[1]
-    days = [datetime(year, month, day).date() for day in range(1, num_days + 1)]
-    
-    # Get attendance records for the month
-    attendance_records = {}
-    for day in days:
-        attendance = Attendance.query.filter_by(
-            student_id=student.id,
-            date=day
-        ).first()
-        
-        attendance_records[day] = attendance.status if attendance else 'not_marked'
-    
-    # Calculate statistics
-    total_days = len([a for a in attendance_records.values() if a != 'not_marked'])
-    present_days = len([a for a in attendance_records.values() if a == 'present'])
-    absent_days = len([a for a in attendance_records.values() if a == 'absent'])
-    late_days = len([a for a in attendance_records.values() if a == 'late'])
-    
-    attendance_percentage = (present_days / total_days * 100) if total_days > 0 else 0
+    # Attendance records for the whole month in one query
+    pivot = AttendancePivot.for_month([student.id], year, month)
+    stats = pivot.counts(student.id)
     
     return render_template('attendance/student_attendance.html',
                           student=student,
                           user=user,
                           month=month,
                           year=year,
-                          days=days,
-                          attendance_records=attendance_records,
-                          attendance_percentage=attendance_percentage,
-                          present_days=present_days,
-                          absent_days=absent_days,
-                          late_days=late_days)
+                          days=pivot.days,
+                          attendance_records=pivot.statuses(student.id),
+                          attendance_percentage=stats['percentage'],
+                          present_days=stats['present'],
+                          absent_days=stats['absent'],
+                          late_days=stats['late'])
+
+# Attendance analytics over a date range (defaults to the current year), from the packed archive
+@attendance_bp.route('/student/<int:student_id>/analytics')
+@login_required
+def student_analytics(student_id):
+    student = Student.query.filter_by(user_id=student_id).first_or_404()
+    if current_user.role not in ['admin', 'teacher'] and current_user.id != student_id:
+        parent = get_profile() if current_user.role == 'parent' else None
+        if parent is None or student.parent_id != parent.id:
+            return jsonify({'error': 'Access denied'}), 403
+    
+    today = datetime.now().date()
+    try:
+        start = _date_arg('start', today.replace(month=1, day=1))
+        end = _date_arg('end', today)
+    except ValueError:
+        return jsonify({'error': 'Dates must be in YYYY-MM-DD format'}), 400
+    if end < start:
+        return jsonify({'error': 'End date must be on or after the start date'}), 400
+    
+    stats = range_stats([student.id], start, end)[student.id]
+    return jsonify({'student_id': student_id, 'start': start.isoformat(), 'end': end.isoformat(), **stats})
 
 # Attendance report
 @attendance_bp.route('/report')
@@ -180,44 +159,92 @@ def attendance_report():
         # Get all students in the class
         students = Student.query.options(joinedload(Student.user)).filter_by(class_id=class_id).all()
         
-        # Get all days in the month
-        num_days = calendar.monthrange(year, month)[1]
-        days = [datetime(year, month, day).date() for day in range(1, num_days + 1)]
+        # One query for the whole class and month
+        pivot = AttendancePivot.for_month([student.id for student in students], year, month)
         
-        # Get attendance data for each student
         attendance_data = []
         for student in students:
-            student_data = {
+            stats = pivot.counts(student.id)
+            attendance_data.append({
                 'id': student.user_id,
                 'name': student.user.full_name,
-                'attendance': {}
-            }
-            
-            for day in days:
-                attendance = Attendance.query.filter_by(
-                    student_id=student.id,
-                    date=day
-                ).first()
-                
-                student_data['attendance'][day] = attendance.status if attendance else 'not_marked'
-            
-            # Calculate statistics
-            total_days = len([a for a in student_data['attendance'].values() if a != 'not_marked'])
-            present_days = len([a for a in student_data['attendance'].values() if a == 'present'])
-            
-            student_data['percentage'] = (present_days / total_days * 100) if total_days > 0 else 0
-            
-            attendance_data.append(student_data)
+                'attendance': pivot.statuses(student.id),
+                'percentage': stats['percentage'],
+                'present': stats['present'],
+                'absent': stats['absent'],
+                'late': stats['late']
+            })
         
         return render_template('attendance/report.html',
                               classes=classes,
                               selected_class=Class.query.get(class_id),
                               month=month,
                               year=year,
-                              days=days,
+                              days=pivot.days,
                               attendance_data=attendance_data)
     
     return render_template('attendance/report.html',
                           classes=classes,
                           month=month,
-                          year=year)
\ No newline at end of file
+                          year=year)
+
+def _date_arg(name, default):
+    value = request.args.get(name)
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else default
+
+def _export_response(rows, fmt, filename, sheet_name):
+    body = stream_with_context(stream_export(rows, fmt, sheet_name))
+    response = Response(body, mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+# Download one class's monthly report (student x day grid)
+@attendance_bp.route('/report/export.<fmt>')
+@login_required
+def export_report(fmt):
+    if current_user.role not in ['admin', 'teacher']:
+        flash('Access denied', 'danger')
+        return redirect(url_for('dashboard'))
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+    
+    class_id = request.args.get('class_id', type=int)
+    month = request.args.get('month', datetime.now().month, type=int)
+    year = request.args.get('year', datetime.now().year, type=int)
+    if class_id is None:
+        flash('Choose a class to export', 'danger')
+        return redirect(url_for('attendance.attendance_report'))
+    if not 1 <= month <= 12 or not 1 <= year <= 9999:
+        flash('Choose a valid month and year', 'danger')
+        return redirect(url_for('attendance.attendance_report'))
+    class_obj = Class.query.get_or_404(class_id)
+    
+    label = f"{class_obj.name}{'-' + class_obj.section if class_obj.section else ''}"
+    filename = f'attendance-{label}-{year}-{month:02d}'.replace(' ', '_')
+    return _export_response(class_month_rows(class_id, year, month), fmt, filename,
+                            f'{calendar.month_abbr[month]} {year}')
+
+# Download every attendance record in a date range (whole school or one class)
+@attendance_bp.route('/export.<fmt>')
+@login_required
+def export_range(fmt):
+    if current_user.role != 'admin':
+        flash('Access denied', 'danger')
+        return redirect(url_for('dashboard'))
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+    
+    today = datetime.now().date()
+    try:
+        start = _date_arg('start', today.replace(day=1))
+        end = _date_arg('end', today)
+    except ValueError:
+        flash('Dates must be in YYYY-MM-DD format', 'danger')
+        return redirect(url_for('attendance.attendance_report'))
+    if end < start:
+        flash('End date must be on or after the start date', 'danger')
+        return redirect(url_for('attendance.attendance_report'))
+    class_id = request.args.get('class_id', type=int)
+    
+    filename = f'attendance-{start.isoformat()}-to-{end.isoformat()}'
+    return _export_response(range_rows(start, end, class_id), fmt, filename, 'Attendance')
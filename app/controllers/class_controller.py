@@ -1,9 +1,24 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, Response, stream_with_context
 from flask_login import current_user, login_required
 from app.models.models import Class, Subject, Teacher, Student, db
+from app.services.identity import identity_cache, get_profile
+from app.services.pagination import paginate
+from app.services.rankings import membership_changed
+from sqlalchemy import or_
+from sqlalchemy.orm import joinedload
 
 class_bp = Blueprint('class', __name__)
 
+CLASS_SORTS = {
+    'name': (Class.name, 'asc'),
+    'section': (Class.section, 'asc'),
+}
+
+SUBJECT_SORTS = {
+    'name': (Subject.name, 'asc'),
+    'code': (Subject.code, 'asc'),
+}
+
 # Class list view
 @class_bp.route('/classes')
 @login_required
@@ -12,8 +27,14 @@ def class_list():
         flash('Access denied', 'danger')
         return redirect(url_for('dashboard'))
     
-    classes = Class.query.all()
-    return render_template('class/list.html', classes=classes)
+    # Filters run in SQL; the page is fetched with a keyset cursor
+    query = Class.query.options(joinedload(Class.teacher).joinedload(Teacher.user))
+    search = request.args.get('q', '').strip()
+    if search:
+        query = query.filter(Class.name.ilike(f'%{search}%'))
+    
+    page = paginate(query, CLASS_SORTS, Class.id, 'name')
+    return render_template('class/list.html', classes=page, page=page)
 
 # Class detail view
 @class_bp.route('/classes/<int:class_id>')
@@ -32,6 +53,73 @@ def class_detail(class_id):
                           students=students,
                           subjects=subjects)
 
+# Class leaderboard, over all exams or one term
+@class_bp.route('/classes/<int:class_id>/rankings')
+@login_required
+def class_rankings(class_id):
+    from app.services.gradebook import TERM_BUCKETS
+    from app.services.rankings import class_rankings as rankings_for
+    
+    if current_user.role not in ['admin', 'teacher']:
+        flash('Access denied', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    class_obj = Class.query.get_or_404(class_id)
+    term = request.args.get('term') or None
+    if term not in dict(TERM_BUCKETS):
+        term = None
+    
+    return render_template('class/rankings.html',
+                          class_obj=class_obj,
+                          rankings=rankings_for(class_id, term),
+                          terms=TERM_BUCKETS,
+                          term=term)
+
+# Download PDF report cards for a class, or its whole grade level (?scope=grade), as a ZIP
+@class_bp.route('/classes/<int:class_id>/report-cards.zip')
+@login_required
+def report_cards(class_id):
+    from app.services.report_cards import report_card_payloads, start_job, stream_report_cards
+    
+    if current_user.role not in ['admin', 'teacher']:
+        flash('Access denied', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    class_obj = Class.query.get_or_404(class_id)
+    if request.args.get('scope') == 'grade':
+        # Every section of the same grade
+        class_ids = [row.id for row in Class.query.with_entities(Class.id).filter_by(name=class_obj.name)]
+        label = class_obj.name
+    else:
+        class_ids = [class_obj.id]
+        label = f"{class_obj.name}{'-' + class_obj.section if class_obj.section else ''}"
+    
+    # Registered first so progress polls find the job while the data loads
+    job = start_job(request.args.get('job'))
+    # All data is loaded up front; only rendering happens while streaming
+    payloads = report_card_payloads(class_ids)
+    job.start(len(payloads))
+    
+    response = Response(stream_with_context(stream_report_cards(payloads, job)), mimetype='application/zip')
+    filename = f'report-cards-{label}'.replace(' ', '_')
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}.zip"'
+    response.headers['X-Report-Job'] = job.id
+    return response
+
+# Progress of a report-card download started with ?job=<id>
+@class_bp.route('/report-cards/progress/<job_id>')
+@login_required
+def report_card_progress(job_id):
+    from app.services.report_cards import job_progress
+    
+    if current_user.role not in ['admin', 'teacher']:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    job = job_progress(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job)
+
 # Add new class (admin and teacher)
 @class_bp.route('/classes/add', methods=['GET', 'POST'])
 @login_required
@@ -145,7 +233,7 @@ def join_class():
         return redirect(url_for('dashboard'))
     
     # Check if student already has a class
-    existing_student = Student.query.filter_by(user_id=current_user.id).first()
+    existing_student = get_profile()
     if existing_student:
         flash('You are already enrolled in a class', 'info')
         return redirect(url_for('dashboard'))
@@ -167,6 +255,8 @@ def join_class():
         
         db.session.add(new_student)
         db.session.commit()
+        identity_cache.invalidate(current_user.id)
+        membership_changed(class_id)
         
         flash('Successfully joined the class!', 'success')
         return redirect(url_for('dashboard'))
@@ -183,8 +273,19 @@ def subject_list():
         flash('Access denied', 'danger')
         return redirect(url_for('dashboard'))
     
-    subjects = Subject.query.all()
-    return render_template('class/subjects.html', subjects=subjects)
+    # Filters run in SQL; the page is fetched with a keyset cursor
+    query = Subject.query.options(joinedload(Subject.class_rel),
+                                  joinedload(Subject.teacher).joinedload(Teacher.user))
+    search = request.args.get('q', '').strip()
+    if search:
+        query = query.filter(or_(Subject.name.ilike(f'%{search}%'), Subject.code.ilike(f'%{search}%')))
+    class_id = request.args.get('class_id', type=int)
+    if class_id:
+        query = query.filter(Subject.class_id == class_id)
+    
+    page = paginate(query, SUBJECT_SORTS, Subject.id, 'name')
+    classes = Class.query.order_by(Class.name, Class.section).all()
+    return render_template('class/subjects.html', subjects=page, page=page, classes=classes)
 
 # Delete subject (admin only)
 @class_bp.route('/subjects/delete/<int:subject_id>', methods=['POST'])
@@ -1,12 +1,20 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
 from flask_login import login_required, current_user
-from app.models.models import db, Resource, Class, Student
+from app.models.models import db, Resource, Class
+from app.services.identity import identity_cache, get_profile
+from app.services.pagination import paginate
+from sqlalchemy.orm import joinedload
 from werkzeug.utils import secure_filename
 import os
 from datetime import datetime
 
 common_bp = Blueprint('common', __name__)
 
+RESOURCE_SORTS = {
+    'uploaded': (Resource.uploaded_at, 'desc'),
+    'title': (Resource.title, 'asc'),
+}
+
 @common_bp.route('/calendar')
 @login_required
 def calendar():
@@ -20,7 +28,7 @@ def resources():
     
     if role == 'student':
         # Students see general resources + their class resources
-        student = Student.query.filter_by(user_id=current_user.id).first()
+        student = get_profile()
         if student and student.class_id:
             query = query.filter((Resource.class_id == None) | (Resource.class_id == student.class_id))
         else:
@@ -30,9 +38,13 @@ def resources():
          query = query.filter(Resource.class_id == None)
     
     # Admins and Teachers see all resources by default (could be filtered)
-    resources = query.order_by(Resource.uploaded_at.desc()).all()
+    search = request.args.get('q', '').strip()
+    if search:
+        query = query.filter(Resource.title.ilike(f'%{search}%'))
     
-    return render_template('common/resources.html', resources=resources)
+    query = query.options(joinedload(Resource.class_rel), joinedload(Resource.uploader))
+    page = paginate(query, RESOURCE_SORTS, Resource.id, 'uploaded')
+    return render_template('common/resources.html', resources=page, page=page)
 
 ALLOWED_RESOURCE_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
 
@@ -153,6 +165,7 @@ def update_profile():
     current_user.email = email
     
     db.session.commit()
+    identity_cache.invalidate(current_user.id)
     
     flash('Profile updated successfully!', 'success')
     return redirect(url_for('common.settings'))
@@ -181,6 +194,7 @@ def change_password():
     # Update password
     current_user.password = bcrypt.generate_password_hash(new_password).decode('utf-8')
     db.session.commit()
+    identity_cache.invalidate(current_user.id)
     
     flash('Password changed successfully!', 'success')
     return redirect(url_for('common.settings'))
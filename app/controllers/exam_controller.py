@@ -1,10 +1,22 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import current_user, login_required
+from sqlalchemy.orm import joinedload
 from app.models.models import Exam, ExamResult, Student, Class, Subject, db
+from app.services.database import run_with_retry
+from app.services.exam_stats import exam_statistics
+from app.services.gradebook import count_outcomes, load_results, parse_marks, results_changed, save_results, teacher_can_grade
+from app.services.identity import get_profile
+from app.services.pagination import paginate
+from app.services.rankings import exam_rankings
 from datetime import datetime
 
 exam_bp = Blueprint('exam', __name__)
 
+EXAM_SORTS = {
+    'date': (Exam.exam_date, 'desc'),
+    'title': (Exam.title, 'asc'),
+}
+
 # List all exams
 @exam_bp.route('/exams')
 @login_required
@@ -13,8 +25,21 @@ def exam_list():
         flash('Access denied', 'danger')
         return redirect(url_for('dashboard'))
     
-    exams = Exam.query.all()
-    return render_template('exam/list.html', exams=exams)
+    # Filters run in SQL; the page is fetched with a keyset cursor
+    query = Exam.query.options(joinedload(getattr(Exam, 'class')), joinedload(Exam.subject))
+    search = request.args.get('q', '').strip()
+    if search:
+        query = query.filter(Exam.title.ilike(f'%{search}%'))
+    class_id = request.args.get('class_id', type=int)
+    if class_id:
+        query = query.filter(Exam.class_id == class_id)
+    exam_type = request.args.get('exam_type', '').strip()
+    if exam_type:
+        query = query.filter(Exam.exam_type == exam_type)
+    
+    page = paginate(query, EXAM_SORTS, Exam.id, 'date')
+    classes = Class.query.order_by(Class.name, Class.section).all()
+    return render_template('exam/list.html', exams=page, page=page, classes=classes)
 
 # Create new exam
 @exam_bp.route('/exams/create', methods=['GET', 'POST'])
@@ -68,28 +93,41 @@ def exam_detail(exam_id):
         return redirect(url_for('dashboard'))
     
     exam = Exam.query.get_or_404(exam_id)
-    results = ExamResult.query.filter_by(exam_id=exam_id).all()
+    # Leaderboard with rank, percentile and z-score (cached per class)
+    results = exam_rankings(exam)
     
-    # Calculate statistics
-    total_students = len(results)
-    passed_students = len([r for r in results if r.marks >= exam.passing_marks])
-    failed_students = total_students - passed_students
-    
-    if total_students > 0:
-        pass_percentage = (passed_students / total_students) * 100
-        avg_marks = sum([r.marks for r in results]) / total_students
-    else:
-        pass_percentage = 0
-        avg_marks = 0
+    # Aggregates come from SQL (cached per exam)
+    stats = exam_statistics(exam)
     
     return render_template('exam/detail.html', 
                           exam=exam, 
                           results=results,
-                          total_students=total_students,
-                          passed_students=passed_students,
-                          failed_students=failed_students,
-                          pass_percentage=pass_percentage,
-                          avg_marks=avg_marks)
+                          stats=stats,
+                          total_students=stats['count'],
+                          passed_students=stats['passed'],
+                          failed_students=stats['failed'],
+                          pass_percentage=stats['pass_percentage'],
+                          avg_marks=stats['mean'])
+
+# Exam statistics as JSON, for charts
+@exam_bp.route('/exams/<int:exam_id>/stats')
+@login_required
+def exam_stats(exam_id):
+    if current_user.role not in ['admin', 'teacher']:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    exam = Exam.query.get_or_404(exam_id)
+    return jsonify(exam_statistics(exam))
+
+# Exam leaderboard as JSON
+@exam_bp.route('/exams/<int:exam_id>/rankings')
+@login_required
+def exam_rankings_json(exam_id):
+    if current_user.role not in ['admin', 'teacher']:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    exam = Exam.query.get_or_404(exam_id)
+    return jsonify(exam_rankings(exam))
 
 # Enter exam results
 @exam_bp.route('/exams/<int:exam_id>/results', methods=['GET', 'POST'])
@@ -100,50 +138,77 @@ def enter_results(exam_id):
         return redirect(url_for('dashboard'))
     
     exam = Exam.query.get_or_404(exam_id)
-    students = Student.query.filter_by(class_id=exam.class_id).all()
+    students = Student.query.options(joinedload(Student.user)).filter_by(class_id=exam.class_id).all()
     
     if request.method == 'POST':
-        # Delete existing results
-        ExamResult.query.filter_by(exam_id=exam_id).delete()
-        
-        # Add new results
+        # Results are keyed by Student.id; only new or changed marks are written
+        entries = {}
         for student in students:
-            marks = request.form.get(f'marks_{student.user_id}')
-            remarks = request.form.get(f'remarks_{student.user_id}')
-            
-            result = ExamResult(
-                exam_id=exam_id,
-                student_id=student.user_id,
-                marks=marks,
-                remarks=remarks,
-                date=datetime.now()
-            )
-            
-            db.session.add(result)
+            marks, error = parse_marks(exam, request.form.get(f'marks_{student.id}'))
+            if error:
+                flash(f'Invalid marks for {student.user.full_name}: {error}', 'warning')
+                continue
+            if marks is not None:
+                entries[student.id] = (marks, request.form.get(f'remarks_{student.id}', '').strip())
         
-        db.session.commit()
-        flash('Exam results saved successfully!', 'success')
+        def save():
+            outcome = save_results(exam, entries)
+            db.session.commit()
+            return outcome
+        
+        counts = count_outcomes(run_with_retry(save))
+        results_changed(exam.id, exam.class_id)
+        flash(f"Exam results saved successfully! {counts['inserted']} new, "
+              f"{counts['changed']} updated, {counts['unchanged']} unchanged.", 'success')
         return redirect(url_for('exam.exam_detail', exam_id=exam_id))
     
     # Get existing results
-    results = {}
-    for student in students:
-        result = ExamResult.query.filter_by(
-            exam_id=exam_id,
-            student_id=student.user_id
-        ).first()
-        
-        if result:
-            results[student.user_id] = {
-                'marks': result.marks,
-                'remarks': result.remarks
-            }
+    results = load_results(exam_id)
     
     return render_template('exam/enter_results.html', 
                           exam=exam, 
                           students=students,
                           results=results)
 
+# Save a single mark (JSON), used by the grade entry pages as cells are edited
+@exam_bp.route('/exams/<int:exam_id>/results/<int:student_id>', methods=['PATCH'])
+@login_required
+def update_result(exam_id, student_id):
+    exam = Exam.query.get_or_404(exam_id)
+    if current_user.role == 'teacher':
+        teacher = get_profile()
+        if teacher is None or not teacher_can_grade(teacher, exam, current_user.id):
+            return jsonify({'error': 'You do not have permission to enter grades for this exam.'}), 403
+    elif current_user.role != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    student = Student.query.filter_by(id=student_id, class_id=exam.class_id).first()
+    if student is None:
+        return jsonify({'error': 'Student is not in this exam\'s class.'}), 404
+    
+    data = request.get_json(silent=True) or {}
+    marks, error = parse_marks(exam, data.get('marks'))
+    if error:
+        return jsonify({'error': f'Invalid marks: {error}'}), 400
+    if marks is None:
+        return jsonify({'error': 'Marks are required.'}), 400
+    remarks = (data.get('remarks') or '').strip()
+    
+    def save():
+        outcome = save_results(exam, {student.id: (marks, remarks)})
+        db.session.commit()
+        return outcome
+    
+    outcome = run_with_retry(save)
+    if outcome[student.id] != 'unchanged':
+        results_changed(exam.id, exam.class_id)
+    return jsonify({
+        'student_id': student.id,
+        'marks': marks,
+        'remarks': remarks or None,
+        'status': outcome[student.id],
+    })
+
 # Student exam results
 @exam_bp.route('/student/results/<int:student_id>')
 @login_required
@@ -0,0 +1,478 @@
+from flask import render_template, redirect, url_for, flash, request, session
+from flask_login import login_user, logout_user, login_required, current_user
+from datetime import datetime
+
+from app.extensions import bcrypt, login_manager
+from app.models.models import db, User, Admin, Teacher, Student, Parent, Class
+from app.services.attendance import AttendancePivot, monthly_summaries
+from app.services.grading import average, grade_scale
+from app.services.identity import identity_cache, get_profile
+from app.services.messaging import unread_total
+from app.services.presence import last_seen_buffer
+
+# Core pages (login, registration, role dashboards). They are registered on
+# the app itself rather than a blueprint so their endpoint names stay
+# unprefixed (url_for('login'), url_for('dashboard'), ...).
+_routes = []
+
+
+def route(rule, **options):
+    def decorator(view):
+        _routes.append((rule, view, options))
+        return view
+    return decorator
+
+# User loader for Flask-Login
+@login_manager.user_loader
+def load_user(user_id):
+    # Cached User + role profile; no query on a cache hit
+    return identity_cache.load(user_id)
+
+# Forms
+from flask_wtf import FlaskForm
+from wtforms import StringField, PasswordField, SubmitField, SelectField, BooleanField
+from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError
+
+class LoginForm(FlaskForm):
+    email = StringField('Email', validators=[DataRequired(), Email()])
+    password = PasswordField('Password', validators=[DataRequired()])
+    remember = BooleanField('Remember Me')
+    submit = SubmitField('Login')
+
+class RegistrationForm(FlaskForm):
+    first_name = StringField('First Name', validators=[DataRequired(), Length(min=2, max=50)])
+    last_name = StringField('Last Name', validators=[DataRequired(), Length(min=2, max=50)])
+    email = StringField('Email', validators=[DataRequired(), Email()])
+    password = PasswordField('Password', validators=[DataRequired(), Length(min=6)])
+    confirm_password = PasswordField('Confirm Password', validators=[DataRequired(), EqualTo('password')])
+    role = SelectField('Role', choices=[('admin', 'Admin'), ('teacher', 'Teacher'), ('student', 'Student'), ('parent', 'Parent')])
+    submit = SubmitField('Register')
+    
+    def validate_email(self, email):
+        user = User.query.filter_by(email=email.data).first()
+        if user:
+            raise ValidationError('Email already registered. Please use a different email.')
+
+# Routes
+@route('/')
+def index():
+    return render_template('index.html')
+
+def before_request():
+    if current_user.is_authenticated:
+        # Buffered; written in bulk instead of one commit per request
+        last_seen_buffer.touch(current_user.id, stored=current_user.last_seen)
+
+@route('/login', methods=['GET', 'POST'])
+def login():
+    # Allow login page access even if already authenticated
+    form = LoginForm()
+    if form.validate_on_submit():
+        user = User.query.filter_by(email=form.email.data).first()
+        if user:
+            # Check if password matches
+            password_match = bcrypt.check_password_hash(user.password, form.password.data)
+            if password_match:
+                # Enhanced persistent login
+                remember_me = form.remember.data
+                login_user(user, remember=remember_me)
+                
+                # Set session data for persistent login
+                session.permanent = True
+                session['user_id'] = user.id
+                session['user_email'] = user.email
+                session['user_role'] = user.role
+                session['login_time'] = datetime.now().isoformat()
+                
+                db.session.commit()
+                
+                # Check if this is the user's first login (created within last 5 minutes)
+                from datetime import timedelta
+                is_new_user = (datetime.now() - user.created_at) < timedelta(minutes=5)
+                
+                if is_new_user:
+                    flash(f'Welcome, {user.full_name}! Your account is ready.', 'success')
+                else:
+                    flash(f'Welcome back, {user.full_name}!', 'success')
+                # Redirect based on role
+                if user.role == 'admin':
+                    return redirect(url_for('admin_dashboard'))
+                elif user.role == 'teacher':
+                    return redirect(url_for('teacher_dashboard'))
+                elif user.role == 'student':
+                    return redirect(url_for('student_dashboard'))
+                elif user.role == 'parent':
+                    return redirect(url_for('parent_dashboard'))
+                else:
+                    # Fallback to main dashboard, ignore any "next" param to avoid unwanted redirects
+                    return redirect(url_for('dashboard'))
+            else:
+                flash('Login unsuccessful. Incorrect password.', 'danger')
+        else:
+            flash('Login unsuccessful. Email not found.', 'danger')
+    
+    return render_template('login.html', form=form)
+
+@route('/register', methods=['GET', 'POST'])
+def register():
+    # Allow register page access even if already authenticated
+    form = RegistrationForm()
+    if form.validate_on_submit():
+        # Check if email already exists
+        existing_user = User.query.filter_by(email=form.email.data).first()
+        if existing_user:
+            flash('Email already registered. Please use a different email or log in.', 'danger')
+            return render_template('register.html', form=form)
+
+        # Hash password
+        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+
+        user = User(
+            full_name=f"{form.first_name.data} {form.last_name.data}",
+            email=form.email.data,
+            password=hashed_password,
+            role=form.role.data,
+            created_at=datetime.now()
+        )
+        db.session.add(user)
+        db.session.flush()  # Get user ID without committing
+
+        # Create role-specific profile
+        if form.role.data == 'admin':
+            admin = Admin(user_id=user.id, admin_id=f"ADM{user.id}")
+            db.session.add(admin)
+        elif form.role.data == 'teacher':
+            teacher = Teacher(user_id=user.id, teacher_id=f"TCH{user.id}")
+            db.session.add(teacher)
+        elif form.role.data == 'student':
+            student = Student(user_id=user.id, student_id=f"STD{user.id}")
+            db.session.add(student)
+        elif form.role.data == 'parent':
+            parent = Parent(user_id=user.id, parent_id=f"PRT{user.id}")
+            db.session.add(parent)
+        
+        db.session.commit()
+        flash(f'Account created successfully! Please log in to get started.', 'success')
+        return redirect(url_for('login'))
+    
+    return render_template('register.html', form=form)
+
+@route('/dashboard')
+def dashboard():
+    role = request.args.get('role', current_user.role if current_user.is_authenticated else 'user')
+    return render_template('dashboard.html', role=role)
+
+@route('/admin/dashboard')
+@login_required
+def admin_dashboard():
+    if current_user.role != 'admin':
+        flash('Access denied. Admin privileges required.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    # Get counts for dashboard stats
+    students_count = Student.query.count()
+    teachers_count = Teacher.query.count()
+    parents_count = Parent.query.count()
+    classes_count = Class.query.count()
+
+    # Recent Activity (New Users and Announcements)
+    from app.models.models import Announcement, User, Exam
+    recent_users = User.query.order_by(User.created_at.desc()).limit(5).all()
+    recent_items = []
+    
+    for user in recent_users:
+        recent_items.append({
+            'type': 'user',
+            'icon': 'user-plus',
+            'color': 'success',
+            'title': 'New User Registered',
+            'description': f"{user.full_name} ({user.role}) joined EduSync",
+            'time': user.created_at
+        })
+        
+    recent_announcements = Announcement.query.order_by(Announcement.created_at.desc()).limit(5).all()
+    for ann in recent_announcements:
+        recent_items.append({
+            'type': 'announcement',
+            'icon': 'bullhorn',
+            'color': 'primary',
+            'title': 'Announcement Posted',
+            'description': ann.title,
+            'time': ann.created_at
+        })
+
+    # Sort combined activity by time desc and take top 5
+    recent_items.sort(key=lambda x: x['time'], reverse=True)
+    recent_activity = recent_items[:5]
+
+    # Upcoming Events (Future Exams)
+    upcoming_events = []
+    upcoming_exams = Exam.query.filter(Exam.exam_date >= datetime.now()).order_by(Exam.exam_date).limit(3).all()
+    for ex in upcoming_exams:
+        upcoming_events.append({
+            'day': ex.exam_date.day,
+            'month': ex.exam_date.strftime('%b'),
+            'title': ex.title,
+            'description': f"{ex.subject.name if ex.subject else 'Exam'} - Room {ex.room or 'TBD'}",
+            'time': ex.start_time.strftime('%I:%M %p') if ex.start_time else 'TBD'
+        })
+    
+    return render_template('admin/dashboard.html', 
+                          students_count=students_count,
+                          teachers_count=teachers_count,
+                          parents_count=parents_count,
+                          classes_count=classes_count,
+                          recent_activity=recent_activity,
+                          upcoming_events=upcoming_events)
+
+@route('/teacher/dashboard')
+@login_required
+def teacher_dashboard():
+    if current_user.role != 'teacher':
+        flash('Access denied. Teacher privileges required.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    # Get teacher profile
+    teacher = get_profile()
+    
+    # Fetch latest announcement
+    try:
+        from app.models.models import Announcement
+        latest_announcement = Announcement.query.order_by(Announcement.created_at.desc()).first()
+    except Exception:
+        latest_announcement = None
+    
+    # Calculate dashboard stats
+    from app.models.models import Class, Assignment, Exam, Student
+    
+    # My Classes count
+    my_classes_count = Class.query.filter_by(teacher_id=teacher.id).count()
+    
+    # Assignments count (assignments linked to teacher's classes)
+    assignments_count = Assignment.query.join(Class).filter(Class.teacher_id == teacher.id).count()
+    
+    # Exams count (exams linked to teacher's classes - using Subject just in case, but Exam usually links to Class)
+    # Checking Exam model again - it has class_id.
+    exams_count = Exam.query.join(Class).filter(Class.teacher_id == teacher.id).count()
+
+    # Students count (unique students in teacher's classes)
+    # We join Student with Class and filter by teacher_id
+    students_count = Student.query.join(Class).filter(Class.teacher_id == teacher.id).count()
+    
+    return render_template('teacher/dashboard.html', 
+                         teacher=teacher, 
+                         latest_announcement=latest_announcement,
+                         my_classes_count=my_classes_count,
+                         assignments_count=assignments_count,
+                         exams_count=exams_count,
+                         students_count=students_count)
+
+@route('/student/dashboard')
+@login_required
+def student_dashboard():
+    from app.models.models import Exam, ExamResult, Assignment, Subject, Class, db
+    from datetime import datetime
+    
+    if current_user.role != 'student':
+        flash('Access denied. Student privileges required.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    # Get student profile
+    student = get_profile()
+
+    # The calendar and the month's percentage come from one pivot of the individual days
+    attendance_percentage = 0
+    attendance_map = {} # Map day -> status
+    if student:
+        today = datetime.now().date()
+        pivot = AttendancePivot.for_month([student.id], today.year, today.month)
+        attendance_percentage = pivot.counts(student.id)['percentage']
+        for day, status in pivot.statuses(student.id).items():
+            if status != 'not_marked':
+                attendance_map[day.day] = status
+
+    # Get average grade from exam results
+    average_grade = "N/A"
+    recent_grades = []
+    if student:
+        detailed_results = db.session.query(ExamResult, Exam, Subject).join(Exam, ExamResult.exam_id == Exam.id).join(Subject, Exam.subject_id == Subject.id).filter(ExamResult.student_id == student.id).order_by(ExamResult.date.desc()).all()
+        
+        # Grade every result in one call; exams without total marks are skipped
+        grades = grade_scale().grade_marks([res.marks for res, _, _ in detailed_results],
+                                           [exam.total_marks for _, exam, _ in detailed_results])
+        for (res, exam, sub), grade in zip(detailed_results, grades):
+            if grade.percentage is None:
+                continue
+            recent_grades.append({
+                'subject': sub.name,
+                'title': exam.title,
+                'type': exam.exam_type,
+                'grade': grade.letter,
+                'percentage': round(grade.percentage, 1),
+                'badge_class': grade.tier
+            })
+        
+        avg = average(grade.percentage for grade in grades)
+        if avg is not None:
+            average_grade = f"{avg:.1f}%"
+
+    # recent_grades is already populated and sorted desc by date
+    recent_grades = recent_grades[:5]
+
+    # Get pending assignments for the student's class
+    pending_assignments = []
+    student_class = None
+    
+    # We define today_start for exam filtering (include exams from today even if time passed)
+    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    if student and student.class_id:
+        # Fetch Class object for display name
+        student_class = Class.query.get(student.class_id)
+        
+        assignments_query = Assignment.query.filter(
+            Assignment.class_id == student.class_id,
+            Assignment.due_date >= datetime.now().date()
+        ).order_by(Assignment.due_date).all()
+        
+        for asm in assignments_query:
+            # Join with Subject to get name
+            # Actually Assignment model has relationship `subject`
+            days_left = (asm.due_date - datetime.now().date()).days
+            pending_assignments.append({
+                'title': asm.title,
+                'description': asm.description,
+                'subject': asm.subject.name if asm.subject else 'General',
+                'due_date': asm.due_date,
+                'days_left': days_left,
+                'badge_class': 'danger' if days_left < 2 else 'warning' if days_left < 5 else 'success'
+            })
+
+    # Get Upcoming Exams
+    upcoming_exams = []
+    if student and student.class_id:
+        exams_query = Exam.query.filter(
+            Exam.class_id == student.class_id,
+            Exam.exam_date >= today_start
+        ).order_by(Exam.exam_date).limit(5).all()
+        
+        for ex in exams_query:
+            upcoming_exams.append(ex)
+
+    # Upcoming exams and assignments for the widget
+    upcoming_events = []
+    # Add exams
+    for ex in upcoming_exams:
+        upcoming_events.append({
+            'title': f"{ex.subject.name} - {ex.title}" if ex.subject else ex.title,
+            'description': f"Room: {ex.room}" if ex.room else "Exam",
+            'date': ex.exam_date, # datetime
+            'time': ex.start_time.strftime('%I:%M %p') if ex.start_time else 'TBD',
+            'type': 'exam'
+        })
+    
+    # Add assignments (limit to next few)
+    for asm in pending_assignments:
+        upcoming_events.append({
+            'title': f"{asm['subject']} Assignment",
+            'description': asm['title'],
+            'date': datetime.combine(asm['due_date'], datetime.min.time()), # convert date to datetime for sorting
+            'time': '11:59 PM', # Default for assignments
+            'type': 'assignment'
+        })
+    
+    # Sort by date and limit
+    upcoming_events.sort(key=lambda x: x['date'])
+    upcoming_events = upcoming_events[:5]
+
+    return render_template('student/dashboard.html', 
+                         student=student,
+                         student_class=student_class,
+                         attendance_percentage=attendance_percentage,
+                         attendance_map=attendance_map,
+                         average_grade=average_grade,
+                         recent_grades=recent_grades,
+                         pending_assignments=pending_assignments,
+                         upcoming_exams=upcoming_exams,
+                         upcoming_events=upcoming_events)
+
+
+@route('/parent/dashboard')
+@login_required
+def parent_dashboard():
+    if current_user.role != 'parent':
+        flash('Access denied. Parent privileges required.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    # Get parent profile and children
+    parent = get_profile()
+    
+    # Initialize stats
+    children_count = 0
+    attendance_avg = None
+    fees_due = None
+    unread_messages_count = 0
+    
+    if parent:
+        # Get children count
+        children = Student.query.filter_by(parent_id=parent.id).all()
+        children_count = len(children)
+        
+        # Average this month's attendance across children (one summary row each)
+        if children:
+            from datetime import datetime
+
+            today = datetime.now().date()
+            summaries = monthly_summaries([child.id for child in children], today.year, today.month)
+            percentages = [summary.percentage for summary in summaries.values() if summary.total > 0]
+            if percentages:
+                attendance_avg = round(sum(percentages) / len(percentages), 1)
+        
+        # Calculate total fees due
+        from app.models.models import FeePayment
+        total_fees = 0
+        for child in children:
+            # Sum unpaid or pending fees
+            unpaid_fees = FeePayment.query.filter(
+                FeePayment.student_id == child.id,
+                FeePayment.status.in_(['pending', 'failed'])
+            ).all()
+            total_fees += sum(fee.amount for fee in unpaid_fees)
+        
+        if total_fees > 0:
+            fees_due = total_fees
+    
+    # Get unread messages count
+    unread_messages_count = unread_total(current_user.id)
+
+    # Fetch recent announcements targeted to parents or all
+    try:
+        from app.models.models import Announcement
+        announcements = Announcement.query.filter(
+            (Announcement.audience_role == 'all') | (Announcement.audience_role == 'parent')
+        ).order_by(Announcement.created_at.desc()).limit(5).all()
+    except Exception:
+        announcements = []
+    
+    return render_template('parent/dashboard.html', 
+                         parent=parent, 
+                         announcements=announcements,
+                         children_count=children_count,
+                         attendance_avg=attendance_avg,
+                         fees_due=fees_due,
+                         unread_messages_count=unread_messages_count)
+
+@route('/logout')
+@login_required
+def logout():
+    # Clear session and log out
+    session.clear()
+    logout_user()
+    flash('You have been logged out successfully.', 'info')
+    return redirect(url_for('index'))
+
+
+def init_app(app):
+    app.before_request(before_request)
+    for rule, view, options in _routes:
+        app.add_url_rule(rule, view.__name__, view, **options)
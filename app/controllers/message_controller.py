@@ -2,6 +2,11 @@ from flask import Blueprint, render_template, flash, redirect, url_for, request,
 from flask_login import login_required, current_user
 from app.models import User, db
 from app.models.message import Message
+from app.services.database import run_with_retry
+from app.services.messaging import (
+    contacts, conversation_page, inbox_page, increment_unread, mark_read, message_dict, publish_message, publish_unread,
+    unread_total,
+)
 from datetime import datetime
 
 message_bp = Blueprint('message', __name__)
@@ -10,68 +15,136 @@ message_bp = Blueprint('message', __name__)
 @message_bp.route('/messages')
 @login_required
 def index():
-    """Display the messaging dashboard"""
-    users = User.query.filter(User.id != current_user.id).all()
-    return render_template('messages/index.html', users=users, datetime=datetime)
+    """Display the inbox: one row per conversation, most recent first"""
+    inbox = inbox_page(current_user.id)
+    return render_template('messages/index.html', inbox=inbox, users=contacts(current_user.id), datetime=datetime)
 
 @message_bp.route('/messages/<int:user_id>')
 @login_required
 def conversation(user_id):
-    """Display conversation with a specific user"""
+    """Display conversation with a specific user (?before=<cursor> for older messages, ?format=json for the page as JSON)"""
     recipient = User.query.get_or_404(user_id)
-    
-    # Get messages between current user and recipient
-    sent_messages = Message.query.filter_by(
-        sender_id=current_user.id, recipient_id=user_id
-    ).all()
-    
-    received_messages = Message.query.filter_by(
-        sender_id=user_id, recipient_id=current_user.id
-    ).all()
-    
-    # Combine and sort messages by timestamp
-    messages = sorted(sent_messages + received_messages, key=lambda x: x.timestamp)
-    
-    # Mark received messages as read
-    for message in received_messages:
-        if not message.is_read:
-            message.is_read = True
-    
-    db.session.commit()
-    
-    users = User.query.filter(User.id != current_user.id).all()
-    return render_template('messages/conversation.html', messages=messages, recipient=recipient, users=users, datetime=datetime)
+
+    # Mark received messages as read before loading the page, so the commit does not expire it;
+    # skip the write transaction when there is nothing to mark
+    def mark():
+        changed = mark_read(current_user.id, user_id)
+        if changed:
+            db.session.commit()
+        return changed
+
+    if run_with_retry(mark):
+        # Other open tabs update their unread badge
+        publish_unread(current_user.id)
+
+    messages, older = conversation_page(current_user.id, user_id, request.args.get('before'))
+
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'messages': [message_dict(message) for message in messages],
+            'older_url': url_for('message.conversation', user_id=user_id, before=older, format='json') if older else None,
+        })
+
+    return render_template('messages/conversation.html', messages=messages, recipient=recipient,
+                           users=contacts(current_user.id), older=older, datetime=datetime)
 
 @message_bp.route('/messages/send', methods=['POST'])
 @login_required
 def send_message():
-    """Send a new message"""
-    recipient_id = request.form.get('recipient_id')
-    content = request.form.get('content')
-    
-    if not recipient_id or not content:
+    """Send a new message (?format=json returns the saved message instead of redirecting)"""
+    wants_json = request.args.get('format') == 'json'
+    recipient_id = request.form.get('recipient_id', type=int)
+    content = (request.form.get('content') or '').strip()
+
+    if not recipient_id or not content or db.session.get(User, recipient_id) is None:
+        if wants_json:
+            return jsonify({'error': 'Message could not be sent. Please try again.'}), 400
         flash('Message could not be sent. Please try again.', 'danger')
         return redirect(url_for('message.index'))
     
-    message = Message(
-        sender_id=current_user.id,
-        recipient_id=recipient_id,
-        content=content,
-        timestamp=datetime.now(),
-        is_read=False
-    )
-    
-    db.session.add(message)
-    db.session.commit()
+    def save():
+        message = Message(
+            sender_id=current_user.id,
+            recipient_id=recipient_id,
+            content=content,
+            timestamp=datetime.now(),
+            is_read=False
+        )
+        db.session.add(message)
+        increment_unread([recipient_id])
+        db.session.commit()
+        return message
     
+    message = run_with_retry(save)
+    publish_message(message, current_user.full_name)
+
+    if wants_json:
+        return jsonify(message_dict(message)), 201
     return redirect(url_for('message.conversation', user_id=recipient_id))
 
 @message_bp.route('/messages/unread')
 @login_required
 def unread_count():
-    """Get count of unread messages for the current user"""
-    count = Message.query.filter_by(
-        recipient_id=current_user.id, is_read=False
-    ).count()
-    
-    return jsonify({'count': count})
\ No newline at end of file
+    """Get count of unread messages for the current user.
+
+    The ETag is the count itself, so a poll whose If-None-Match still matches gets an empty 304.
+    """
+    count = unread_total(current_user.id)
+    response = jsonify({'count': count})
+    response.set_etag(f'unread-{current_user.id}-{count}')
+    # Browsers must revalidate on every poll rather than reuse a stale count
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+@message_bp.route('/messages/broadcast', methods=['GET', 'POST'])
+@login_required
+def broadcast():
+    """Send one message to a class, a grade, a subject's students or a role (?format=json for a JSON result)"""
+    from app.models.models import Class, Subject
+    from sqlalchemy.orm import joinedload
+    from app.services.broadcast import AUDIENCES, ROLES, audience_recipients, publish_broadcast, send_broadcast
+
+    if current_user.role not in ['admin', 'teacher']:
+        flash('Access denied. Only admins or teachers can send broadcasts.', 'danger')
+        return redirect(url_for('message.index'))
+
+    if request.method == 'POST':
+        wants_json = request.args.get('format') == 'json'
+        kind = request.form.get('audience')
+        content = (request.form.get('content') or '').strip()
+        target = None
+        if kind in AUDIENCES:
+            target_type = AUDIENCES[kind][1]
+            if target_type == 'role':
+                target = request.form.get('role') if request.form.get('role') in ROLES else None
+            else:
+                target = request.form.get(f'{target_type}_id', type=int)
+
+        if target is None or not content:
+            error = 'Choose an audience and write a message.'
+        else:
+            recipient_ids = audience_recipients(kind, target, exclude=current_user.id)
+            error = None if recipient_ids else 'That audience has no recipients.'
+        if error:
+            if wants_json:
+                return jsonify({'error': error}), 400
+            flash(error, 'danger')
+            return redirect(url_for('message.broadcast'))
+
+        def save():
+            sent_at = send_broadcast(current_user.id, recipient_ids, content)
+            db.session.commit()
+            return sent_at
+
+        sent_at = run_with_retry(save)
+        publish_broadcast(current_user.id, current_user.full_name, recipient_ids, content, sent_at)
+
+        if wants_json:
+            return jsonify({'recipients': len(recipient_ids)}), 201
+        flash(f'Message sent to {len(recipient_ids)} recipients.', 'success')
+        return redirect(url_for('message.index'))
+
+    classes = Class.query.order_by(Class.name, Class.section).all()
+    subjects = Subject.query.options(joinedload(Subject.class_rel)).order_by(Subject.name).all()
+    return render_template('messages/broadcast.html', audiences=AUDIENCES, roles=ROLES,
+                           classes=classes, subjects=subjects)
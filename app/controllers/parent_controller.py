@@ -1,7 +1,10 @@
 from flask import Blueprint, render_template, flash, redirect, url_for
 from flask_login import login_required, current_user
-from app.models.models import Parent, Student, Attendance, ExamResult, Exam, Subject, FeePayment, Class, db
-from datetime import datetime, timedelta
+from app.models.models import Student, ExamResult, Exam, Subject, FeePayment, Class, db
+from app.services.attendance import AttendancePivot, monthly_summaries
+from app.services.grading import average, grade_scale
+from app.services.identity import get_profile
+from datetime import datetime
 
 parent_bp = Blueprint('parent', __name__)
 
@@ -13,7 +16,7 @@ def my_children():
         return redirect(url_for('dashboard'))
     
     # Get parent profile
-    parent = Parent.query.filter_by(user_id=current_user.id).first()
+    parent = get_profile()
     
     if not parent:
         flash('Parent profile not found.', 'danger')
@@ -22,57 +25,36 @@ def my_children():
     # Get all children for this parent
     children = Student.query.filter_by(parent_id=parent.id).all()
     
+    # Current month's attendance rollup for every child in one query
+    today = datetime.now().date()
+    summaries = monthly_summaries([child.id for child in children], today.year, today.month)
+
     # Enrich children data with class info, attendance, and grades
+    scale = grade_scale()
     children_data = []
     for child in children:
         # Get class information
         child_class = Class.query.get(child.class_id) if child.class_id else None
         
-        # Calculate attendance for current month
-        today = datetime.now().date()
-        start_date = today.replace(day=1)
-        
-        # Handle month end safely
-        if start_date.month == 12:
-            next_month_start = start_date.replace(year=start_date.year + 1, month=1, day=1)
-        else:
-            next_month_start = start_date.replace(month=start_date.month + 1, day=1)
-        end_date = next_month_start - timedelta(days=1)
-        
-        records = Attendance.query.filter(
-            Attendance.student_id == child.id,
-            Attendance.date >= start_date,
-            Attendance.date <= end_date
-        ).all()
-        
+        summary = summaries.get(child.id)
         attendance_percentage = None
-        if records:
-            present_count = sum(1 for r in records if r.status == 'present')
-            attendance_percentage = round((present_count / len(records)) * 100, 1)
+        if summary and summary.total > 0:
+            attendance_percentage = round(summary.percentage, 1)
         
         # Calculate average grade
-        average_grade = None
-        detailed_results = db.session.query(ExamResult, Exam).join(
+        detailed_results = db.session.query(ExamResult.marks, Exam.total_marks).join(
             Exam, ExamResult.exam_id == Exam.id
         ).filter(ExamResult.student_id == child.id).all()
         
-        if detailed_results:
-            total_percentage = 0
-            count = 0
-            for res, exam in detailed_results:
-                if exam.total_marks > 0:
-                    percentage = (res.marks / exam.total_marks) * 100
-                    total_percentage += percentage
-                    count += 1
-            
-            if count > 0:
-                average_grade = round(total_percentage / count, 1)
+        overall = scale.grade(average(scale.percentages([marks for marks, _ in detailed_results],
+                                                        [total for _, total in detailed_results])))
         
         children_data.append({
             'student': child,
             'class': child_class,
             'attendance': attendance_percentage,
-            'average_grade': average_grade
+            'average_grade': round(overall.percentage, 1) if overall.percentage is not None else None,
+            'grade': overall
         })
     
     return render_template('parent/my_children.html', children=children_data)
@@ -85,7 +67,7 @@ def performance():
         return redirect(url_for('dashboard'))
     
     # Get parent profile
-    parent = Parent.query.filter_by(user_id=current_user.id).first()
+    parent = get_profile()
     
     if not parent:
         flash('Parent profile not found.', 'danger')
@@ -95,6 +77,7 @@ def performance():
     children = Student.query.filter_by(parent_id=parent.id).all()
     
     # Get performance data for each child
+    scale = grade_scale()
     children_performance = []
     for child in children:
         # Get all exam results with subject information
@@ -104,41 +87,41 @@ def performance():
             Subject, Exam.subject_id == Subject.id
         ).filter(ExamResult.student_id == child.id).order_by(ExamResult.date.desc()).all()
         
-        # Group by subject
+        # Grade every result in one call, then group by subject
+        grades = scale.grade_marks([res.marks for res, _, _ in results],
+                                   [exam.total_marks for _, exam, _ in results])
         subject_grades = {}
-        overall_total = 0
-        overall_count = 0
         
-        for res, exam, subject in results:
-            if exam.total_marks > 0:
-                percentage = (res.marks / exam.total_marks) * 100
-                
-                if subject.name not in subject_grades:
-                    subject_grades[subject.name] = {
-                        'grades': [],
-                        'average': 0
-                    }
-                
-                subject_grades[subject.name]['grades'].append({
-                    'exam_title': exam.title,
-                    'exam_type': exam.exam_type,
-                    'marks': res.marks,
-                    'total_marks': exam.total_marks,
-                    'percentage': round(percentage, 1),
-                    'date': res.date
-                })
-                
-                overall_total += percentage
-                overall_count += 1
+        for (res, exam, subject), grade in zip(results, grades):
+            if grade.percentage is None:
+                continue
+            
+            if subject.name not in subject_grades:
+                subject_grades[subject.name] = {
+                    'grades': [],
+                    'average': 0
+                }
+            
+            subject_grades[subject.name]['grades'].append({
+                'exam_title': exam.title,
+                'exam_type': exam.exam_type,
+                'marks': res.marks,
+                'total_marks': exam.total_marks,
+                'percentage': round(grade.percentage, 1),
+                'grade': grade.letter,
+                'badge_class': grade.badge,
+                'date': res.date
+            })
         
         # Calculate subject averages
         for subject_name in subject_grades:
-            grades = subject_grades[subject_name]['grades']
-            if grades:
-                avg = sum(g['percentage'] for g in grades) / len(grades)
-                subject_grades[subject_name]['average'] = round(avg, 1)
+            grades_list = subject_grades[subject_name]['grades']
+            subject_average = scale.grade(average(g['percentage'] for g in grades_list))
+            subject_grades[subject_name]['average'] = round(subject_average.percentage, 1)
+            subject_grades[subject_name]['grade'] = subject_average.letter
         
-        overall_average = round(overall_total / overall_count, 1) if overall_count > 0 else None
+        overall_percentage = average(grade.percentage for grade in grades)
+        overall_average = round(overall_percentage, 1) if overall_percentage is not None else None
         
         children_performance.append({
             'student': child,
@@ -156,7 +139,7 @@ def attendance():
         return redirect(url_for('dashboard'))
     
     # Get parent profile
-    parent = Parent.query.filter_by(user_id=current_user.id).first()
+    parent = get_profile()
     
     if not parent:
         flash('Parent profile not found.', 'danger')
@@ -165,44 +148,28 @@ def attendance():
     # Get all children
     children = Student.query.filter_by(parent_id=parent.id).all()
     
-    # Get attendance data for each child
+    # One pivot over all children gives both the calendars and the counts
+    today = datetime.now().date()
+    pivot = AttendancePivot.for_month([child.id for child in children], today.year, today.month)
+
     children_attendance = []
     for child in children:
-        # Get attendance for current month
-        today = datetime.now().date()
-        start_date = today.replace(day=1)
-        
-        # Handle month end safely
-        if start_date.month == 12:
-            next_month_start = start_date.replace(year=start_date.year + 1, month=1, day=1)
-        else:
-            next_month_start = start_date.replace(month=start_date.month + 1, day=1)
-        end_date = next_month_start - timedelta(days=1)
-        
-        records = Attendance.query.filter(
-            Attendance.student_id == child.id,
-            Attendance.date >= start_date,
-            Attendance.date <= end_date
-        ).all()
-        
         # Create attendance map for calendar display
-        attendance_map = {}
-        present_count = 0
-        absent_count = 0
-        late_count = 0
-        
-        for record in records:
-            attendance_map[record.date.day] = record.status
-            if record.status == 'present':
-                present_count += 1
-            elif record.status == 'absent':
-                absent_count += 1
-            elif record.status == 'late':
-                late_count += 1
-        
+        attendance_map = {
+            day.day: status
+            for day, status in pivot.statuses(child.id).items()
+            if status != 'not_marked'
+        }
+
+        counts = pivot.counts(child.id)
+        present_count = counts['present']
+        absent_count = counts['absent']
+        late_count = counts['late']
+        total_days = counts['total']
+
         attendance_percentage = None
-        if records:
-            attendance_percentage = round((present_count / len(records)) * 100, 1)
+        if total_days > 0:
+            attendance_percentage = round(counts['percentage'], 1)
         
         children_attendance.append({
             'student': child,
@@ -210,7 +177,7 @@ def attendance():
             'present_count': present_count,
             'absent_count': absent_count,
             'late_count': late_count,
-            'total_days': len(records),
+            'total_days': total_days,
             'attendance_percentage': attendance_percentage,
             'current_month': today.strftime('%B %Y')
         })
@@ -225,7 +192,7 @@ def fee_payments():
         return redirect(url_for('dashboard'))
     
     # Get parent profile
-    parent = Parent.query.filter_by(user_id=current_user.id).first()
+    parent = get_profile()
     
     if not parent:
         flash('Parent profile not found.', 'danger')
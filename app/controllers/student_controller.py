@@ -1,10 +1,24 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import current_user, login_required
 from app.models.models import Student, User, Class, Attendance, ExamResult, FeePayment, db
+from app.services.attendance import attendance_totals
+from app.services.gradebook import student_gradebook
+from app.services.grading import grade_scale
+from app.services.identity import identity_cache, get_profile, get_profile_or_404
+from app.services.pagination import paginate
+from app.services.rankings import membership_changed
 from datetime import datetime
+from sqlalchemy import or_
+from sqlalchemy.orm import contains_eager, joinedload
 
 student_bp = Blueprint('student', __name__)
 
+STUDENT_SORTS = {
+    'name': (User.full_name, 'asc'),
+    'roll': (Student.roll_number, 'asc'),
+    'student_id': (Student.student_id, 'asc'),
+}
+
 # Student list view (for admin and teachers)
 @student_bp.route('/students')
 @login_required
@@ -13,8 +27,20 @@ def student_list():
         flash('Access denied', 'danger')
         return redirect(url_for('dashboard'))
     
-    students = Student.query.join(User).all()
-    return render_template('student/list.html', students=students)
+    # Filters run in SQL; the page is fetched with a keyset cursor
+    query = Student.query.join(User).options(contains_eager(Student.user), joinedload(getattr(Student, 'class')))
+    search = request.args.get('q', '').strip()
+    if search:
+        pattern = f'%{search}%'
+        query = query.filter(or_(User.full_name.ilike(pattern), User.email.ilike(pattern),
+                                 Student.student_id.ilike(pattern)))
+    class_id = request.args.get('class_id', type=int)
+    if class_id:
+        query = query.filter(Student.class_id == class_id)
+    
+    page = paginate(query, STUDENT_SORTS, Student.id, 'name')
+    classes = Class.query.order_by(Class.name, Class.section).all()
+    return render_template('student/list.html', students=page, page=page, classes=classes)
 
 # Student detail view
 @student_bp.route('/students/<int:student_id>')
@@ -121,6 +147,7 @@ def edit_student(student_id):
         user.email = request.form.get('email')
         
         # Update student info
+        previous_class_id = student.class_id
         student.admission_number = request.form.get('admission_number')
         student.roll_number = request.form.get('roll_number')
         student.class_id = request.form.get('class_id')
@@ -131,6 +158,8 @@ def edit_student(student_id):
             student.date_of_birth = datetime.strptime(request.form.get('date_of_birth'), '%Y-%m-%d')
         
         db.session.commit()
+        identity_cache.invalidate(student_id)
+        membership_changed(previous_class_id, student.class_id)
         flash('Student updated successfully!', 'success')
         return redirect(url_for('student.student_list'))
     
@@ -146,12 +175,15 @@ def delete_student(student_id):
     
     student = Student.query.filter_by(user_id=student_id).first_or_404()
     user = User.query.get(student_id)
+    class_id = student.class_id
     
     # Delete student profile first (due to foreign key constraints)
     db.session.delete(student)
     # Then delete user account
     db.session.delete(user)
     db.session.commit()
+    identity_cache.invalidate(student_id)
+    membership_changed(class_id)
     
     flash('Student deleted successfully!', 'success')
     return redirect(url_for('student.student_list'))
@@ -164,15 +196,13 @@ def student_dashboard():
         flash('Access denied', 'danger')
         return redirect(url_for('dashboard'))
     
-    student = Student.query.filter_by(user_id=current_user.id).first_or_404()
+    student = get_profile_or_404()
     
     # Get student's class
     student_class = Class.query.get(student.class_id)
     
     # Get attendance statistics
-    total_days = Attendance.query.filter_by(student_id=current_user.id).count()
-    present_days = Attendance.query.filter_by(student_id=current_user.id, status='present').count()
-    attendance_percentage = (present_days / total_days * 100) if total_days > 0 else 0
+    attendance_percentage = attendance_totals([student.id])[student.id]['percentage']
     
     # Get recent exam results
     recent_results = ExamResult.query.filter_by(student_id=current_user.id).order_by(ExamResult.date.desc()).limit(5).all()
@@ -195,7 +225,7 @@ def my_courses():
         return redirect(url_for('dashboard'))
     from app.models.models import Subject
     
-    student = Student.query.filter_by(user_id=current_user.id).first()
+    student = get_profile()
     courses = []
     
     if student and student.class_id:
@@ -209,9 +239,7 @@ def grades():
     if current_user.role != 'student':
         flash('Access denied', 'danger')
         return redirect(url_for('dashboard'))
-    from app.models.models import Subject, Exam, ExamResult, Attendance
-    
-    student = Student.query.filter_by(user_id=current_user.id).first()
+    student = get_profile()
     grades_data = []
     summary = {
         'gpa': 0.0,
@@ -222,107 +250,42 @@ def grades():
     
     if student and student.class_id:
         # 1. Attendance
-        total_days = Attendance.query.filter_by(student_id=student.user_id).count()
-        present_days = Attendance.query.filter_by(student_id=student.user_id, status='present').count()
-        if total_days > 0:
-            summary['attendance'] = round((present_days / total_days) * 100)
+        totals = attendance_totals([student.id])[student.id]
+        if totals['total'] > 0:
+            summary['attendance'] = round(totals['percentage'])
             
-        # 2. Subjects and Grades
-        subjects = Subject.query.filter_by(class_id=student.class_id).all()
+        # 2. Subjects and Grades, from one joined query
+        scale = grade_scale()
         total_percentage_sum = 0
         subject_count = 0
         
-        for subject in subjects:
-            # Get teacher name
-            teacher_name = subject.teacher.user.full_name if subject.teacher else 'N/A'
-            
-            # Get exams for this subject
-            exams = Exam.query.filter_by(subject_id=subject.id).all()
-            
-            term1_score = '-'
-            term2_score = '-'
-            term3_score = '-'
-            final_term_score = '-'
-            
-            total_score = 0
-            exam_count = 0
-            
-            for exam in exams:
-                result = ExamResult.query.filter_by(exam_id=exam.id, student_id=student.id).first()
-                if result:
-                    score = result.marks # Assuming marks are absolute or normalized to 100
-                    # Check max marks if available
-                    if exam.total_marks > 0:
-                        normalized_score = (score / exam.total_marks) * 100
-                    else:
-                        normalized_score = score
-                    
-                    rounded_score = round(normalized_score)
-                        
-                    if 'Term 1' in exam.exam_type:
-                        term1_score = rounded_score
-                    elif 'Term 2' in exam.exam_type:
-                        term2_score = rounded_score
-                    elif 'Term 3' in exam.exam_type:
-                        term3_score = rounded_score
-                    elif 'Final Term' in exam.exam_type:
-                        final_term_score = rounded_score
-                    
-                    # Include other types (Quiz, etc) in calculation but maybe not column display if purely term based
-                    # Or keep logic simple: include all graded exams in average
-                    total_score += normalized_score
-                    exam_count += 1
-            
+        for entry in student_gradebook(student.id, student.class_id):
             subject_average = 0
-            if exam_count > 0:
-                subject_average = round(total_score / exam_count)
+            if entry['average'] is not None:
+                subject_average = round(entry['average'])
                 total_percentage_sum += subject_average
                 subject_count += 1
-                
-            # Determine Letter Grade
-            grade_letter = 'F'
-            badge_class = 'danger'
-            if subject_average >= 90: grade_letter, badge_class = 'A+', 'success'
-            elif subject_average >= 85: grade_letter, badge_class = 'A', 'success'
-            elif subject_average >= 80: grade_letter, badge_class = 'A-', 'success'
-            elif subject_average >= 75: grade_letter, badge_class = 'B+', 'primary'
-            elif subject_average >= 70: grade_letter, badge_class = 'B', 'primary'
-            elif subject_average >= 65: grade_letter, badge_class = 'C+', 'info'
-            elif subject_average >= 60: grade_letter, badge_class = 'C', 'info'
-            elif subject_average >= 50: grade_letter, badge_class = 'D', 'warning'
+            
+            grade = scale.grade(subject_average if entry['average'] is not None else None)
+            terms = {key: round(value) if value is not None else '-' for key, value in entry['terms'].items()}
             
             grades_data.append({
-                'subject': subject.name,
-                'teacher': teacher_name,
-                'term1': term1_score,
-                'term2': term2_score,
-                'term3': term3_score,
-                'final_term': final_term_score,
-                'total': subject_average if exam_count > 0 else '-',
-                'grade': grade_letter if exam_count > 0 else '-',
-                'badge_class': badge_class
+                'subject': entry['subject'],
+                'teacher': entry['teacher'],
+                'term1': terms['term1'],
+                'term2': terms['term2'],
+                'term3': terms['term3'],
+                'final_term': terms['final_term'],
+                'total': subject_average if entry['average'] is not None else '-',
+                'grade': grade.letter,
+                'badge_class': grade.badge
             })
             
         # 3. Overall Stats
         if subject_count > 0:
-            overall_avg = total_percentage_sum / subject_count
-            
-            # Simple 4.0 GPA scale approximation
-            if overall_avg >= 90: summary['gpa'] = 4.0
-            elif overall_avg >= 85: summary['gpa'] = 3.7
-            elif overall_avg >= 80: summary['gpa'] = 3.3
-            elif overall_avg >= 75: summary['gpa'] = 3.0
-            elif overall_avg >= 70: summary['gpa'] = 2.7
-            elif overall_avg >= 65: summary['gpa'] = 2.3
-            elif overall_avg >= 60: summary['gpa'] = 2.0
-            elif overall_avg >= 50: summary['gpa'] = 1.0
-            else: summary['gpa'] = 0.0
-            
-            if overall_avg >= 90: summary['average_grade'] = 'A'
-            elif overall_avg >= 80: summary['average_grade'] = 'B'
-            elif overall_avg >= 70: summary['average_grade'] = 'C'
-            elif overall_avg >= 60: summary['average_grade'] = 'D'
-            else: summary['average_grade'] = 'F'
+            overall = scale.grade(total_percentage_sum / subject_count)
+            summary['gpa'] = overall.points
+            summary['average_grade'] = overall.letter
             
             summary['credits_earned'] = subject_count * 3 # Assuming 3 credits per subject
             
@@ -345,7 +308,7 @@ def browse_classes():
         flash('Access denied.', 'danger')
         return redirect(url_for('dashboard'))
     
-    student = Student.query.filter_by(user_id=current_user.id).first()
+    student = get_profile()
     
     # Get all available classes
     all_classes = Class.query.all()
@@ -368,30 +331,23 @@ def join_class(class_id):
         flash('Access denied.', 'danger')
         return redirect(url_for('dashboard'))
     
-    student = Student.query.filter_by(user_id=current_user.id).first()
+    student = get_profile()
     if not student:
         flash('Student profile not found.', 'danger')
         return redirect(url_for('dashboard'))
     
     # Update student's class_id
+    previous_class_id = student.class_id
     student.class_id = class_id
     db.session.commit()
+    identity_cache.invalidate(current_user.id)
+    membership_changed(previous_class_id, class_id)
     
     flash('Successfully joined the class!', 'success')
     return redirect(url_for('student.my_courses'))
 
-@student_bp.route('/download-report')
-@login_required
-def download_report():
-    if current_user.role != 'student':
-        flash('Access denied.', 'danger')
-        return redirect(url_for('dashboard'))
-        
-    from flask import Response
-    from app.models.models import Subject, Exam, ExamResult, Attendance, Student, Class
-    
-    student = Student.query.filter_by(user_id=current_user.id).first_or_404()
-    student_class = Class.query.get(student.class_id)
+def _text_report(student):
+    student_class = Class.query.get(student.class_id) if student.class_id else None
     
     # Generate Report Content
     report_lines = []
@@ -399,49 +355,26 @@ def download_report():
     report_lines.append(f"ACADEMIC REPORT CARD - EduSync")
     report_lines.append("="*50)
     report_lines.append(f"Student Name: {current_user.full_name}")
-    report_lines.append(f"Student ID: {current_user.username}") # or similar
+    report_lines.append(f"Student ID: {student.student_id}")
     report_lines.append(f"Class: {student_class.name if student_class else 'Not Assigned'}")
     report_lines.append(f"Date: {datetime.now().strftime('%Y-%m-%d')}")
     report_lines.append("-" * 50)
     
     # Attendance
-    total_days = Attendance.query.filter_by(student_id=current_user.id).count()
-    present_days = Attendance.query.filter_by(student_id=current_user.id, status='present').count()
-    attendance_pct = (present_days / total_days * 100) if total_days > 0 else 0
-    report_lines.append(f"Attendance: {attendance_pct:.1f}% ({present_days}/{total_days} days)")
+    totals = attendance_totals([student.id])[student.id]
+    report_lines.append(f"Attendance: {totals['percentage']:.1f}% ({totals['present']}/{totals['total']} days)")
     report_lines.append("-" * 50)
     report_lines.append("GRADES SUMMARY")
     report_lines.append("-" * 50)
     
     if student.class_id:
-        subjects = Subject.query.filter_by(class_id=student.class_id).all()
-        for subject in subjects:
-            exams = Exam.query.filter_by(subject_id=subject.id).all()
-            total_score = 0
-            count = 0
-            details = []
-            
-            for exam in exams:
-                res = ExamResult.query.filter_by(exam_id=exam.id, student_id=student.id).first()
-                if res:
-                    score = res.marks
-                    total = exam.total_marks
-                    pct = (score/total*100) if total > 0 else 0
-                    total_score += pct
-                    count += 1
-                    details.append(f"  - {exam.title}: {score}/{total} ({pct:.1f}%)")
+        for entry in student_gradebook(student.id, student.class_id):
+            avg = entry['average'] or 0
             
-            avg = total_score / count if count > 0 else 0
-            grade = 'F'
-            if avg >= 90: grade = 'A'
-            elif avg >= 80: grade = 'B'
-            elif avg >= 70: grade = 'C'
-            elif avg >= 60: grade = 'D'
-            
-            report_lines.append(f"Subject: {subject.name}")
-            report_lines.append(f"Average: {avg:.1f}% (Grade: {grade})")
-            if details:
-                report_lines.extend(details)
+            report_lines.append(f"Subject: {entry['subject']}")
+            report_lines.append(f"Average: {avg:.1f}% (Grade: {grade_scale().grade(avg).letter})")
+            for result in entry['results']:
+                report_lines.append(f"  - {result['title']}: {result['marks']}/{result['total_marks']} ({result['percentage']:.1f}%)")
             report_lines.append("")
             
     else:
@@ -450,10 +383,43 @@ def download_report():
     report_lines.append("=" * 50)
     report_lines.append("End of Report")
     
-    content = "\n".join(report_lines)
+    return "\n".join(report_lines)
+
+def _pdf_report(student):
+    from app.services.report_card_pdf import render_report_card
+    from app.services.report_cards import report_card_payloads
+    
+    return render_report_card(report_card_payloads(student_ids=[student.id])[0])
+
+REPORT_FORMATS = {
+    'txt': ('text/plain', lambda student: _text_report(student).encode('utf-8')),
+    'pdf': ('application/pdf', _pdf_report),
+}
+
+@student_bp.route('/download-report')
+@login_required
+def download_report():
+    if current_user.role != 'student':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('dashboard'))
+        
+    from flask import Response
+    from app.services.data_versions import data_version
+    from app.services.report_cache import report_cache
+    
+    fmt = request.args.get('format', 'txt')
+    if fmt not in REPORT_FORMATS:
+        fmt = 'txt'
+    mimetype, build = REPORT_FORMATS[fmt]
+    
+    student = get_profile_or_404()
+    # Served from the cache until the student's attendance or results change (or the date does)
+    key = ('student-report', fmt, student.id, data_version(student.id), student.class_id,
+           current_user.full_name, datetime.now().date().isoformat())
+    content = report_cache.get_or_compute(key, lambda: build(student))
     
     return Response(
         content,
-        mimetype="text/plain",
-        headers={"Content-disposition": "attachment; filename=academic_report.txt"}
+        mimetype=mimetype,
+        headers={"Content-disposition": f"attachment; filename=academic_report.{fmt}"}
     )
\ No newline at end of file
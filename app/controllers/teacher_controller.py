@@ -1,6 +1,12 @@
-from flask import Blueprint, render_template, flash, redirect, url_for, request
+from flask import Blueprint, render_template, flash, redirect, url_for, request, jsonify
 from flask_login import login_required, current_user
-from app.models.models import db, Teacher, Student, Class, Subject
+from app.models.models import db, Student, Class, Subject
+from app.services.database import run_with_retry
+from app.services.exam_stats import exam_summaries
+from app.services.data_versions import bump_exam_versions
+from app.services.gradebook import count_outcomes, load_results, parse_marks, results_changed, save_results, teacher_can_grade
+from app.services.identity import get_profile
+from sqlalchemy.orm import joinedload
 
 teacher_bp = Blueprint('teacher', __name__)
 
@@ -11,7 +17,7 @@ def my_students():
         flash('Access denied.', 'danger')
         return redirect(url_for('dashboard'))
     
-    teacher = Teacher.query.filter_by(user_id=current_user.id).first()
+    teacher = get_profile()
     if not teacher:
         flash('Teacher profile not found.', 'danger')
         return redirect(url_for('dashboard'))
@@ -33,7 +39,7 @@ def my_subjects():
         flash('Access denied.', 'danger')
         return redirect(url_for('dashboard'))
         
-    teacher = Teacher.query.filter_by(user_id=current_user.id).first()
+    teacher = get_profile()
     # Fetch subjects assigned to this teacher
     subjects = Subject.query.filter_by(teacher_id=teacher.id).all() if teacher else []
     return render_template('teacher/my_subjects.html', subjects=subjects)
@@ -51,7 +57,7 @@ def add_subject():
         class_id = request.form.get('class_id') # This is just an integer 1-12 from the form
         description = request.form.get('description')
         
-        teacher = Teacher.query.filter_by(user_id=current_user.id).first()
+        teacher = get_profile()
         
         if not teacher:
              flash('Teacher profile not found.', 'danger')
@@ -100,7 +106,7 @@ def create_exam():
         flash('Access denied.', 'danger')
         return redirect(url_for('dashboard'))
     
-    teacher = Teacher.query.filter_by(user_id=current_user.id).first()
+    teacher = get_profile()
     if not teacher:
         flash('Teacher profile not found.', 'danger')
         return redirect(url_for('dashboard'))
@@ -151,7 +157,7 @@ def my_exams():
         flash('Access denied.', 'danger')
         return redirect(url_for('dashboard'))
     
-    teacher = Teacher.query.filter_by(user_id=current_user.id).first()
+    teacher = get_profile()
     if not teacher:
         flash('Teacher profile not found.', 'danger')
         return redirect(url_for('dashboard'))
@@ -163,7 +169,10 @@ def my_exams():
     # Get exams for teacher's classes
     exams = Exam.query.filter(Exam.class_id.in_(class_ids)).order_by(Exam.exam_date).all() if class_ids else []
     
-    return render_template('teacher/my_exams.html', exams=exams)
+    # Graded count, average and pass rate per exam in one grouped query
+    summaries = exam_summaries(exams)
+    
+    return render_template('teacher/my_exams.html', exams=exams, summaries=summaries)
 
 @teacher_bp.route('/edit-exam/<int:exam_id>', methods=['GET', 'POST'])
 @login_required
@@ -178,12 +187,13 @@ def edit_exam(exam_id):
     exam = Exam.query.get_or_404(exam_id)
     
     # Check if this exam belongs to a class taught by this teacher
-    teacher = Teacher.query.filter_by(user_id=current_user.id).first()
+    teacher = get_profile()
     if not teacher or exam.created_by != current_user.id:
         flash('You do not have permission to edit this exam.', 'danger')
         return redirect(url_for('teacher.my_exams'))
         
     if request.method == 'POST':
+        previous_class_id = exam.class_id
         exam.title = request.form.get('title')
         exam.exam_type = request.form.get('exam_type')
         exam.subject_id = request.form.get('subject_id')
@@ -198,8 +208,12 @@ def edit_exam(exam_id):
         subject = Subject.query.get(exam.subject_id)
         if subject:
             exam.class_id = subject.class_id
-            
+        
+        # Titles and totals show up on the students' reports
+        bump_exam_versions(exam.id)
         db.session.commit()
+        # Total marks feed the histogram bands and percentages; the class may have moved
+        results_changed(exam.id, previous_class_id, exam.class_id)
         flash('Exam updated successfully!', 'success')
         return redirect(url_for('teacher.my_exams'))
         
@@ -223,8 +237,11 @@ def delete_exam(exam_id):
         flash('You do not have permission to delete this exam.', 'danger')
         return redirect(url_for('teacher.my_exams'))
         
+    class_id = exam.class_id
+    bump_exam_versions(exam.id)
     db.session.delete(exam)
     db.session.commit()
+    results_changed(exam_id, class_id)
     
     flash('Exam deleted successfully!', 'success')
     return redirect(url_for('teacher.my_exams'))
@@ -232,8 +249,7 @@ def delete_exam(exam_id):
 @teacher_bp.route('/exam/\u003cint:exam_id\u003e/enter-grades', methods=['GET', 'POST'])
 @login_required
 def enter_grades(exam_id):
-    from app.models.models import Exam, ExamResult
-    from datetime import datetime
+    from app.models.models import Exam
     
     if current_user.role != 'teacher':
         flash('Access denied.', 'danger')
@@ -242,114 +258,166 @@ def enter_grades(exam_id):
     exam = Exam.query.get_or_404(exam_id)
     
     # Check if this exam belongs to a subject taught by this teacher
-    teacher = Teacher.query.filter_by(user_id=current_user.id).first()
+    teacher = get_profile()
     if not teacher:
         flash('Teacher profile not found.', 'danger')
         return redirect(url_for('dashboard'))
     
     # Check if teacher has permission to grade this exam
     # Allow if: teacher teaches the subject OR teacher owns the class OR teacher created the exam
-    has_permission = False
-    
-    if exam.subject and exam.subject.teacher_id == teacher.id:
-        has_permission = True  # Teacher teaches this subject
-    elif exam.class_id:
-        exam_class = Class.query.get(exam.class_id)
-        if exam_class and exam_class.teacher_id == teacher.id:
-            has_permission = True  # Teacher owns this class
-    elif exam.created_by == current_user.id:
-        has_permission = True  # Teacher created this exam
-    
-    if not has_permission:
+    if not teacher_can_grade(teacher, exam, current_user.id):
         flash('You do not have permission to enter grades for this exam.', 'danger')
         return redirect(url_for('teacher.my_exams'))
     
     # Get all students in this exam's class
-    students = Student.query.filter_by(class_id=exam.class_id).all()
+    students = Student.query.options(joinedload(Student.user)).filter_by(class_id=exam.class_id).all()
     
     if request.method == 'POST':
-        # Process grade entries
-        success_count = 0
+        # Validate every entry first, then write the changed ones in one statement
+        entries = {}
         error_count = 0
         
         for student in students:
-            marks_key = f'marks_{student.id}'
-            remarks_key = f'remarks_{student.id}'
-            
-            marks_str = request.form.get(marks_key, '').strip()
-            remarks = request.form.get(remarks_key, '').strip()
+            marks, error = parse_marks(exam, request.form.get(f'marks_{student.id}'))
+            if error:
+                flash(f'Invalid marks for {student.user.full_name}: {error}', 'warning')
+                error_count += 1
+                continue
             
             # Skip if no marks entered
-            if not marks_str:
+            if marks is None:
                 continue
             
-            try:
-                marks = float(marks_str)
-                
-                # Validate marks
-                if marks < 0:
-                    flash(f'Invalid marks for {student.user.full_name}: cannot be negative', 'warning')
-                    error_count += 1
-                    continue
-                    
-                if marks > exam.total_marks:
-                    flash(f'Invalid marks for {student.user.full_name}: exceeds total marks ({exam.total_marks})', 'warning')
-                    error_count += 1
-                    continue
-                
-                # Check if result already exists
-                existing_result = ExamResult.query.filter_by(
-                    exam_id=exam.id,
-                    student_id=student.id
-                ).first()
-                
-                if existing_result:
-                    # Update existing result
-                    existing_result.marks = marks
-                    existing_result.remarks = remarks if remarks else None
-                    existing_result.date = datetime.now()
-                else:
-                    # Create new result
-                    new_result = ExamResult(
-                        exam_id=exam.id,
-                        student_id=student.id,
-                        marks=marks,
-                        remarks=remarks if remarks else None,
-                        date=datetime.now()
-                    )
-                    db.session.add(new_result)
-                
-                success_count += 1
-                
-            except ValueError:
-                flash(f'Invalid marks format for {student.user.full_name}', 'warning')
-                error_count += 1
-                continue
+            remarks = request.form.get(f'remarks_{student.id}', '').strip()
+            entries[student.id] = (marks, remarks)
         
-        if success_count > 0:
-            db.session.commit()
-            flash(f'Successfully saved grades for {success_count} student(s)!', 'success')
+        if entries:
+            def save_grades():
+                outcome = save_results(exam, entries)
+                db.session.commit()
+                return outcome
+            
+            counts = count_outcomes(run_with_retry(save_grades))
+            results_changed(exam.id, exam.class_id)
+            flash(f'Successfully saved grades for {len(entries)} student(s)! '
+                  f"{counts['inserted']} new, {counts['changed']} updated, "
+                  f"{counts['unchanged']} unchanged.", 'success')
         
         if error_count > 0:
             flash(f'{error_count} grade(s) had errors and were not saved.', 'warning')
         
         return redirect(url_for('teacher.my_exams'))
     
-    # GET request - fetch existing results
-    existing_results = {}
-    for student in students:
-        result = ExamResult.query.filter_by(exam_id=exam.id, student_id=student.id).first()
-        if result:
-            existing_results[student.id] = {
-                'marks': result.marks,
-                'remarks': result.remarks
-            }
+    # GET request - existing results for the whole class in one query
+    existing_results = load_results(exam.id)
     
     return render_template('teacher/enter_grades.html', 
                          exam=exam, 
                          students=students,
                          existing_results=existing_results)
 
+def _gradable_exam(exam_id):
+    """The exam if the current teacher may grade it, else None (after flashing why)."""
+    from app.models.models import Exam
+    
+    exam = Exam.query.get_or_404(exam_id)
+    teacher = get_profile()
+    if not teacher:
+        flash('Teacher profile not found.', 'danger')
+        return None
+    if not teacher_can_grade(teacher, exam, current_user.id):
+        flash('You do not have permission to enter grades for this exam.', 'danger')
+        return None
+    return exam
+
+@teacher_bp.route('/exam/<int:exam_id>/import-grades', methods=['GET', 'POST'])
+@login_required
+def import_grades(exam_id):
+    from app.services.results_import import ImportFileError, import_results, validate_results_file
+    
+    wants_json = request.args.get('format') == 'json'
+    if current_user.role != 'teacher':
+        if wants_json:
+            return jsonify({'error': 'Access denied.'}), 403
+        flash('Access denied.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    exam = _gradable_exam(exam_id)
+    if exam is None:
+        if wants_json:
+            return jsonify({'error': 'You do not have permission to enter grades for this exam.'}), 403
+        return redirect(url_for('teacher.my_exams'))
+    
+    report = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        dry_run = bool(request.form.get('dry_run'))
+        try:
+            if not upload or not upload.filename:
+                raise ImportFileError('Choose a file to upload.')
+            # Streams the upload; only validated entries are kept in memory
+            entries, report = validate_results_file(exam, upload.stream, upload.filename)
+        except ImportFileError as exc:
+            if wants_json:
+                return jsonify({'error': str(exc)}), 400
+            flash(str(exc), 'danger')
+            return redirect(url_for('teacher.import_grades', exam_id=exam.id))
+        
+        report['dry_run'] = dry_run
+        report['imported'] = {'inserted': 0, 'changed': 0, 'unchanged': 0}
+        if entries and not dry_run:
+            def save_import():
+                counts = import_results(exam, entries)
+                db.session.commit()
+                return counts
+            
+            report['imported'] = run_with_retry(save_import)
+            results_changed(exam.id, exam.class_id)
+        
+        if wants_json:
+            return jsonify(report)
+        if dry_run:
+            flash(f"Checked {report['rows']} row(s): {report['valid']} valid, "
+                  f"{report['error_count']} with errors. Nothing was saved.", 'info')
+        else:
+            counts = report['imported']
+            flash(f"Imported {report['valid']} of {report['rows']} row(s): {counts['inserted']} new, "
+                  f"{counts['changed']} updated, {counts['unchanged']} unchanged.", 'success')
+        if report['error_count']:
+            flash(f"{report['error_count']} row(s) had errors and were skipped.", 'warning')
+    
+    return render_template('teacher/import_grades.html', exam=exam, report=report)
+
+# Roster CSV to fill in and upload to import_grades
+@teacher_bp.route('/exam/<int:exam_id>/import-grades/template.csv')
+@login_required
+def import_grades_template(exam_id):
+    import csv
+    import io
+    from flask import Response
+    
+    if current_user.role != 'teacher':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('dashboard'))
+    exam = _gradable_exam(exam_id)
+    if exam is None:
+        return redirect(url_for('teacher.my_exams'))
+    
+    existing = load_results(exam.id)
+    students = (Student.query.options(joinedload(Student.user)).filter_by(class_id=exam.class_id)
+                .order_by(Student.roll_number).all())
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['student_id', 'name', 'marks', 'remarks'])
+    for student in students:
+        result = existing.get(student.id, {})
+        writer.writerow([student.student_id, student.user.full_name,
+                         '' if result.get('marks') is None else f"{result['marks']:g}", result.get('remarks') or ''])
+    
+    filename = f'results-{exam.id}.csv'
+    return Response('\ufeff' + buffer.getvalue(), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
 @teacher_bp.route('/create-class', methods=['GET', 'POST'])
 @login_required
 def create_class():
@@ -357,7 +425,7 @@ def create_class():
         flash('Access denied.', 'danger')
         return redirect(url_for('dashboard'))
     
-    teacher = Teacher.query.filter_by(user_id=current_user.id).first()
+    teacher = get_profile()
     if not teacher:
         flash('Teacher profile not found.', 'danger')
         return redirect(url_for('dashboard'))
@@ -394,7 +462,7 @@ def my_classes():
         flash('Access denied.', 'danger')
         return redirect(url_for('dashboard'))
     
-    teacher = Teacher.query.filter_by(user_id=current_user.id).first()
+    teacher = get_profile()
     if not teacher:
         flash('Teacher profile not found.', 'danger')
         return redirect(url_for('dashboard'))
@@ -417,7 +485,7 @@ def upload_resource():
         flash('Access denied.', 'danger')
         return redirect(url_for('dashboard'))
     
-    teacher = Teacher.query.filter_by(user_id=current_user.id).first()
+    teacher = get_profile()
     if not teacher:
         flash('Teacher profile not found.', 'danger')
         return redirect(url_for('dashboard'))
@@ -483,7 +551,7 @@ def my_resources():
         flash('Access denied.', 'danger')
         return redirect(url_for('dashboard'))
         
-    teacher = Teacher.query.filter_by(user_id=current_user.id).first()
+    teacher = get_profile()
     
     # Get resources uploaded by this teacher
     resources = Resource.query.filter_by(uploaded_by=current_user.id).order_by(Resource.uploaded_at.desc()).all()
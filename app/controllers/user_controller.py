@@ -2,12 +2,22 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, current_user, login_required
 from werkzeug.security import generate_password_hash
 from app.models.models import User, Admin, Teacher, Student, Parent, db
+from app.services.identity import identity_cache
+from app.services.messaging import invalidate_contacts
+from app.services.pagination import paginate
 from datetime import datetime
 from flask_bcrypt import Bcrypt
+from sqlalchemy import or_
 
 bcrypt = Bcrypt()
 user_bp = Blueprint('user', __name__)
 
+USER_SORTS = {
+    'created': (User.created_at, 'asc'),
+    'name': (User.full_name, 'asc'),
+    'email': (User.email, 'asc'),
+}
+
 # User profile view
 @user_bp.route('/profile')
 @login_required
@@ -39,6 +49,8 @@ def update_profile():
                 user.profile_pic = f"/static/images/profiles/{filename}"
         
         db.session.commit()
+        invalidate_contacts()
+        identity_cache.invalidate(user.id)
         flash('Profile updated successfully!', 'success')
         return redirect(url_for('user.profile'))
 
@@ -65,6 +77,7 @@ def change_password():
         user = User.query.get(current_user.id)
         user.password = bcrypt.generate_password_hash(new_password).decode('utf-8')
         db.session.commit()
+        identity_cache.invalidate(user.id)
         
         flash('Password changed successfully!', 'success')
         return redirect(url_for('user.profile'))
@@ -79,8 +92,17 @@ def admin_users():
         flash('Access denied', 'danger')
         return redirect(url_for('dashboard'))
     
-    users = User.query.order_by(User.created_at.asc()).all()
-    return render_template('admin/users.html', users=users)
+    # Filters run in SQL; the page is fetched with a keyset cursor
+    query = User.query
+    search = request.args.get('q', '').strip()
+    if search:
+        query = query.filter(or_(User.full_name.ilike(f'%{search}%'), User.email.ilike(f'%{search}%')))
+    role = request.args.get('role', '').strip()
+    if role:
+        query = query.filter(User.role == role)
+    
+    page = paginate(query, USER_SORTS, User.id, 'created')
+    return render_template('admin/users.html', users=page, page=page)
 
 # Create new user (admin only)
 @user_bp.route('/admin/users/create', methods=['GET', 'POST'])
@@ -154,6 +176,7 @@ def create_user():
             db.session.add(profile)
         
         db.session.commit()
+        invalidate_contacts()
         flash(f'New {role} created successfully!', 'success')
         return redirect(url_for('user.admin_users'))
     
@@ -185,6 +208,8 @@ def edit_user(user_id):
             user.password = bcrypt.generate_password_hash(request.form.get('password')).decode('utf-8')
         
         db.session.commit()
+        invalidate_contacts()
+        identity_cache.invalidate(user.id)
         flash('User updated successfully!', 'success')
         return redirect(url_for('user.admin_users'))
     
@@ -217,6 +242,8 @@ def delete_user(user_id):
 
     db.session.delete(user)
     db.session.commit()
+    invalidate_contacts()
+    identity_cache.invalidate(user_id)
     
     flash('User deleted successfully!', 'success')
     return redirect(url_for('user.admin_users'))
\ No newline at end of file
@@ -0,0 +1,13 @@
+# Extension instances, bound to an app in create_app()
+from datetime import timedelta
+
+from flask_bcrypt import Bcrypt
+from flask_login import LoginManager
+from flask_wtf.csrf import CSRFProtect
+
+bcrypt = Bcrypt()
+csrf = CSRFProtect()
+login_manager = LoginManager()
+login_manager.login_view = 'login'
+login_manager.login_message_category = 'info'
+login_manager.remember_cookie_duration = timedelta(days=30)  # 30 days remember me
@@ -5,7 +5,7 @@ from app.models.models import db
 
 # Import all models
 from app.models.models import User, Admin, Teacher, Student, Parent, Class, Attendance, Exam, ExamResult, FeePayment, Subject
-from app.models.message import Message
+from app.models.message import Message, UnreadCounter
 
 # Export everything
-__all__ = ['db', 'User', 'Admin', 'Teacher', 'Student', 'Parent', 'Class', 'Attendance', 'Exam', 'ExamResult', 'FeePayment', 'Subject', 'Message']
\ No newline at end of file
+__all__ = ['db', 'User', 'Admin', 'Teacher', 'Student', 'Parent', 'Class', 'Attendance', 'Exam', 'ExamResult', 'FeePayment', 'Subject', 'Message', 'UnreadCounter']
\ No newline at end of file
@@ -3,6 +3,12 @@ from datetime import datetime
 
 class Message(db.Model):
     __tablename__ = 'messages'
+    __table_args__ = (
+        db.Index('ix_messages_recipient_read', 'recipient_id', 'is_read'),
+        db.Index('ix_messages_pair_time', 'sender_id', 'recipient_id', 'timestamp'),
+        # Received side of the inbox query; with ix_messages_pair_time it never reads the table
+        db.Index('ix_messages_inbox', 'recipient_id', 'sender_id', 'timestamp', 'is_read'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -12,4 +18,14 @@ class Message(db.Model):
     is_read = db.Column(db.Boolean, default=False)
     
     def __repr__(self):
-        return f"Message('{self.sender_id}' to '{self.recipient_id}', '{self.timestamp}')"
\ No newline at end of file
+        return f"Message('{self.sender_id}' to '{self.recipient_id}', '{self.timestamp}')"
+
+# Denormalised count of unread messages per recipient, kept in step by app/services/messaging.py
+class UnreadCounter(db.Model):
+    __tablename__ = 'unread_counters'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<UnreadCounter {self.user_id}: {self.count}>'
@@ -8,6 +8,11 @@ db = SQLAlchemy()
 # User model
 class User(db.Model, UserMixin):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Sort keys of the paginated user and student lists
+        db.Index('ix_users_created_at', 'created_at'),
+        db.Index('ix_users_full_name', 'full_name'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(100), unique=True, nullable=False)
@@ -36,7 +41,7 @@ class Admin(db.Model):
     __tablename__ = 'admins'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     admin_id = db.Column(db.String(20), unique=True, nullable=False)
     department = db.Column(db.String(50))
     
@@ -48,7 +53,7 @@ class Teacher(db.Model):
     __tablename__ = 'teachers'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     teacher_id = db.Column(db.String(20), unique=True, nullable=False)
     subject = db.Column(db.String(50))
     qualification = db.Column(db.String(100))
@@ -64,11 +69,11 @@ class Student(db.Model):
     __tablename__ = 'students'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     student_id = db.Column(db.String(20), unique=True, nullable=False)
     roll_number = db.Column(db.String(20))
-    class_id = db.Column(db.Integer, db.ForeignKey('classes.id'))
-    parent_id = db.Column(db.Integer, db.ForeignKey('parents.id'))
+    class_id = db.Column(db.Integer, db.ForeignKey('classes.id'), index=True)
+    parent_id = db.Column(db.Integer, db.ForeignKey('parents.id'), index=True)
     date_of_birth = db.Column(db.Date)
     address = db.Column(db.String(200))
     
@@ -84,7 +89,7 @@ class Parent(db.Model):
     __tablename__ = 'parents'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     parent_id = db.Column(db.String(20), unique=True, nullable=False)
     phone = db.Column(db.String(20))
     occupation = db.Column(db.String(50))
@@ -115,6 +120,11 @@ class Class(db.Model):
 # Attendance model
 class Attendance(db.Model):
     __tablename__ = 'attendances'
+    __table_args__ = (
+        # One attendance row per student per day
+        db.Index('uq_attendances_student_date', 'student_id', 'date', unique=True),
+        db.Index('ix_attendances_class_date', 'class_id', 'date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
@@ -126,16 +136,58 @@ class Attendance(db.Model):
     def __repr__(self):
         return f'<Attendance {self.student_id} {self.date}>'
 
+# Monthly attendance rollup, maintained by services.attendance.mark_class_attendance
+class AttendanceMonthlySummary(db.Model):
+    __tablename__ = 'attendance_monthly_summaries'
+    __table_args__ = (
+        db.Index('uq_attendance_summaries_student_month', 'student_id', 'year', 'month', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    present = db.Column(db.Integer, nullable=False, default=0)
+    absent = db.Column(db.Integer, nullable=False, default=0)
+    late = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    
+    @property
+    def percentage(self):
+        # Late days count as marked but not present
+        return (self.present / self.total * 100) if self.total > 0 else 0
+    
+    def __repr__(self):
+        return f'<AttendanceMonthlySummary {self.student_id} {self.year}-{self.month:02d}>'
+
+# One student's attendance for a calendar year, 2 bits per day (see app/services/attendance_archive.py)
+class AttendanceArchive(db.Model):
+    __tablename__ = 'attendance_archives'
+    __table_args__ = (
+        db.Index('uq_attendance_archives_student_year', 'student_id', 'year', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    days = db.Column(db.LargeBinary, nullable=False)
+
+    def __repr__(self):
+        return f'<AttendanceArchive {self.student_id} {self.year}>'
+
 # Exam model
 class Exam(db.Model):
     __tablename__ = 'exams'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        db.Index('ix_exams_exam_date', 'exam_date'),
+        {'extend_existing': True},
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)  # Unified from name/title
     exam_type = db.Column(db.String(50), nullable=False)  # midterm, final, quiz, etc.
-    class_id = db.Column(db.Integer, db.ForeignKey('classes.id'), nullable=False)
-    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=False)
+    class_id = db.Column(db.Integer, db.ForeignKey('classes.id'), nullable=False, index=True)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=False, index=True)
     exam_date = db.Column(db.DateTime, nullable=False)  # Unified from date/exam_date
     start_time = db.Column(db.Time)
     end_time = db.Column(db.Time)
@@ -158,6 +210,11 @@ class Exam(db.Model):
 # Exam Result model
 class ExamResult(db.Model):
     __tablename__ = 'exam_results'
+    __table_args__ = (
+        # One result per student per exam
+        db.Index('uq_exam_results_exam_student', 'exam_id', 'student_id', unique=True),
+        db.Index('ix_exam_results_student_id', 'student_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     exam_id = db.Column(db.Integer, db.ForeignKey('exams.id'), nullable=False)
@@ -169,9 +226,22 @@ class ExamResult(db.Model):
     def __repr__(self):
         return f'<ExamResult {self.exam_id} {self.student_id}>'
 
+# Counter bumped whenever a student's attendance or results change (see app/services/data_versions.py)
+class StudentDataVersion(db.Model):
+    __tablename__ = 'student_data_versions'
+    
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<StudentDataVersion {self.student_id} v{self.version}>'
+
 # Fee Payment model
 class FeePayment(db.Model):
     __tablename__ = 'fee_payments'
+    __table_args__ = (
+        db.Index('ix_fee_payments_student_status', 'student_id', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
@@ -195,8 +265,8 @@ class Subject(db.Model):
     name = db.Column(db.String(100), nullable=False)
     code = db.Column(db.String(20), unique=True)
     description = db.Column(db.Text)
-    class_id = db.Column(db.Integer, db.ForeignKey('classes.id'))
-    teacher_id = db.Column(db.Integer, db.ForeignKey('teachers.id'))
+    class_id = db.Column(db.Integer, db.ForeignKey('classes.id'), index=True)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('teachers.id'), index=True)
     
     # Relationships
     class_rel = db.relationship('Class', backref='subjects')
@@ -208,6 +278,9 @@ class Subject(db.Model):
 # Assignment model
 class Assignment(db.Model):
     __tablename__ = 'assignments'
+    __table_args__ = (
+        db.Index('ix_assignments_created_at', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(150), nullable=False)
@@ -227,6 +300,10 @@ class Assignment(db.Model):
 # Announcement model
 class Announcement(db.Model):
     __tablename__ = 'announcements'
+    __table_args__ = (
+        db.Index('ix_announcements_audience_created', 'audience_role', 'created_at'),
+        db.Index('ix_announcements_created_at', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(150), nullable=False)
@@ -262,6 +339,9 @@ class StudentEnrollment(db.Model):
 # Resource model
 class Resource(db.Model):
     __tablename__ = 'resources'
+    __table_args__ = (
+        db.Index('ix_resources_uploaded_at', 'uploaded_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(150), nullable=False)
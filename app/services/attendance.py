@@ -0,0 +1,251 @@
+"""Set-based attendance reads and writes.
+
+Marking a class used to cost one SELECT and one DELETE per student plus an
+INSERT per student. ``mark_class_attendance`` reads the existing statuses
+with a single IN query and writes only new or changed rows with one
+executemany upsert keyed on the (student_id, date) unique index.
+
+The same call keeps ``AttendanceMonthlySummary`` in step: the per-student
+status changes are applied as +/- deltas to the (student, year, month) rows
+in the same transaction, so dashboards read one summary row per child
+instead of a month of attendance rows. The bit-packed yearly archive in
+``attendance_archive`` is updated there as well.
+
+``AttendancePivot`` loads a date range for a set of students in one query
+and keeps it as a student x day matrix of one-byte status codes, so the
+per-student counts are ``bytearray.count`` calls instead of Python loops.
+"""
+import calendar
+from datetime import date, timedelta
+
+from sqlalchemy import case, delete, func, insert, select
+
+from app.models.models import db, Attendance, AttendanceMonthlySummary
+from app.services.data_versions import bump_versions
+from app.services.database import upsert_insert
+
+STATUSES = ('present', 'absent', 'late')
+SUMMARY_COUNTS = ('present', 'absent', 'late', 'total')
+
+# Matrix cell values; 0 means no attendance recorded for that day
+NOT_MARKED = 0
+STATUS_CODES = {'present': 1, 'absent': 2, 'late': 3}
+CODE_STATUSES = ('not_marked', 'present', 'absent', 'late')
+
+
+def statuses_for_day(class_id, day):
+    """{student_id: status} for every attendance row of a class on ``day``."""
+    rows = db.session.execute(
+        select(Attendance.student_id, Attendance.status)
+        .where(Attendance.class_id == class_id, Attendance.date == day)
+    )
+    return dict(rows.all())
+
+
+def mark_class_attendance(class_id, day, statuses, marked_by):
+    """Upsert attendance for one class and day without committing.
+
+    ``statuses`` maps student id to 'present', 'absent' or 'late'; students
+    with a missing or unknown status are left untouched. Returns counts of
+    inserted, changed and unchanged rows.
+    """
+    statuses = {student_id: status for student_id, status in statuses.items() if status in STATUSES}
+    counts = {'inserted': 0, 'changed': 0, 'unchanged': 0}
+    if not statuses:
+        return counts
+
+    # One row per student per day, whichever class it was recorded under
+    existing = {
+        student_id: (row_class_id, status)
+        for student_id, row_class_id, status in db.session.execute(
+            select(Attendance.student_id, Attendance.class_id, Attendance.status)
+            .where(Attendance.student_id.in_(list(statuses)), Attendance.date == day)
+        )
+    }
+
+    rows = []
+    summary_deltas = []
+    for student_id, status in statuses.items():
+        previous = existing.get(student_id)
+        delta = dict.fromkeys(SUMMARY_COUNTS, 0)
+        if previous is None:
+            counts['inserted'] += 1
+            delta[status] += 1
+            delta['total'] += 1
+        elif previous == (class_id, status):
+            counts['unchanged'] += 1
+            continue
+        else:
+            counts['changed'] += 1
+            if previous[1] != status:
+                delta[previous[1]] -= 1
+                delta[status] += 1
+        if any(delta.values()):
+            delta['student_id'] = student_id
+            summary_deltas.append(delta)
+        rows.append({
+            'student_id': student_id,
+            'class_id': class_id,
+            'date': day,
+            'status': status,
+            'marked_by': marked_by,
+        })
+
+    if rows:
+        stmt = upsert_insert(Attendance.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['student_id', 'date'],
+            set_={
+                'class_id': stmt.excluded.class_id,
+                'status': stmt.excluded.status,
+                'marked_by': stmt.excluded.marked_by,
+            },
+        )
+        db.session.execute(stmt, rows)
+    if summary_deltas:
+        _add_to_monthly_summaries(day.year, day.month, summary_deltas)
+    if rows:
+        from app.services.attendance_archive import record_statuses
+        record_statuses(day, {row['student_id']: row['status'] for row in rows})
+        bump_versions(row['student_id'] for row in rows)
+    return counts
+
+
+def _add_to_monthly_summaries(year, month, deltas):
+    table = AttendanceMonthlySummary.__table__
+    stmt = upsert_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['student_id', 'year', 'month'],
+        set_={name: table.c[name] + stmt.excluded[name] for name in SUMMARY_COUNTS},
+    )
+    db.session.execute(stmt, [dict(delta, year=year, month=month) for delta in deltas])
+
+
+def monthly_summaries(student_ids, year, month):
+    """{student_id: AttendanceMonthlySummary} for one month, in one query."""
+    student_ids = list(student_ids)
+    if not student_ids:
+        return {}
+    summaries = AttendanceMonthlySummary.query.filter(
+        AttendanceMonthlySummary.student_id.in_(student_ids),
+        AttendanceMonthlySummary.year == year,
+        AttendanceMonthlySummary.month == month,
+    ).all()
+    return {summary.student_id: summary for summary in summaries}
+
+
+def attendance_totals(student_ids):
+    """All-time present/absent/late/total counts and percentage per student."""
+    student_ids = list(student_ids)
+    totals = {
+        student_id: {'present': 0, 'absent': 0, 'late': 0, 'total': 0, 'percentage': 0}
+        for student_id in student_ids
+    }
+    if not student_ids:
+        return totals
+    table = AttendanceMonthlySummary
+    rows = db.session.execute(
+        select(table.student_id, *[func.sum(getattr(table, name)) for name in SUMMARY_COUNTS])
+        .where(table.student_id.in_(student_ids))
+        .group_by(table.student_id)
+    )
+    for student_id, present, absent, late, total in rows:
+        totals[student_id] = {
+            'present': present,
+            'absent': absent,
+            'late': late,
+            'total': total,
+            'percentage': (present / total * 100) if total > 0 else 0,
+        }
+    return totals
+
+
+def rebuild_monthly_summaries():
+    """Recompute every summary row from the attendance table (no commit).
+
+    Used to backfill existing data and to repair drift. Returns the number
+    of summary rows written.
+    """
+    year = func.extract('year', Attendance.date)
+    month = func.extract('month', Attendance.date)
+    aggregate = (
+        select(
+            Attendance.student_id,
+            year,
+            month,
+            *[func.sum(case((Attendance.status == name, 1), else_=0)) for name in STATUSES],
+            func.count(),
+        )
+        .where(Attendance.status.in_(STATUSES))
+        .group_by(Attendance.student_id, year, month)
+    )
+    db.session.execute(delete(AttendanceMonthlySummary))
+    result = db.session.execute(
+        insert(AttendanceMonthlySummary).from_select(
+            ['student_id', 'year', 'month', *SUMMARY_COUNTS], aggregate
+        )
+    )
+    return result.rowcount
+
+
+def month_days(year, month):
+    num_days = calendar.monthrange(year, month)[1]
+    return [date(year, month, day) for day in range(1, num_days + 1)]
+
+
+class AttendancePivot:
+    """Student x day attendance matrix for a date range."""
+
+    def __init__(self, student_ids, days, rows):
+        self.student_ids = list(student_ids)
+        self.days = list(days)
+        self._day_index = {day: i for i, day in enumerate(self.days)}
+        width = len(self.days)
+        self.matrix = {student_id: bytearray(width) for student_id in self.student_ids}
+        for student_id, day, status in rows:
+            row = self.matrix.get(student_id)
+            index = self._day_index.get(day)
+            if row is not None and index is not None:
+                row[index] = STATUS_CODES.get(status, NOT_MARKED)
+
+    @classmethod
+    def load(cls, student_ids, start, end):
+        """Fetch every attendance row for ``student_ids`` between two dates (inclusive)."""
+        student_ids = list(student_ids)
+        days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+        rows = []
+        if student_ids:
+            rows = db.session.execute(
+                select(Attendance.student_id, Attendance.date, Attendance.status)
+                .where(Attendance.student_id.in_(student_ids),
+                       Attendance.date >= start, Attendance.date <= end)
+            ).all()
+        return cls(student_ids, days, rows)
+
+    @classmethod
+    def for_month(cls, student_ids, year, month):
+        days = month_days(year, month)
+        return cls.load(student_ids, days[0], days[-1])
+
+    def counts(self, student_id):
+        row = self.matrix[student_id]
+        present = row.count(STATUS_CODES['present'])
+        absent = row.count(STATUS_CODES['absent'])
+        late = row.count(STATUS_CODES['late'])
+        total = present + absent + late
+        return {
+            'present': present,
+            'absent': absent,
+            'late': late,
+            'total': total,
+            # Late days count as marked but not present, as before
+            'percentage': (present / total * 100) if total > 0 else 0,
+        }
+
+    def statuses(self, student_id):
+        """{day: 'present' | 'absent' | 'late' | 'not_marked'} for one student."""
+        row = self.matrix[student_id]
+        return {day: CODE_STATUSES[code] for day, code in zip(self.days, row)}
+
+    def status(self, student_id, day):
+        return CODE_STATUSES[self.matrix[student_id][self._day_index[day]]]
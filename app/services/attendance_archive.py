@@ -0,0 +1,183 @@
+"""Bit-packed attendance archive for year-long analytics.
+
+Each ``AttendanceArchive`` row holds one student's calendar year at 2 bits
+per day (92 bytes), using the ``AttendancePivot`` codes: 0 not marked,
+1 present, 2 absent, 3 late. Day ``n`` of the year (0-based) is stored in
+byte ``n // 4`` at bit offset ``2 * (n % 4)``.
+
+``mark_class_attendance`` updates the archive in the same transaction as
+``Attendance``. The readers fetch plain (student_id, year, days) tuples with
+Core selects and unpack them to one byte per day, so counts, streaks and
+weekday patterns come from ``bytes.count``/``split``/slicing and a
+school-year query never builds ORM rows.
+"""
+import calendar
+from datetime import date
+
+from sqlalchemy import delete, insert, select
+
+from app.models.models import db, Attendance, AttendanceArchive
+from app.services.attendance import NOT_MARKED, STATUS_CODES
+from app.services.database import upsert_insert
+
+YEAR_BYTES = 92  # 366 days at 4 days per byte
+
+# Byte value -> its four day codes, lowest bits first
+_UNPACK = [bytes((value >> shift) & 3 for shift in (0, 2, 4, 6)) for value in range(256)]
+# Absent and late both end a present streak
+_STREAK_BREAKS = bytes.maketrans(b'\x03', b'\x02')
+
+REBUILD_BATCH_SIZE = 500
+
+
+def day_index(day):
+    return day.toordinal() - date(day.year, 1, 1).toordinal()
+
+
+def unpack(days):
+    """One code byte per day for a year's archive bytes."""
+    return b''.join([_UNPACK[value] for value in days])
+
+
+def set_code(packed, index, code):
+    shift = (index & 3) * 2
+    packed[index >> 2] = (packed[index >> 2] & ~(3 << shift) & 0xFF) | (code << shift)
+
+
+def record_statuses(day, statuses):
+    """Write {student_id: status} for ``day`` into the archives without committing."""
+    if not statuses:
+        return
+    table = AttendanceArchive.__table__
+    # Read-modify-write: lock the rows where the backend supports it (SQLite
+    # already holds the write lock from the attendance upsert)
+    current = dict(db.session.execute(
+        select(table.c.student_id, table.c.days)
+        .where(table.c.student_id.in_(list(statuses)), table.c.year == day.year)
+        .with_for_update()
+    ).all())
+
+    index = day_index(day)
+    rows = []
+    for student_id, status in statuses.items():
+        packed = bytearray(current.get(student_id) or bytes(YEAR_BYTES))
+        set_code(packed, index, STATUS_CODES[status])
+        rows.append({'student_id': student_id, 'year': day.year, 'days': bytes(packed)})
+
+    stmt = upsert_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['student_id', 'year'],
+        set_={'days': stmt.excluded.days},
+    )
+    db.session.execute(stmt, rows)
+
+
+def load_codes(student_ids, start, end):
+    """{student_id: bytes} with one code per day from ``start`` to ``end`` inclusive."""
+    student_ids = list(student_ids)
+    archives = {student_id: {} for student_id in student_ids}
+    if student_ids:
+        table = AttendanceArchive.__table__
+        rows = db.session.execute(
+            select(table.c.student_id, table.c.year, table.c.days)
+            .where(table.c.student_id.in_(student_ids),
+                   table.c.year >= start.year, table.c.year <= end.year)
+        )
+        for student_id, year, days in rows:
+            archives[student_id][year] = days
+
+    codes = {}
+    for student_id, years in archives.items():
+        parts = []
+        for year in range(start.year, end.year + 1):
+            first = day_index(start) if year == start.year else 0
+            last = day_index(end) if year == end.year else 364 + calendar.isleap(year)
+            length = last - first + 1
+            if year in years:
+                parts.append(unpack(years[year])[first:last + 1])
+            else:
+                parts.append(bytes(length))
+        codes[student_id] = b''.join(parts)
+    return codes
+
+
+def code_stats(codes, start):
+    """Counts, present streaks and weekday breakdown for a run of day codes.
+
+    A streak is consecutive marked days that were all present; days with
+    nothing recorded (weekends, holidays) neither extend nor break it.
+    """
+    present = codes.count(STATUS_CODES['present'])
+    absent = codes.count(STATUS_CODES['absent'])
+    late = codes.count(STATUS_CODES['late'])
+    total = present + absent + late
+
+    marked = codes.translate(None, bytes([NOT_MARKED]))
+    runs = marked.translate(_STREAK_BREAKS).split(bytes([STATUS_CODES['absent']]))
+
+    weekdays = {}
+    first_weekday = start.weekday()
+    for offset in range(7):
+        day_codes = codes[offset::7]
+        weekdays[calendar.day_abbr[(first_weekday + offset) % 7]] = {
+            status: day_codes.count(code) for status, code in STATUS_CODES.items()
+        }
+
+    return {
+        'present': present,
+        'absent': absent,
+        'late': late,
+        'total': total,
+        'percentage': (present / total * 100) if total > 0 else 0,
+        'longest_streak': max(len(run) for run in runs),
+        'current_streak': len(runs[-1]),
+        'weekdays': {name: weekdays[name] for name in calendar.day_abbr},
+    }
+
+
+def range_stats(student_ids, start, end):
+    """{student_id: code_stats(...)} for every student over a date range."""
+    return {
+        student_id: code_stats(codes, start)
+        for student_id, codes in load_codes(student_ids, start, end).items()
+    }
+
+
+def rebuild_archives():
+    """Re-pack every archive from the attendance table (no commit).
+
+    Streams attendance ordered by student and date, so only one archive is
+    being built at a time. Returns the number of archive rows written.
+    """
+    db.session.execute(delete(AttendanceArchive))
+    rows = db.session.execute(
+        select(Attendance.student_id, Attendance.date, Attendance.status)
+        .where(Attendance.status.in_(list(STATUS_CODES)))
+        .order_by(Attendance.student_id, Attendance.date)
+        .execution_options(yield_per=5000)
+    )
+
+    batch = []
+    written = 0
+    key = None
+    packed = None
+    for student_id, day, status in rows:
+        if (student_id, day.year) != key:
+            if key is not None:
+                batch.append({'student_id': key[0], 'year': key[1], 'days': bytes(packed)})
+            key = (student_id, day.year)
+            packed = bytearray(YEAR_BYTES)
+        set_code(packed, day_index(day), STATUS_CODES[status])
+        if len(batch) >= REBUILD_BATCH_SIZE:
+            written += _insert_archives(batch)
+            batch = []
+    if key is not None:
+        batch.append({'student_id': key[0], 'year': key[1], 'days': bytes(packed)})
+    if batch:
+        written += _insert_archives(batch)
+    return written
+
+
+def _insert_archives(batch):
+    db.session.execute(insert(AttendanceArchive), batch)
+    return len(batch)
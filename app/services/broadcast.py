@@ -0,0 +1,106 @@
+"""Send one message to a whole audience at once.
+
+An audience is a kind plus a target: the students or parents of a class,
+the students or parents of a grade (every section with the class's name),
+the students of a subject (its class plus anyone enrolled in it) or every
+user with a role. ``audience_recipients`` resolves it to user ids with one
+query. ``send_broadcast`` writes one ``messages`` row per recipient with a
+single executemany, adds to every recipient's unread counter with one more,
+and leaves the commit to the caller; ``publish_broadcast`` then queues all
+the pushes in one write to the real-time bus.
+"""
+from datetime import datetime
+
+from flask import url_for
+from sqlalchemy import insert, or_, select
+
+from app.models.models import db, Class, Parent, Student, StudentEnrollment, Subject, User
+from app.models.message import Message, UnreadCounter
+from app.services.messaging import increment_unread
+from app.services.realtime import realtime
+
+# kind -> (label, what the target id refers to)
+AUDIENCES = {
+    'class_students': ('Students of a class', 'class'),
+    'class_parents': ('Parents of a class', 'class'),
+    'grade_students': ('Students of a grade (all sections)', 'class'),
+    'grade_parents': ('Parents of a grade (all sections)', 'class'),
+    'subject_students': ('Students of a subject', 'subject'),
+    'role': ('Everyone with a role', 'role'),
+}
+ROLES = ('admin', 'teacher', 'student', 'parent')
+
+
+def _class_ids(kind, class_id):
+    if kind.startswith('grade_'):
+        grade = select(Class.name).where(Class.id == class_id).scalar_subquery()
+        return select(Class.id).where(Class.name == grade)
+    return [class_id]
+
+
+def _audience_query(kind, target):
+    if kind in ('class_students', 'grade_students'):
+        return select(Student.user_id).where(Student.class_id.in_(_class_ids(kind, target)))
+    if kind in ('class_parents', 'grade_parents'):
+        return (
+            select(Parent.user_id)
+            .join(Student, Student.parent_id == Parent.id)
+            .where(Student.class_id.in_(_class_ids(kind, target)))
+        )
+    if kind == 'subject_students':
+        subject_class = select(Subject.class_id).where(Subject.id == target).scalar_subquery()
+        enrolled = select(StudentEnrollment.student_id).where(StudentEnrollment.subject_id == target)
+        return select(Student.user_id).where(or_(Student.class_id == subject_class, Student.id.in_(enrolled)))
+    if kind == 'role':
+        return select(User.id).where(User.role == target)
+    raise ValueError(f'Unknown audience {kind!r}')
+
+
+def audience_recipients(kind, target, exclude=None):
+    """Distinct user ids in the audience, in id order, leaving out ``exclude`` (the sender)."""
+    recipients = _audience_query(kind, target).subquery()
+    user_id = recipients.c[0]
+    query = select(user_id).distinct().where(user_id.isnot(None)).order_by(user_id)
+    if exclude is not None:
+        query = query.where(user_id != exclude)
+    return db.session.execute(query).scalars().all()
+
+
+def send_broadcast(sender_id, recipient_ids, content):
+    """Insert one message per recipient and bump their unread counters, without committing.
+
+    Returns the timestamp shared by the new messages.
+    """
+    sent_at = datetime.now()
+    if recipient_ids:
+        db.session.execute(insert(Message), [
+            {'sender_id': sender_id, 'recipient_id': recipient_id, 'content': content,
+             'timestamp': sent_at, 'is_read': False}
+            for recipient_id in recipient_ids
+        ])
+        increment_unread(recipient_ids)
+    return sent_at
+
+
+def publish_broadcast(sender_id, sender_name, recipient_ids, content, sent_at):
+    """Push a committed broadcast to every recipient along with their new unread count."""
+    if not realtime.enabled or not recipient_ids:
+        return
+    counts = dict(db.session.execute(
+        select(UnreadCounter.user_id, UnreadCounter.count).where(UnreadCounter.user_id.in_(recipient_ids))
+    ).all())
+    base = {
+        'sender_id': sender_id,
+        'sender_name': sender_name,
+        'content': content,
+        'timestamp': sent_at.isoformat(),
+        'time': sent_at.strftime('%I:%M %p'),
+        'is_read': False,
+        'url': url_for('message.conversation', user_id=sender_id),
+    }
+    events = []
+    for recipient_id in recipient_ids:
+        room = f'user_{recipient_id}'
+        events.append((room, 'new_message', dict(base, recipient_id=recipient_id)))
+        events.append((room, 'unread_count', {'count': counts.get(recipient_id, 0)}))
+    realtime.publish_many(events)
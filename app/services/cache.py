@@ -0,0 +1,64 @@
+"""Small in-process caches for derived data.
+
+Each worker keeps its own copy, so a write is only seen immediately by the
+worker that made it: code that changes the underlying rows calls
+``invalidate`` after committing, and ``<PREFIX>_TTL`` bounds how long other
+workers can serve the old value.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe LRU with per-entry expiry, configured from ``<prefix>_TTL`` / ``<prefix>_SIZE``."""
+
+    def __init__(self, config_prefix, ttl=300, max_size=1000):
+        self.config_prefix = config_prefix
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def init_app(self, app):
+        app.config.setdefault(f'{self.config_prefix}_TTL', self.ttl)
+        app.config.setdefault(f'{self.config_prefix}_SIZE', self.max_size)
+        self.ttl = app.config[f'{self.config_prefix}_TTL']
+        self.max_size = app.config[f'{self.config_prefix}_SIZE']
+        self.clear()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,49 @@
+"""Per-student data versions for caching derived outputs.
+
+Every write that changes what a student's reports show (attendance marking,
+exam result saves, exam edits and deletes) bumps the student's row in
+``student_data_versions`` in the same transaction. Anything derived from
+that data can then be cached under a key containing the version: a new
+write gives a new key, so entries never need invalidating and stay correct
+across worker processes.
+"""
+from sqlalchemy import select
+
+from app.models.models import db, ExamResult, StudentDataVersion
+from app.services.database import upsert_insert
+
+
+def bump_versions(student_ids):
+    """Increment the data version of each student without committing."""
+    student_ids = sorted(set(student_ids))
+    if not student_ids:
+        return
+    table = StudentDataVersion.__table__
+    stmt = upsert_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['student_id'],
+        set_={'version': table.c.version + 1},
+    )
+    db.session.execute(stmt, [{'student_id': student_id, 'version': 1} for student_id in student_ids])
+
+
+def bump_exam_versions(exam_id):
+    """Bump every student with a result for ``exam_id``; call before an exam edit or delete commits."""
+    bump_versions(db.session.execute(
+        select(ExamResult.student_id).where(ExamResult.exam_id == exam_id)
+    ).scalars())
+
+
+def data_versions(student_ids):
+    """{student_id: version}; students never written to are at version 0."""
+    versions = dict.fromkeys(student_ids, 0)
+    if versions:
+        versions.update(db.session.execute(
+            select(StudentDataVersion.student_id, StudentDataVersion.version)
+            .where(StudentDataVersion.student_id.in_(list(versions)))
+        ).all())
+    return versions
+
+
+def data_version(student_id):
+    return data_versions([student_id])[student_id]
@@ -0,0 +1,220 @@
+"""SQLite engine profile: pragmas, pool sizing, upserts and retry-on-busy.
+
+``configure_database(app)`` replaces the bare ``db.init_app(app)`` call. For
+SQLite URLs it applies the pragma set named by ``SQLITE_PROFILE`` (plus any
+``SQLITE_PRAGMAS`` overrides) to every new connection, sizes the connection
+pool per worker and logs the effective pragma values once per process.
+
+:class:`SideDatabase` is a small SQLite file next to the main database
+(sessions, the real-time bus, report-card progress), accessed with plain
+``sqlite3`` connections.
+"""
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+
+from app.models.models import db
+
+logger = logging.getLogger(__name__)
+
+SQLITE_PROFILES = {
+    # Driver defaults (rollback journal, FULL sync); used by tests and tooling
+    'default': {
+        'busy_timeout': 5000,
+    },
+    # Many gunicorn workers reading while a few write
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64000,  # negative = KiB, i.e. 64 MB per connection
+        'temp_store': 'MEMORY',
+        # Off until the delete paths (users, exams, students) clean up their
+        # dependent rows; turning it on makes those deletes fail.
+        'foreign_keys': False,
+    },
+}
+
+# Applied first: journal_mode must be set outside a transaction and the
+# timeout should cover the remaining statements.
+_PRAGMA_ORDER = ('busy_timeout', 'journal_mode', 'synchronous', 'foreign_keys')
+
+
+def _is_sqlite_file(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def is_memory_database(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and not _is_sqlite_file(uri)
+
+
+def _pragma_value(value):
+    if isinstance(value, bool):
+        return 'ON' if value else 'OFF'
+    return value
+
+
+def sqlite_pragmas(app):
+    """Pragmas for the configured profile, with ``SQLITE_PRAGMAS`` overrides."""
+    pragmas = dict(SQLITE_PROFILES[app.config['SQLITE_PROFILE']])
+    pragmas.update(app.config['SQLITE_PRAGMAS'])
+    ordered = [name for name in _PRAGMA_ORDER if name in pragmas]
+    ordered += [name for name in pragmas if name not in _PRAGMA_ORDER]
+    return [(name, _pragma_value(pragmas[name])) for name in ordered]
+
+
+def configure_database(app):
+    """Initialise Flask-SQLAlchemy with the SQLite profile applied."""
+    config = app.config
+    config.setdefault('SQLITE_PROFILE', 'production')
+    config.setdefault('SQLITE_PRAGMAS', {})
+    config.setdefault('SQLITE_POOL_SIZE', 5)
+    config.setdefault('SQLITE_MAX_OVERFLOW', 10)
+    config.setdefault('SQLITE_POOL_TIMEOUT', 30)
+    config.setdefault('DB_BUSY_RETRIES', 3)
+    config.setdefault('DB_BUSY_BACKOFF', 0.05)
+
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    is_sqlite = make_url(uri).get_backend_name() == 'sqlite'
+    if is_sqlite:
+        options = config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+        pragmas = dict(sqlite_pragmas(app))
+        connect_args = options.setdefault('connect_args', {})
+        # The driver's own lock wait, in seconds; busy_timeout covers the rest
+        connect_args.setdefault('timeout', pragmas.get('busy_timeout', 5000) / 1000)
+        if _is_sqlite_file(uri):
+            # In-memory databases use a static pool that takes no sizing options
+            options.setdefault('pool_size', config['SQLITE_POOL_SIZE'])
+            options.setdefault('max_overflow', config['SQLITE_MAX_OVERFLOW'])
+            options.setdefault('pool_timeout', config['SQLITE_POOL_TIMEOUT'])
+
+    db.init_app(app)
+
+    if is_sqlite:
+        with app.app_context():
+            engine = db.engine
+        _install_pragmas(app, engine)
+
+
+def _install_pragmas(app, engine):
+    pragmas = sqlite_pragmas(app)
+    logged_pid = []
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+            if logged_pid != [os.getpid()]:
+                # First connection in this process: report what SQLite applied
+                logged_pid[:] = [os.getpid()]
+                effective = {}
+                for name, _ in pragmas:
+                    row = cursor.execute(f'PRAGMA {name}').fetchone()
+                    effective[name] = row[0] if row else None
+                app.logger.info('SQLite profile %r effective pragmas: %s',
+                                app.config['SQLITE_PROFILE'], effective)
+        finally:
+            cursor.close()
+
+
+def upsert_insert(table):
+    """INSERT for ``table`` that supports ``on_conflict_do_update()``.
+
+    SQLite and PostgreSQL share the ON CONFLICT syntax but SQLAlchemy exposes
+    it per dialect, so pick the construct for the bound engine.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+def is_busy_error(exc):
+    if not isinstance(exc, OperationalError):
+        return False
+    message = str(exc.orig).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def run_with_retry(work, retries=None, backoff=None):
+    """Run ``work()`` (which makes its changes and commits) and retry on SQLITE_BUSY.
+
+    A failed commit leaves the session needing a rollback, which discards the
+    pending changes, so the whole unit of work is re-run rather than just the
+    commit. busy_timeout already waits for locks; this covers the cases it
+    cannot, such as a read transaction that has to be upgraded to a write.
+    """
+    from flask import current_app
+
+    if retries is None:
+        retries = current_app.config.get('DB_BUSY_RETRIES', 3)
+    if backoff is None:
+        backoff = current_app.config.get('DB_BUSY_BACKOFF', 0.05)
+
+    attempt = 0
+    while True:
+        try:
+            return work()
+        except OperationalError as exc:
+            db.session.rollback()
+            if not is_busy_error(exc) or attempt >= retries:
+                raise
+            delay = backoff * (2 ** attempt)
+            attempt += 1
+            logger.warning('Database busy, retrying in %.2fs (attempt %d of %d)', delay, attempt, retries)
+            time.sleep(delay)
+
+
+def retry_on_busy(fn):
+    """Decorator form of :func:`run_with_retry`."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return run_with_retry(lambda: fn(*args, **kwargs))
+    return wrapper
+
+
+class SideDatabase:
+    """A SQLite file holding one service's table, opened one connection per thread.
+
+    The directory, file and ``schema`` statements are created by the first
+    connection, so an app that never uses the store leaves nothing on disk.
+    Connections are reopened after a fork: one inherited from a preloaded
+    parent must not be used by its workers.
+    """
+
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = schema
+        self._local = threading.local()
+        self._schema_ready = False
+
+    def connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            if not self._schema_ready:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            if not self._schema_ready:
+                for statement in self.schema:
+                    conn.execute(statement)
+                self._schema_ready = True
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
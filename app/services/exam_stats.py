@@ -0,0 +1,136 @@
+"""Exam statistics computed in SQL.
+
+Count, mean, min, max, pass count and the sum of squares come from one
+aggregate query; the median, the percentiles and the marks histogram need
+the ordered marks, which are fetched as a single column, interpolated by
+rank and bucketed with ``bisect``. Results
+are cached per exam in ``exam_stats_cache`` and dropped by
+``gradebook.results_changed`` whenever the exam's results are written.
+"""
+import math
+from bisect import bisect_left
+from statistics import median
+
+from sqlalchemy import case, func, select
+
+from app.models.models import db, ExamResult
+from app.services.cache import TTLCache
+
+HISTOGRAM_BUCKETS = 10
+PERCENTILES = (25, 75, 90)
+
+exam_stats_cache = TTLCache('EXAM_STATS_CACHE', ttl=300, max_size=1000)
+
+
+def _pass_mark(exam):
+    return exam.passing_marks if exam.passing_marks is not None else 0
+
+
+def percentile(sorted_marks, p):
+    """The ``p``-th percentile, interpolating between neighbouring ranks (p=50 is the median)."""
+    position = (len(sorted_marks) - 1) * p / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(sorted_marks) - 1)
+    return sorted_marks[lower] + (sorted_marks[upper] - sorted_marks[lower]) * (position - lower)
+
+
+def histogram(sorted_marks, total_marks, buckets=HISTOGRAM_BUCKETS):
+    """Counts of marks per equal-width band of the total; full marks go in the last band."""
+    width = total_marks / buckets if total_marks else 0
+    bands = []
+    previous = 0
+    for index in range(buckets):
+        low = index * width
+        high = low + width
+        end = len(sorted_marks) if index == buckets - 1 else bisect_left(sorted_marks, high)
+        bands.append({
+            'label': f'{low:g}-{high:g}',
+            'low': low,
+            'high': high,
+            'count': end - previous,
+        })
+        previous = end
+    return bands
+
+
+def compute_exam_statistics(exam):
+    pass_mark = _pass_mark(exam)
+    count, mean, lowest, highest, passed, sum_squares = db.session.execute(
+        select(
+            func.count(ExamResult.id),
+            func.avg(ExamResult.marks),
+            func.min(ExamResult.marks),
+            func.max(ExamResult.marks),
+            func.sum(case((ExamResult.marks >= pass_mark, 1), else_=0)),
+            func.sum(ExamResult.marks * ExamResult.marks),
+        ).where(ExamResult.exam_id == exam.id)
+    ).one()
+
+    stats = {
+        'exam_id': exam.id,
+        'total_marks': exam.total_marks,
+        'passing_marks': exam.passing_marks,
+        'count': count,
+        'mean': 0,
+        'min': None,
+        'max': None,
+        'median': None,
+        'percentiles': {f'p{p}': None for p in PERCENTILES},
+        'stddev': 0,
+        'passed': passed or 0,
+        'failed': count - (passed or 0),
+        'pass_percentage': 0,
+        'histogram': histogram([], exam.total_marks),
+    }
+    if not count:
+        return stats
+
+    # Population standard deviation; clamp rounding noise below zero
+    variance = max(sum_squares / count - mean * mean, 0)
+    marks = db.session.execute(
+        select(ExamResult.marks).where(ExamResult.exam_id == exam.id).order_by(ExamResult.marks)
+    ).scalars().all()
+
+    stats.update({
+        'mean': mean,
+        'min': lowest,
+        'max': highest,
+        'median': median(marks),
+        'percentiles': {f'p{p}': percentile(marks, p) for p in PERCENTILES},
+        'stddev': math.sqrt(variance),
+        'pass_percentage': stats['passed'] / count * 100,
+        'histogram': histogram(marks, exam.total_marks),
+    })
+    return stats
+
+
+def exam_statistics(exam):
+    """Cached statistics for one exam (see ``compute_exam_statistics``)."""
+    return exam_stats_cache.get_or_compute(exam.id, lambda: compute_exam_statistics(exam))
+
+
+def exam_summaries(exams):
+    """{exam_id: {'count', 'mean', 'pass_percentage'}} for many exams in one grouped query."""
+    exams = list(exams)
+    summaries = {exam.id: {'count': 0, 'mean': None, 'pass_percentage': None} for exam in exams}
+    if not exams:
+        return summaries
+    pass_marks = {exam.id: _pass_mark(exam) for exam in exams}
+    pass_mark = case(pass_marks, value=ExamResult.exam_id, else_=0)
+    rows = db.session.execute(
+        select(
+            ExamResult.exam_id,
+            func.count(ExamResult.id),
+            func.avg(ExamResult.marks),
+            func.sum(case((ExamResult.marks >= pass_mark, 1), else_=0)),
+        )
+        .where(ExamResult.exam_id.in_(list(summaries)))
+        .group_by(ExamResult.exam_id)
+    )
+    for exam_id, count, mean, passed in rows:
+        summaries[exam_id] = {
+            'count': count,
+            'mean': mean,
+            'pass_percentage': (passed / count * 100) if count else None,
+        }
+    return summaries
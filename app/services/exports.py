@@ -0,0 +1,137 @@
+"""Streaming CSV/XLSX exports of attendance.
+
+Rows are produced by generators and written out one at a time, so memory
+stays flat however many classes or days are exported:
+
+* ``class_month_rows`` renders one class and month as a student x day grid
+  from a single ``AttendancePivot`` (one class is small enough to hold).
+* ``range_rows`` covers the whole school (or one class) over any date range
+  in long format, one line per attendance record, read with ``yield_per``.
+
+``stream_csv`` yields encoded chunks as rows arrive. ``stream_xlsx`` writes
+the rows with xlsxwriter's ``constant_memory`` mode into a temporary file and
+then streams that file; an XLSX is a zip whose directory is written last, so
+it can only be sent once the workbook is closed.
+
+Names come from user input (anyone can register), so neither format may
+hand a spreadsheet a formula: CSV text cells starting with a formula
+character get a leading ``'`` and XLSX strings are always written as text.
+"""
+import csv
+import io
+import os
+import tempfile
+
+from sqlalchemy import select
+
+from app.models.models import db, Attendance, Class, Student, User
+from app.services.attendance import AttendancePivot
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Grid cell for each pivot status
+STATUS_LETTERS = {'present': 'P', 'absent': 'A', 'late': 'L', 'not_marked': ''}
+
+CHUNK_SIZE = 64 * 1024
+FETCH_SIZE = 1000
+# Leading characters that make Excel and similar tools evaluate a CSV cell
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def class_month_rows(class_id, year, month):
+    """Header plus one row per student: ID, name, roll, a cell per day, totals."""
+    students = db.session.execute(
+        select(Student.id, Student.student_id, Student.roll_number, User.full_name)
+        .join(User, Student.user_id == User.id)
+        .where(Student.class_id == class_id)
+        .order_by(Student.roll_number, User.full_name)
+    ).all()
+    pivot = AttendancePivot.for_month([student.id for student in students], year, month)
+
+    yield (['Student ID', 'Name', 'Roll No']
+           + [day.day for day in pivot.days]
+           + ['Present', 'Absent', 'Late', 'Percentage'])
+    for student in students:
+        stats = pivot.counts(student.id)
+        cells = [STATUS_LETTERS[status] for status in pivot.statuses(student.id).values()]
+        yield ([student.student_id, student.full_name, student.roll_number or '']
+               + cells
+               + [stats['present'], stats['absent'], stats['late'], round(stats['percentage'], 1)])
+
+
+def range_rows(start, end, class_id=None):
+    """Header plus one row per attendance record between two dates (inclusive)."""
+    query = (
+        select(Attendance.date, Class.name, Class.section, Student.student_id,
+               User.full_name, Attendance.status)
+        .join(Student, Attendance.student_id == Student.id)
+        .join(User, Student.user_id == User.id)
+        .outerjoin(Class, Attendance.class_id == Class.id)
+        .where(Attendance.date >= start, Attendance.date <= end)
+        .order_by(Attendance.date, Attendance.class_id, Attendance.student_id)
+        .execution_options(yield_per=FETCH_SIZE)
+    )
+    if class_id:
+        query = query.where(Attendance.class_id == class_id)
+
+    yield ['Date', 'Class', 'Student ID', 'Name', 'Status']
+    for day, class_name, section, code, name, status in db.session.execute(query):
+        class_label = f'{class_name} {section}' if section else (class_name or '')
+        yield [day.isoformat(), class_label, code, name, status]
+
+
+def _csv_safe(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(rows):
+    """Yield UTF-8 CSV in chunks of roughly ``CHUNK_SIZE`` bytes."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM so Excel opens the file as UTF-8
+    buffer.write('\ufeff')
+    for row_number, row in enumerate(rows):
+        writer.writerow([_csv_safe(value) for value in row])
+        # The header goes out straight away so the download starts at once
+        if row_number == 0 or buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def stream_xlsx(rows, sheet_name='Attendance'):
+    """Yield an XLSX workbook containing ``rows`` in ``CHUNK_SIZE`` chunks."""
+    import xlsxwriter
+
+    handle, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(handle)
+    try:
+        workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'strings_to_formulas': False})
+        worksheet = workbook.add_worksheet(sheet_name[:31])
+        header_format = workbook.add_format({'bold': True})
+        for row_number, row in enumerate(rows):
+            # constant_memory requires rows to be written in order
+            worksheet.write_row(row_number, 0, row, header_format if row_number == 0 else None)
+        workbook.close()
+
+        with open(path, 'rb') as workbook_file:
+            while True:
+                chunk = workbook_file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+def stream_export(rows, fmt, sheet_name='Attendance'):
+    if fmt == 'xlsx':
+        return stream_xlsx(rows, sheet_name)
+    return stream_csv(rows)
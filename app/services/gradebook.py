@@ -0,0 +1,251 @@
+"""Set-based exam result writes.
+
+Saving a class's marks used to delete every result for the exam and insert
+them again, or look each student's result up one by one. ``save_results``
+reads the exam's current results in one query and upserts only the rows
+whose marks or remarks changed, keyed on the (exam_id, student_id) unique
+index. A single cell edit goes through the same function with one entry.
+Callers commit, then call ``results_changed`` so cached statistics for the
+exam are recomputed.
+
+``student_gradebook`` is the read side: one joined query over the class's
+subjects, their teachers, exams and the student's results, grouped per
+subject with the Term 1/2/3/Final columns filled in. ``class_gradebooks``
+builds the same structure for many students from two queries.
+"""
+from datetime import datetime
+
+from sqlalchemy import and_, select
+
+from app.models.models import db, Class, Exam, ExamResult, Subject, Teacher, User
+from app.services.data_versions import bump_versions
+from app.services.database import upsert_insert
+from app.services.exam_stats import exam_stats_cache
+from app.services.grading import average, grade_scale
+from app.services.rankings import rankings_cache
+
+# (key, text matched in Exam.exam_type), checked in this order
+TERM_BUCKETS = (
+    ('term1', 'Term 1'),
+    ('term2', 'Term 2'),
+    ('term3', 'Term 3'),
+    ('final_term', 'Final Term'),
+)
+
+
+def load_results(exam_id, student_ids=None):
+    """{student_id: {'marks': ..., 'remarks': ...}} for an exam, in one query."""
+    query = select(ExamResult.student_id, ExamResult.marks, ExamResult.remarks).where(
+        ExamResult.exam_id == exam_id
+    )
+    if student_ids is not None:
+        query = query.where(ExamResult.student_id.in_(list(student_ids)))
+    return {
+        student_id: {'marks': marks, 'remarks': remarks}
+        for student_id, marks, remarks in db.session.execute(query)
+    }
+
+
+def parse_marks(exam, value):
+    """Return (marks, error) for a submitted marks value; blank gives (None, None)."""
+    if value is None or str(value).strip() == '':
+        return None, None
+    try:
+        marks = float(value)
+    except (TypeError, ValueError):
+        return None, 'invalid marks format'
+    if marks < 0:
+        return None, 'cannot be negative'
+    if marks > exam.total_marks:
+        return None, f'exceeds total marks ({exam.total_marks})'
+    return marks, None
+
+
+def save_results(exam, entries):
+    """Upsert changed results for ``exam`` without committing.
+
+    ``entries`` maps student id to ``(marks, remarks)``; remarks may be None.
+    Returns {student_id: 'inserted' | 'changed' | 'unchanged'}.
+    """
+    if not entries:
+        return {}
+    existing = load_results(exam.id, entries)
+    now = datetime.now()
+
+    outcome = {}
+    rows = []
+    for student_id, (marks, remarks) in entries.items():
+        remarks = remarks or None
+        previous = existing.get(student_id)
+        if previous is None:
+            outcome[student_id] = 'inserted'
+        elif previous['marks'] == marks and previous['remarks'] == remarks:
+            outcome[student_id] = 'unchanged'
+            continue
+        else:
+            outcome[student_id] = 'changed'
+        rows.append({
+            'exam_id': exam.id,
+            'student_id': student_id,
+            'marks': marks,
+            'remarks': remarks,
+            'date': now,
+        })
+
+    if rows:
+        table = ExamResult.__table__
+        stmt = upsert_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['exam_id', 'student_id'],
+            set_={
+                'marks': stmt.excluded.marks,
+                'remarks': stmt.excluded.remarks,
+                'date': stmt.excluded.date,
+            },
+        )
+        db.session.execute(stmt, rows)
+        bump_versions(row['student_id'] for row in rows)
+    return outcome
+
+
+def results_changed(exam_id, *class_ids):
+    """Drop cached data derived from an exam's results; call after committing.
+
+    ``class_ids`` are the classes whose leaderboards include the exam.
+    """
+    exam_stats_cache.invalidate(exam_id)
+    for class_id in class_ids:
+        rankings_cache.invalidate(class_id)
+
+
+def count_outcomes(outcome):
+    counts = {'inserted': 0, 'changed': 0, 'unchanged': 0}
+    for status in outcome.values():
+        counts[status] += 1
+    return counts
+
+
+def teacher_can_grade(teacher, exam, user_id):
+    """True if the teacher teaches the subject, owns the class or created the exam."""
+    if exam.subject and exam.subject.teacher_id == teacher.id:
+        return True
+    if exam.class_id:
+        exam_class = db.session.get(Class, exam.class_id)
+        if exam_class and exam_class.teacher_id == teacher.id:
+            return True
+    return exam.created_by == user_id
+
+
+def term_bucket(exam_type):
+    """Term column for an exam type, or None for quizzes and other exams."""
+    for key, label in TERM_BUCKETS:
+        if label in (exam_type or ''):
+            return key
+    return None
+
+
+def _gradebook(rows, results):
+    """Group subject/exam ``rows`` per subject, filling in ``results`` ({exam_id: (marks, remarks)})."""
+    scale = grade_scale()
+    graded = [(row, results[row.exam_id]) for row in rows if row.exam_id in results]
+    percentages = scale.percentages([marks for _, (marks, _) in graded],
+                                    [row.total_marks for row, _ in graded])
+
+    subjects = {}
+    for row in rows:
+        if row.subject_id not in subjects:
+            subjects[row.subject_id] = {
+                'subject_id': row.subject_id,
+                'subject': row.subject_name,
+                'teacher': row.teacher_name or 'N/A',
+                'results': [],
+                'terms': dict.fromkeys(key for key, _ in TERM_BUCKETS),
+            }
+
+    for (row, (marks, remarks)), percentage in zip(graded, percentages):
+        if percentage is None:
+            percentage = marks
+        entry = subjects[row.subject_id]
+        bucket = term_bucket(row.exam_type)
+        entry['results'].append({
+            'exam_id': row.exam_id,
+            'title': row.title,
+            'exam_type': row.exam_type,
+            'marks': marks,
+            'total_marks': row.total_marks,
+            'remarks': remarks,
+            'percentage': percentage,
+            'bucket': bucket,
+        })
+        if bucket:
+            # A later exam of the same type replaces the earlier one, as before
+            entry['terms'][bucket] = percentage
+
+    for entry in subjects.values():
+        entry['average'] = average(result['percentage'] for result in entry['results'])
+        entry['grade'] = scale.grade(entry['average'])
+    return list(subjects.values())
+
+
+def _subject_exam_columns():
+    return (Subject.id.label('subject_id'), Subject.name.label('subject_name'),
+            User.full_name.label('teacher_name'), Exam.id.label('exam_id'),
+            Exam.title, Exam.exam_type, Exam.total_marks)
+
+
+def student_gradebook(student_id, class_id):
+    """Per-subject results for one student, from a single joined query.
+
+    Returns a list (in subject order) of dicts with the subject and teacher
+    names, the graded ``results``, the ``terms`` columns, the ``average``
+    percentage over all graded exams (None if there are none) and its
+    ``grade``. Exams without total marks count their raw marks.
+    """
+    rows = db.session.execute(
+        select(*_subject_exam_columns(), ExamResult.marks, ExamResult.remarks)
+        .select_from(Subject)
+        .outerjoin(Teacher, Subject.teacher_id == Teacher.id)
+        .outerjoin(User, Teacher.user_id == User.id)
+        .outerjoin(Exam, Exam.subject_id == Subject.id)
+        .outerjoin(ExamResult, and_(ExamResult.exam_id == Exam.id,
+                                    ExamResult.student_id == student_id))
+        .where(Subject.class_id == class_id)
+        .order_by(Subject.id, Exam.id)
+    ).all()
+    results = {row.exam_id: (row.marks, row.remarks) for row in rows if row.marks is not None}
+    return _gradebook(rows, results)
+
+
+def class_gradebooks(students):
+    """``student_gradebook`` for many students in two queries.
+
+    ``students`` is a list of (student_id, class_id) pairs; returns
+    {student_id: gradebook}. Students without a class get an empty list.
+    """
+    class_ids = {class_id for _, class_id in students if class_id}
+    student_ids = [student_id for student_id, _ in students]
+    structure = {}
+    if class_ids:
+        for row in db.session.execute(
+            select(Subject.class_id, *_subject_exam_columns())
+            .select_from(Subject)
+            .outerjoin(Teacher, Subject.teacher_id == Teacher.id)
+            .outerjoin(User, Teacher.user_id == User.id)
+            .outerjoin(Exam, Exam.subject_id == Subject.id)
+            .where(Subject.class_id.in_(class_ids))
+            .order_by(Subject.id, Exam.id)
+        ):
+            structure.setdefault(row.class_id, []).append(row)
+
+    results = {}
+    if student_ids:
+        for student_id, exam_id, marks, remarks in db.session.execute(
+            select(ExamResult.student_id, ExamResult.exam_id, ExamResult.marks, ExamResult.remarks)
+            .where(ExamResult.student_id.in_(student_ids), ExamResult.marks.isnot(None))
+        ):
+            results.setdefault(student_id, {})[exam_id] = (marks, remarks)
+
+    return {
+        student_id: _gradebook(structure.get(class_id, []), results.get(student_id, {}))
+        for student_id, class_id in students
+    }
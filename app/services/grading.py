@@ -0,0 +1,82 @@
+"""One grade scale for every view that turns marks into grades.
+
+The scale is a list of bands, lowest first: the minimum percentage, the
+letter, GPA points, the Bootstrap badge colour and the dashboard tier
+(excellent / good / average / poor). Deployments can replace it with a
+``GRADE_SCALE`` config entry of the same shape.
+
+``GradeScale.grade_marks`` maps parallel sequences of marks and totals to
+percentages and grades in one call; each lookup is a ``bisect`` over the
+band minimums.
+"""
+from bisect import bisect_right
+from collections import namedtuple
+
+from flask import current_app
+
+GradeBand = namedtuple('GradeBand', 'minimum letter points badge tier')
+Grade = namedtuple('Grade', 'percentage letter points badge tier')
+
+DEFAULT_GRADE_SCALE = [
+    (0, 'F', 0.0, 'danger', 'poor'),
+    (50, 'D', 1.0, 'warning', 'poor'),
+    (60, 'C', 2.0, 'info', 'average'),
+    (65, 'C+', 2.3, 'info', 'average'),
+    (70, 'B', 2.7, 'primary', 'good'),
+    (75, 'B+', 3.0, 'primary', 'good'),
+    (80, 'A-', 3.3, 'success', 'excellent'),
+    (85, 'A', 3.7, 'success', 'excellent'),
+    (90, 'A+', 4.0, 'success', 'excellent'),
+]
+
+# Shown where there is nothing to grade
+NO_GRADE = Grade(None, '-', None, 'secondary', 'poor')
+
+
+class GradeScale:
+    def __init__(self, bands=DEFAULT_GRADE_SCALE):
+        self.bands = sorted((GradeBand(*band) for band in bands), key=lambda band: band.minimum)
+        self._minimums = [band.minimum for band in self.bands]
+
+    def band(self, percentage):
+        # Below the lowest band still gets the lowest grade
+        return self.bands[max(bisect_right(self._minimums, percentage) - 1, 0)]
+
+    def grade(self, percentage):
+        if percentage is None:
+            return NO_GRADE
+        band = self.band(percentage)
+        return Grade(percentage, band.letter, band.points, band.badge, band.tier)
+
+    def grade_many(self, percentages):
+        return [self.grade(percentage) for percentage in percentages]
+
+    @staticmethod
+    def percentages(marks, totals):
+        """Percentage for each (marks, total) pair; None where the total is not positive."""
+        return [
+            (mark / total * 100) if total and total > 0 else None
+            for mark, total in zip(marks, totals)
+        ]
+
+    def grade_marks(self, marks, totals):
+        return self.grade_many(self.percentages(marks, totals))
+
+    def gpa(self, percentage):
+        """GPA points for an overall percentage, 0.0 when there is none."""
+        return self.grade(percentage).points or 0.0
+
+
+def average(values):
+    """Mean of the non-None values, or None."""
+    values = [value for value in values if value is not None]
+    return sum(values) / len(values) if values else None
+
+
+def grade_scale():
+    """The app's configured scale (``GRADE_SCALE``), built once per app."""
+    scale = current_app.extensions.get('grade_scale')
+    if scale is None:
+        scale = GradeScale(current_app.config.get('GRADE_SCALE', DEFAULT_GRADE_SCALE))
+        current_app.extensions['grade_scale'] = scale
+    return scale
@@ -0,0 +1,103 @@
+"""Per-worker cache of logged-in identities.
+
+Flask-Login calls ``load_user`` on every request, and most controllers then
+look up the Teacher/Student/Parent/Admin row for ``current_user`` again. The
+cache keeps a column snapshot of the User row and its role profile for
+``IDENTITY_CACHE_TTL`` seconds. A hit rebuilds both objects from the snapshot
+and attaches them to the request session with ``merge(load=False)``, so no SQL
+is emitted. Anything that edits a user or its profile must call
+``identity_cache.invalidate(user_id)`` after committing.
+"""
+from flask import abort
+from flask_login import current_user
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.models.models import db, User, Admin, Teacher, Student, Parent
+from app.services.cache import TTLCache
+
+# User.role -> profile model; the User relationship has the same name as the role
+ROLE_PROFILES = {
+    'admin': Admin,
+    'teacher': Teacher,
+    'student': Student,
+    'parent': Parent,
+}
+
+
+def _snapshot(obj):
+    return {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}
+
+
+def _attach(model, state):
+    # Rebuild a clean, detached instance and merge it without a SELECT
+    obj = model(**state)
+    make_transient_to_detached(obj)
+    return db.session.merge(obj, load=False)
+
+
+class CachedIdentity:
+    __slots__ = ('user_state', 'profile_model', 'profile_state')
+
+    def __init__(self, user, profile):
+        self.user_state = _snapshot(user)
+        self.profile_model = type(profile) if profile is not None else None
+        self.profile_state = _snapshot(profile) if profile is not None else None
+
+    def attach(self):
+        user = _attach(User, self.user_state)
+        if user.role in ROLE_PROFILES:
+            profile = _attach(self.profile_model, self.profile_state) if self.profile_model else None
+            set_committed_value(user, user.role, profile)
+        return user
+
+
+class IdentityCache(TTLCache):
+    """:class:`TTLCache` of :class:`CachedIdentity` entries keyed by user id."""
+
+    def __init__(self, app=None):
+        super().__init__('IDENTITY_CACHE', ttl=300, max_size=5000)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        super().init_app(app)
+        app.extensions['identity_cache'] = self
+
+    def load(self, user_id):
+        """Return the User for ``user_id`` attached to the current session, or None."""
+        user_id = int(user_id)
+        entry = self.get(user_id)
+        if entry is not None:
+            return entry.attach()
+
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        # Resolves the role profile while the row is being cached anyway
+        profile = getattr(user, user.role) if user.role in ROLE_PROFILES else None
+        if self.ttl > 0:
+            self.set(user_id, CachedIdentity(user, profile))
+        return user
+
+    def invalidate(self, user_id):
+        super().invalidate(int(user_id))
+
+
+def get_profile():
+    """Admin/Teacher/Student/Parent row of the logged-in user, or None."""
+    role = current_user.role
+    if role not in ROLE_PROFILES:
+        return None
+    return getattr(current_user._get_current_object(), role)
+
+
+def get_profile_or_404():
+    profile = get_profile()
+    if profile is None:
+        abort(404)
+    return profile
+
+
+identity_cache = IdentityCache()
@@ -0,0 +1,261 @@
+"""Conversation history, the inbox, read receipts and unread counters.
+
+A conversation is read with one query over both directions of the
+(sender, recipient) pair, newest first, ``MESSAGE_PAGE_SIZE`` at a time.
+"Load older" continues from a cursor holding the (timestamp, id) of the
+oldest message shown, so each page is a range scan on
+``ix_messages_pair_time`` however long the history is.
+
+The inbox is a read model over the same table: one query numbers each
+conversation partner's messages with ``row_number()`` (newest first, ties
+broken by id) to take the last message and the unread count, and pages
+through partners by the time of that last message, with the same cursors
+as ``services.pagination``. Window functions behave the same on SQLite and
+PostgreSQL, unlike a bare column next to ``max()``.
+
+Unread totals are denormalised into ``unread_counters``: sending adds to
+the recipient's row and ``mark_read`` subtracts what it marked, each in the
+same transaction as the message change. ``flask repair-unread-counters``
+recomputes the table if it ever drifts.
+
+The sidebar lists every user, which changes rarely but was reloaded on
+each page view. ``contacts_cache`` keeps that directory per worker; user
+edits call ``invalidate_contacts`` and ``CONTACTS_CACHE_TTL`` bounds how
+stale names and the online dot can get in other workers.
+"""
+from collections import Counter
+
+from flask import current_app, request, url_for
+from sqlalchemy import Integer, and_, case, cast, delete, func, insert, literal, or_, select, tuple_, union_all, update
+
+from app.models.models import db, User
+from app.models.message import Message, UnreadCounter
+from app.services.cache import TTLCache
+from app.services.database import upsert_insert
+from app.services.pagination import MAX_PER_PAGE, Page, decode_cursor, encode_cursor
+from app.services.realtime import realtime
+
+contacts_cache = TTLCache('CONTACTS_CACHE', ttl=60, max_size=1)
+
+_DIRECTORY = 'directory'
+# Characters of the last message shown in the inbox
+PREVIEW_CHARS = 120
+
+
+def _between(user_id, other_id):
+    return or_(
+        and_(Message.sender_id == user_id, Message.recipient_id == other_id),
+        and_(Message.sender_id == other_id, Message.recipient_id == user_id),
+    )
+
+
+def conversation_page(user_id, other_id, before=None, limit=None):
+    """Return (messages oldest first, cursor for the next older page or None).
+
+    ``before`` is a cursor from a previous call; a malformed one is treated
+    as absent and the newest page is returned.
+    """
+    if limit is None:
+        limit = current_app.config['MESSAGE_PAGE_SIZE']
+    limit = max(1, min(limit, MAX_PER_PAGE))
+
+    query = select(Message).where(_between(user_id, other_id))
+    position = decode_cursor(before) if before else None
+    if position is not None:
+        query = query.where(tuple_(Message.timestamp, Message.id) < tuple_(*position))
+    query = query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit + 1)
+    messages = db.session.execute(query).scalars().all()
+
+    older = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        oldest = messages[-1]
+        older = encode_cursor(oldest.timestamp, oldest.id)
+    messages.reverse()
+    return messages, older
+
+
+def in_conversation(user_id, other_id):
+    """Whether the two users have exchanged at least one message."""
+    return db.session.execute(
+        select(Message.id).where(_between(user_id, other_id)).limit(1)
+    ).first() is not None
+
+
+def mark_read(user_id, other_id):
+    """Mark everything ``other_id`` sent to ``user_id`` as read in one UPDATE, without committing.
+
+    Returns the number of messages changed.
+    """
+    result = db.session.execute(
+        update(Message)
+        .where(Message.recipient_id == user_id, Message.sender_id == other_id, Message.is_read.is_(False))
+        .values(is_read=True)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        counter = UnreadCounter.__table__
+        db.session.execute(
+            update(counter)
+            .where(counter.c.user_id == user_id)
+            .values(count=case((counter.c.count > result.rowcount, counter.c.count - result.rowcount), else_=0))
+        )
+    return result.rowcount
+
+
+def increment_unread(recipient_ids):
+    """Add one unread message per occurrence of each recipient id, without committing.
+
+    Call in the same transaction as the message inserts; the upsert adds to
+    the stored count, so concurrent senders never overwrite each other.
+    """
+    counts = Counter(recipient_ids)
+    if not counts:
+        return
+    counter = UnreadCounter.__table__
+    stmt = upsert_insert(counter)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id'],
+        set_={'count': counter.c.count + stmt.excluded.count},
+    )
+    db.session.execute(stmt, [{'user_id': user_id, 'count': count} for user_id, count in sorted(counts.items())])
+
+
+def rebuild_unread_counters():
+    """Recompute every counter from the messages table (no commit). Returns the number of rows written."""
+    unread = (
+        select(Message.recipient_id, func.count())
+        .where(Message.is_read.is_(False))
+        .group_by(Message.recipient_id)
+    )
+    db.session.execute(delete(UnreadCounter))
+    result = db.session.execute(insert(UnreadCounter).from_select(['user_id', 'count'], unread))
+    return result.rowcount
+
+
+def _inbox_query(user_id):
+    # Sent and received messages as (partner, id, timestamp, unread) rows; each half is read
+    # from a covering index (ix_messages_pair_time / ix_messages_inbox) without touching the table
+    sent = select(
+        Message.recipient_id.label('partner_id'), Message.id, Message.timestamp, literal(0).label('unread'),
+    ).where(Message.sender_id == user_id)
+    received = select(
+        Message.sender_id, Message.id, Message.timestamp, cast(Message.is_read.is_(False), Integer),
+    ).where(Message.recipient_id == user_id, Message.sender_id != user_id)
+    exchanged = union_all(sent, received).subquery()
+    # Number each partner's messages newest first, breaking timestamp ties by id
+    # (a broadcast writes all its rows with one timestamp), and keep the first
+    ranked = select(
+        exchanged.c.partner_id,
+        exchanged.c.id,
+        exchanged.c.timestamp,
+        func.sum(exchanged.c.unread).over(partition_by=exchanged.c.partner_id).label('unread'),
+        func.row_number().over(
+            partition_by=exchanged.c.partner_id,
+            order_by=(exchanged.c.timestamp.desc(), exchanged.c.id.desc()),
+        ).label('position'),
+    ).subquery()
+    last = select(ranked).where(ranked.c.position == 1).subquery()
+    query = (
+        select(last.c.partner_id, last.c.id, Message.sender_id,
+               func.substr(Message.content, 1, PREVIEW_CHARS).label('preview'),
+               last.c.timestamp, last.c.unread, User.full_name, User.role, User.last_seen)
+        .join(Message, Message.id == last.c.id)
+        .join(User, User.id == last.c.partner_id)
+    )
+    return query, last.c.timestamp, last.c.partner_id
+
+
+def inbox_page(user_id, args=None, per_page=None):
+    """A :class:`Page` of conversations, most recent first.
+
+    Each row has partner_id, full_name, role, last_seen, the last message's
+    id, sender_id, preview and timestamp, and the partner's unread count.
+    ``args`` (default ``request.args``) may carry ``after`` / ``before``
+    cursors and ``per_page``.
+    """
+    args = request.args if args is None else args
+    if per_page is None:
+        per_page = args.get('per_page', type=int) or current_app.config['LIST_PAGE_SIZE']
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+
+    after = decode_cursor(args['after']) if args.get('after') else None
+    before = decode_cursor(args['before']) if args.get('before') and after is None else None
+
+    query, timestamp, partner_id = _inbox_query(user_id)
+    if before is not None:
+        # Walk back towards newer conversations, then flip the rows back
+        query = query.where(tuple_(timestamp, partner_id) > tuple_(*before))
+        query = query.order_by(timestamp.asc(), partner_id.asc())
+    else:
+        if after is not None:
+            query = query.where(tuple_(timestamp, partner_id) < tuple_(*after))
+        query = query.order_by(timestamp.desc(), partner_id.desc())
+    rows = db.session.execute(query.limit(per_page + 1)).all()
+
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before is not None:
+        rows.reverse()
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if more or before is not None:
+            next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].partner_id)
+        if (before is not None and more) or after is not None:
+            prev_cursor = encode_cursor(rows[0].timestamp, rows[0].partner_id)
+    return Page(rows, 'recent', 'desc', per_page, next_cursor, prev_cursor)
+
+
+def unread_total(user_id):
+    """Unread messages addressed to ``user_id``, read from its counter row."""
+    return db.session.execute(
+        select(UnreadCounter.count).where(UnreadCounter.user_id == user_id)
+    ).scalar() or 0
+
+
+def publish_message(message, sender_name):
+    """Push a committed message to both participants and the recipient's new unread count."""
+    if not realtime.enabled:
+        return
+    payload = dict(message_dict(message), sender_name=sender_name,
+                   url=url_for('message.conversation', user_id=message.sender_id))
+    events = [(f'user_{message.recipient_id}', 'new_message', payload)]
+    if message.sender_id != message.recipient_id:
+        # The sender's other tabs
+        events.append((f'user_{message.sender_id}', 'new_message', payload))
+    events.append((f'user_{message.recipient_id}', 'unread_count', {'count': unread_total(message.recipient_id)}))
+    realtime.publish_many(events)
+
+
+def publish_unread(user_id):
+    if realtime.enabled:
+        realtime.publish(f'user_{user_id}', 'unread_count', {'count': unread_total(user_id)})
+
+
+def message_dict(message):
+    return {
+        'id': message.id,
+        'sender_id': message.sender_id,
+        'recipient_id': message.recipient_id,
+        'content': message.content,
+        'timestamp': message.timestamp.isoformat() if message.timestamp else None,
+        'time': message.timestamp.strftime('%I:%M %p') if message.timestamp else '',
+        'is_read': bool(message.is_read),
+    }
+
+
+def _load_directory():
+    return db.session.execute(
+        select(User.id, User.full_name, User.role, User.last_seen).order_by(User.full_name, User.id)
+    ).all()
+
+
+def contacts(user_id):
+    """Sidebar rows (id, full_name, role, last_seen) for everyone except ``user_id``."""
+    directory = contacts_cache.get_or_compute(_DIRECTORY, _load_directory)
+    return [row for row in directory if row.id != user_id]
+
+
+def invalidate_contacts():
+    contacts_cache.invalidate(_DIRECTORY)
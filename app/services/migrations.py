@@ -0,0 +1,84 @@
+"""Bring an existing database up to the indexes declared on the models.
+
+``db.create_all()`` only creates missing tables; it never adds indexes to
+tables that already exist. ``migrate_indexes()`` creates any missing table
+and then any declared index that the live schema lacks, so it is safe to run
+repeatedly. A unique index cannot be created over duplicate rows: by default
+the migration raises :class:`DuplicateRowsError` listing them and changes
+nothing. With ``dedupe=True`` it deletes every row of a group except the
+most recent (highest id) one and reports the deleted ids.
+"""
+import logging
+
+from sqlalchemy import and_, func, inspect, select
+
+from app.models.models import db
+
+logger = logging.getLogger(__name__)
+
+
+class DuplicateRowsError(Exception):
+    """Unique indexes that cannot be created until duplicate rows are resolved.
+
+    ``conflicts`` is a list of (table name, index name, groups); each group is
+    (column values, row ids in id order).
+    """
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        groups = sum(len(entry[2]) for entry in conflicts)
+        super().__init__(f'{groups} groups of duplicate rows block {len(conflicts)} unique indexes')
+
+
+def _duplicate_groups(conn, table, columns):
+    keys = select(*columns).group_by(*columns).having(func.count() > 1).subquery()
+    rows = conn.execute(
+        select(table.c.id, *columns)
+        .join(keys, and_(*(column == keys.c[column.name] for column in columns)))
+        .order_by(*columns, table.c.id)
+    )
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(row[1:]), []).append(row[0])
+    return list(groups.items())
+
+
+def migrate_indexes(dedupe=False):
+    """Create missing tables and indexes.
+
+    Returns (names of created indexes, {table name: deleted row ids}). Raises
+    :class:`DuplicateRowsError`, before creating anything, when a missing
+    unique index has duplicates and ``dedupe`` is false.
+    """
+    db.create_all()
+    created = []
+    deleted = {}
+    with db.engine.begin() as conn:
+        inspector = inspect(conn)
+        missing = []
+        for table in db.metadata.sorted_tables:
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            missing += [(table, index) for index in sorted(table.indexes, key=lambda ix: ix.name)
+                        if index.name not in existing]
+
+        conflicts = []
+        for table, index in missing:
+            if index.unique:
+                groups = _duplicate_groups(conn, table, list(index.columns))
+                if groups:
+                    conflicts.append((table, index, groups))
+        if conflicts and not dedupe:
+            raise DuplicateRowsError([(table.name, index.name, groups) for table, index, groups in conflicts])
+
+        for table, index, groups in conflicts:
+            # Keep the highest id of each group
+            ids = [row_id for _, row_ids in groups for row_id in row_ids[:-1]]
+            conn.execute(table.delete().where(table.c.id.in_(ids)))
+            deleted.setdefault(table.name, []).extend(ids)
+            logger.warning('Deleted %d duplicate rows from %s before creating %s: ids %s',
+                           len(ids), table.name, index.name, ids)
+
+        for table, index in missing:
+            index.create(bind=conn)
+            created.append(index.name)
+    return created, deleted
@@ -0,0 +1,176 @@
+"""Keyset (cursor) pagination for list views.
+
+Offset pagination gets slower with every page because the database still
+walks the skipped rows. ``paginate`` instead orders by the chosen sort
+column plus the primary key and continues from the last row shown: the
+next page is ``WHERE (sort, id) > (last sort, last id) ... LIMIT n``, which
+an index on the sort column answers directly however deep the page is.
+
+Cursors are opaque URL-safe strings holding that (sort value, id) pair.
+They stay valid when rows are added or removed, unlike page numbers.
+On a NOT NULL column the condition is a row-value comparison; a nullable
+column orders NULLs last (first when descending) and spells the condition
+out, since ``col > NULL`` never matches. Filtering is left to the
+caller: build the query with its filters, then hand it over.
+
+Request arguments: ``sort``, ``dir`` (asc/desc), ``after`` / ``before``
+(cursors) and ``per_page``. Templates render the controls with the macros
+in ``components/pagination.html``.
+"""
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from flask import current_app, request, url_for
+from sqlalchemy import and_, or_, tuple_
+
+CURSOR_ARGS = ('after', 'before')
+MAX_PER_PAGE = 100
+
+
+def encode_cursor(value, key):
+    if isinstance(value, datetime):
+        value = {'dt': value.isoformat()}
+    elif isinstance(value, date):
+        value = {'d': value.isoformat()}
+    raw = json.dumps([value, key], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor):
+    """(value, key) from a cursor, or None if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, key = json.loads(raw)
+        if isinstance(value, dict):
+            if 'dt' in value:
+                value = datetime.fromisoformat(value['dt'])
+            elif 'd' in value:
+                value = date.fromisoformat(value['d'])
+            else:
+                return None
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    return value, key
+
+
+def _nullable(column):
+    return getattr(getattr(column, 'expression', column), 'nullable', True)
+
+
+def _order(column, pk, ascending):
+    if not _nullable(column):
+        return [column.asc(), pk.asc()] if ascending else [column.desc(), pk.desc()]
+    if ascending:
+        return [column.is_(None), column.asc(), pk.asc()]
+    return [column.is_(None).desc(), column.desc(), pk.desc()]
+
+
+def _beyond(column, pk, value, key, ascending):
+    """Rows strictly after (value, key) when ordered by ``_order(column, pk, ascending)``."""
+    if not _nullable(column):
+        # A row-value comparison lets an index on (column) or (column, id) seek straight to the page
+        if ascending:
+            return tuple_(column, pk) > tuple_(value, key)
+        return tuple_(column, pk) < tuple_(value, key)
+    if ascending:
+        if value is None:
+            return and_(column.is_(None), pk > key)
+        return or_(column > value, and_(column == value, pk > key), column.is_(None))
+    if value is None:
+        return or_(column.isnot(None), and_(column.is_(None), pk < key))
+    return and_(column.isnot(None), or_(column < value, and_(column == value, pk < key)))
+
+
+class Page:
+    """One page of ``items`` with the cursors and sort state to build links."""
+
+    def __init__(self, items, sort, direction, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.sort = sort
+        self.direction = direction
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def url(self, **changes):
+        """This view's URL with the current filters, ``changes`` applied (None drops an argument)."""
+        args = {name: value for name, value in request.args.items() if name not in CURSOR_ARGS}
+        args.update(changes)
+        args = {name: value for name, value in args.items() if value not in (None, '')}
+        return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+    def next_url(self):
+        return self.url(after=self.next_cursor)
+
+    def prev_url(self):
+        return self.url(before=self.prev_cursor)
+
+    def sort_url(self, sort):
+        """Link for a column header: toggles the direction when already sorted by ``sort``."""
+        direction = None
+        if sort == self.sort:
+            direction = 'asc' if self.direction == 'desc' else 'desc'
+        return self.url(sort=sort, dir=direction)
+
+
+def paginate(query, sorts, pk, default_sort, args=None, per_page=None):
+    """Return a :class:`Page` of ``query`` (a filtered ``Model.query``).
+
+    ``sorts`` maps each allowed ``sort`` argument to ``(column, default
+    direction)``; ``pk`` is the unique tie-breaker column. ``args`` defaults
+    to ``request.args`` (any werkzeug ``MultiDict`` works).
+    """
+    args = request.args if args is None else args
+    sort = args.get('sort') if args.get('sort') in sorts else default_sort
+    column, direction = sorts[sort]
+    if args.get('dir') in ('asc', 'desc'):
+        direction = args['dir']
+    ascending = direction == 'asc'
+
+    if per_page is None:
+        per_page = args.get('per_page', type=int) or current_app.config['LIST_PAGE_SIZE']
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+
+    after = decode_cursor(args['after']) if args.get('after') else None
+    before = decode_cursor(args['before']) if args.get('before') and after is None else None
+
+    query = query.order_by(None).add_columns(column.label('_sort_value'), pk.label('_sort_key'))
+    if before is not None:
+        # Walk backwards from the first row of the current page, then flip the rows back
+        query = query.filter(_beyond(column, pk, *before, not ascending))
+        query = query.order_by(*_order(column, pk, not ascending))
+    else:
+        if after is not None:
+            query = query.filter(_beyond(column, pk, *after, ascending))
+        query = query.order_by(*_order(column, pk, ascending))
+    rows = query.limit(per_page + 1).all()
+
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before is not None:
+        rows.reverse()
+
+    next_cursor = prev_cursor = None
+    if rows:
+        first, last = rows[0], rows[-1]
+        if (before is None and more) or before is not None:
+            next_cursor = encode_cursor(last._sort_value, last._sort_key)
+        if (before is not None and more) or after is not None:
+            prev_cursor = encode_cursor(first._sort_value, first._sort_key)
+    return Page([row[0] for row in rows], sort, direction, per_page, next_cursor, prev_cursor)
@@ -0,0 +1,113 @@
+"""Write-behind buffer for User.last_seen.
+
+Authenticated requests used to commit a last_seen update on every page view,
+which turns each request into a SQLite write transaction. The buffer keeps the
+latest timestamp per user in memory and writes all of them in one bulk UPDATE
+once the flush interval or batch size is reached, and again when the worker
+process exits.
+"""
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, update
+
+from app.models.models import db, User
+
+logger = logging.getLogger(__name__)
+
+
+class LastSeenBuffer:
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._pending = {}   # user_id -> datetime waiting to be written
+        self._recorded = {}  # user_id -> newest datetime already accepted
+        self._last_flush = time.monotonic()
+        self._exit_hook_registered = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Seconds a last_seen value may lag behind before it is refreshed.
+        # The "online" dot in the messages sidebar uses a 5 minute window.
+        app.config.setdefault('LAST_SEEN_STALENESS', 60)
+        # Flush when the oldest pending entry is this many seconds old...
+        app.config.setdefault('LAST_SEEN_FLUSH_INTERVAL', 30)
+        # ...or when this many users are waiting to be written.
+        app.config.setdefault('LAST_SEEN_FLUSH_SIZE', 200)
+
+        self.app = app
+        app.extensions['last_seen_buffer'] = self
+        if not self._exit_hook_registered:
+            atexit.register(self.flush_on_exit)
+            self._exit_hook_registered = True
+
+    def touch(self, user_id, stored=None, seen_at=None):
+        """Record that ``user_id`` was seen; ``stored`` is the value already in the DB."""
+        config = self.app.config
+        seen_at = seen_at or datetime.now()
+        staleness = timedelta(seconds=config['LAST_SEEN_STALENESS'])
+
+        with self._lock:
+            known = self._recorded.get(user_id)
+            if known is None or (stored is not None and stored > known):
+                known = stored
+            if known is not None and seen_at - known < staleness:
+                return
+            self._pending[user_id] = seen_at
+            self._recorded[user_id] = seen_at
+            due = (len(self._pending) >= config['LAST_SEEN_FLUSH_SIZE'] or
+                   time.monotonic() - self._last_flush >= config['LAST_SEEN_FLUSH_INTERVAL'])
+
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write every pending last_seen value in one executemany UPDATE."""
+        with self._lock:
+            if not self._pending:
+                self._last_flush = time.monotonic()
+                return 0
+            batch = self._pending
+            self._pending = {}
+            self._last_flush = time.monotonic()
+            self._prune_recorded()
+
+        table = User.__table__
+        stmt = (
+            update(table)
+            .where(table.c.id == bindparam('user_id'))
+            .values(last_seen=bindparam('seen_at'))
+        )
+        params = [{'user_id': uid, 'seen_at': seen} for uid, seen in batch.items()]
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(stmt, params)
+        except Exception:
+            logger.exception('Failed to flush %d last_seen updates; keeping them for the next flush', len(batch))
+            with self._lock:
+                for uid, seen in batch.items():
+                    if uid not in self._pending or self._pending[uid] < seen:
+                        self._pending[uid] = seen
+            return 0
+        return len(batch)
+
+    def flush_on_exit(self):
+        if self.app is None or not self._pending:
+            return
+        with self.app.app_context():
+            self.flush()
+
+    def _prune_recorded(self):
+        # Forget users whose accepted value is already outside the window so
+        # the map only tracks recently active users. Called with the lock held.
+        cutoff = datetime.now() - timedelta(seconds=self.app.config['LAST_SEEN_STALENESS'])
+        stale = [uid for uid, seen in self._recorded.items() if seen < cutoff]
+        for uid in stale:
+            del self._recorded[uid]
+
+
+last_seen_buffer = LastSeenBuffer()
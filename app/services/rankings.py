@@ -0,0 +1,149 @@
+"""Rank, percentile and z-score leaderboards per exam and per class term.
+
+Each leaderboard is one query for the marks, then ``rank_scores`` works on
+the whole column at once: the scores are sorted once and every student's
+rank and percentile are two ``bisect`` lookups into that sorted list, so a
+grade level of thousands of students ranks in milliseconds.
+
+Ranks use competition ranking (ties share a rank, the next rank is
+skipped); the percentile is the share of students scoring below plus half
+of those tied. Leaderboards are cached per class in ``rankings_cache`` and
+dropped by ``gradebook.results_changed`` when that class's results change,
+and by ``membership_changed`` when a student joins or leaves the class.
+"""
+import math
+from bisect import bisect_left, bisect_right
+
+from sqlalchemy import select
+
+from app.models.models import db, Exam, ExamResult, Student, User
+from app.services.cache import TTLCache
+from app.services.grading import grade_scale
+
+rankings_cache = TTLCache('RANKINGS_CACHE', ttl=600, max_size=500)
+
+
+def rank_scores(scores):
+    """[(rank, percentile, z_score)] for each score, in the order given."""
+    count = len(scores)
+    if not count:
+        return []
+    ordered = sorted(scores)
+    mean = sum(ordered) / count
+    stddev = math.sqrt(sum((score - mean) ** 2 for score in ordered) / count)
+    ranked = []
+    for score in scores:
+        below = bisect_left(ordered, score)
+        at_or_below = bisect_right(ordered, score)
+        ranked.append((
+            count - at_or_below + 1,
+            (below + (at_or_below - below) / 2) / count * 100,
+            (score - mean) / stddev if stddev else 0.0,
+        ))
+    return ranked
+
+
+def _leaderboard(entries, scores):
+    board = []
+    for entry, (rank, percentile, z_score) in zip(entries, rank_scores(scores)):
+        entry.update({'rank': rank, 'percentile': percentile, 'z_score': z_score})
+        board.append(entry)
+    board.sort(key=lambda entry: (entry['rank'], entry['name']))
+    return board
+
+
+def membership_changed(*class_ids):
+    """Drop the leaderboards of classes a student joined or left; call after committing.
+
+    ``None`` (no class) is ignored and form strings are accepted.
+    """
+    for class_id in class_ids:
+        if class_id:
+            rankings_cache.invalidate(int(class_id))
+
+
+def _class_entry(class_id):
+    entry = rankings_cache.get(class_id)
+    if entry is None:
+        entry = {}
+        rankings_cache.set(class_id, entry)
+    return entry
+
+
+def compute_exam_rankings(exam):
+    rows = db.session.execute(
+        select(ExamResult.student_id, ExamResult.marks, ExamResult.remarks,
+               Student.roll_number, User.full_name.label('name'))
+        .join(Student, ExamResult.student_id == Student.id)
+        .join(User, Student.user_id == User.id)
+        .where(ExamResult.exam_id == exam.id)
+    ).mappings().all()
+    marks = [row['marks'] for row in rows]
+    percentages = grade_scale().percentages(marks, [exam.total_marks] * len(rows))
+    entries = [
+        dict(row, percentage=percentage, passed=row['marks'] >= (exam.passing_marks or 0))
+        for row, percentage in zip(rows, percentages)
+    ]
+    return _leaderboard(entries, marks)
+
+
+def exam_rankings(exam):
+    """Leaderboard for one exam: marks, percentage, rank, percentile and z-score per student."""
+    cached = _class_entry(exam.class_id)
+    key = ('exam', exam.id)
+    if key not in cached:
+        cached[key] = compute_exam_rankings(exam)
+    return cached[key]
+
+
+def compute_class_rankings(class_id, bucket=None):
+    from app.services.gradebook import term_bucket
+
+    rows = db.session.execute(
+        select(ExamResult.student_id, ExamResult.marks, Exam.total_marks, Exam.exam_type)
+        .join(Exam, ExamResult.exam_id == Exam.id)
+        .join(Student, ExamResult.student_id == Student.id)
+        .where(Exam.class_id == class_id, Student.class_id == class_id)
+    ).all()
+    if bucket:
+        rows = [row for row in rows if term_bucket(row.exam_type) == bucket]
+    percentages = grade_scale().percentages([row.marks for row in rows], [row.total_marks for row in rows])
+
+    totals = {}
+    for row, percentage in zip(rows, percentages):
+        if percentage is None:
+            continue
+        total = totals.setdefault(row.student_id, [0.0, 0])
+        total[0] += percentage
+        total[1] += 1
+
+    students = {
+        student_id: {'student_id': student_id, 'roll_number': roll_number, 'name': name}
+        for student_id, roll_number, name in db.session.execute(
+            select(Student.id, Student.roll_number, User.full_name)
+            .join(User, Student.user_id == User.id)
+            .where(Student.id.in_(list(totals)))
+        )
+    } if totals else {}
+
+    entries = []
+    scores = []
+    for student_id, (total, exams) in totals.items():
+        entry = dict(students[student_id])
+        entry.update({'average': total / exams, 'exams': exams})
+        entries.append(entry)
+        scores.append(total / exams)
+    board = _leaderboard(entries, scores)
+    for entry in board:
+        entry['grade'] = grade_scale().grade(entry['average'])
+    return board
+
+
+def class_rankings(class_id, bucket=None):
+    """Class leaderboard on the average percentage over the term's exams (all exams if no bucket)."""
+    cached = _class_entry(class_id)
+    key = ('term', bucket)
+    if key not in cached:
+        cached[key] = compute_class_rankings(class_id, bucket)
+    return cached[key]
+
@@ -0,0 +1,285 @@
+"""Real-time pushes over the Socket.IO connection every page opens.
+
+Flask-SocketIO is optional: without it (or with ``REALTIME_ENABLED = False``)
+``publish`` does nothing, ``base.html`` opens no connection and pages keep
+working as plain request/response.
+
+A client is authenticated from the Flask-Login session when it connects and
+joins ``user_<id>`` plus the audience rooms announcements are sent to
+(``role_<role>``, and ``class_<id>`` / ``class_none`` for students).
+Controllers call ``publish`` after their commit; call set-up signals from
+the conversation page are relayed the same way, only between users who
+already share a conversation and only with the keys in ``CALL_SIGNALS``.
+Events are fanned out through a bus selected by ``REALTIME_BUS``:
+
+``'sqlite'``  events are appended to a table in a separate SQLite file; a
+              background task in each worker reads new rows every
+              ``REALTIME_POLL_INTERVAL`` seconds and emits them to that
+              worker's clients, so any number of workers deliver without a
+              broker.
+``'memory'``  the same, through an in-process list, for a single process.
+
+Events older than ``REALTIME_EVENT_TTL`` are pruned by whichever worker
+publishes or polls first once ``PRUNE_INTERVAL`` seconds have passed, so the
+bus stays bounded even in workers no client ever connects to.
+"""
+import functools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from flask import request, url_for
+from flask_login import current_user
+
+try:
+    from flask_socketio import SocketIO, join_room
+except ImportError:  # optional dependency; real-time delivery is disabled without it
+    SocketIO = None
+
+from app.services.database import SideDatabase
+
+logger = logging.getLogger(__name__)
+
+BUSES = ('sqlite', 'memory')
+READ_BATCH = 500  # events read from the bus per query
+PRUNE_INTERVAL = 60  # seconds between deletes of expired events
+ANNOUNCEMENT_PREVIEW_CHARS = 200
+# Call set-up messages the conversation page sends to the other participant,
+# with the payload keys that are passed on
+CALL_SIGNALS = {
+    'call_offer': ('sdp', 'media'),
+    'call_answer': ('sdp',),
+    'ice_candidate': ('candidate',),
+    'end_call': (),
+}
+
+
+class SqliteEventStore:
+    def __init__(self, path):
+        self.path = path
+        self._db = SideDatabase(path, [
+            'CREATE TABLE IF NOT EXISTS realtime_events ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' room TEXT NOT NULL,'
+            ' event TEXT NOT NULL,'
+            ' payload TEXT NOT NULL,'
+            ' created REAL NOT NULL)',
+            'CREATE INDEX IF NOT EXISTS ix_realtime_events_created ON realtime_events (created)',
+        ])
+
+    def _connect(self):
+        return self._db.connect()
+
+    def append(self, events, now):
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                'INSERT INTO realtime_events (room, event, payload, created) VALUES (?, ?, ?, ?)',
+                [(room, event, json.dumps(payload), now) for room, event, payload in events],
+            )
+
+    def last_id(self):
+        return self._connect().execute('SELECT COALESCE(MAX(id), 0) FROM realtime_events').fetchone()[0]
+
+    def read_after(self, last_id, limit=READ_BATCH):
+        rows = self._connect().execute(
+            'SELECT id, room, event, payload FROM realtime_events WHERE id > ? ORDER BY id LIMIT ?',
+            (last_id, limit),
+        ).fetchall()
+        return [(event_id, room, event, json.loads(payload)) for event_id, room, event, payload in rows]
+
+    def prune(self, before):
+        return self._connect().execute('DELETE FROM realtime_events WHERE created <= ?', (before,)).rowcount
+
+
+class MemoryEventStore:
+    def __init__(self):
+        self._events = []  # (id, room, event, payload, created)
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def append(self, events, now):
+        with self._lock:
+            for room, event, payload in events:
+                self._events.append((self._next_id, room, event, payload, now))
+                self._next_id += 1
+
+    def last_id(self):
+        with self._lock:
+            return self._next_id - 1
+
+    def read_after(self, last_id, limit=READ_BATCH):
+        with self._lock:
+            newer = [entry[:4] for entry in self._events if entry[0] > last_id]
+        return newer[:limit]
+
+    def prune(self, before):
+        with self._lock:
+            kept = [entry for entry in self._events if entry[4] > before]
+            removed = len(self._events) - len(kept)
+            self._events = kept
+        return removed
+
+
+def user_rooms(user, profile=None):
+    """Rooms a connected user joins; mirrors who can see which announcements."""
+    rooms = [f'user_{user.id}', f'role_{user.role}']
+    if user.role == 'student':
+        class_id = getattr(profile, 'class_id', None)
+        rooms.append(f'class_{class_id}' if class_id else 'class_none')
+    return rooms
+
+
+def announcement_rooms(announcement):
+    """Rooms whose members can see ``announcement`` (see ``announcement_controller.list``)."""
+    # Admins and teachers see every announcement
+    rooms = ['role_admin', 'role_teacher']
+    audience = announcement.audience_role or 'all'
+    if audience in ('all', 'student'):
+        if announcement.class_id:
+            rooms += [f'class_{announcement.class_id}', 'class_none']
+        else:
+            rooms.append('role_student')
+    if audience in ('all', 'parent'):
+        rooms.append('role_parent')
+    return rooms
+
+
+def publish_announcement(announcement, author_name):
+    """Push a committed announcement to everyone who can see it."""
+    payload = {
+        'id': announcement.id,
+        'title': announcement.title,
+        'preview': announcement.content[:ANNOUNCEMENT_PREVIEW_CHARS],
+        'author': author_name,
+        'url': url_for('announcement.list'),
+    }
+    realtime.publish_many([(room, 'announcement', payload) for room in announcement_rooms(announcement)])
+
+
+class RealtimeBus:
+    def __init__(self):
+        self.socketio = None
+        self.store = None
+        self.poll_interval = 0.5
+        self.event_ttl = 300
+        self._poller_pid = None
+        self._poller_lock = threading.Lock()
+        self._last_prune = time.monotonic()
+
+    @property
+    def enabled(self):
+        return self.socketio is not None
+
+    def init_app(self, app):
+        config = app.config
+        config.setdefault('REALTIME_ENABLED', True)
+        config.setdefault('REALTIME_BUS', 'sqlite')
+        config.setdefault('REALTIME_SQLITE_PATH', os.path.join(app.instance_path, 'realtime.db'))
+        config.setdefault('REALTIME_POLL_INTERVAL', self.poll_interval)
+        config.setdefault('REALTIME_EVENT_TTL', self.event_ttl)
+        self.socketio = None
+        self.store = None
+        self._poller_pid = None
+        if not config['REALTIME_ENABLED']:
+            return
+        if SocketIO is None:
+            logger.info('flask_socketio is not installed; real-time delivery is disabled')
+            config['REALTIME_ENABLED'] = False
+            return
+        if config['REALTIME_BUS'] not in BUSES:
+            raise ValueError(f'REALTIME_BUS must be one of {BUSES}')
+
+        if config['REALTIME_BUS'] == 'sqlite':
+            self.store = SqliteEventStore(config['REALTIME_SQLITE_PATH'])
+        else:
+            self.store = MemoryEventStore()
+        self.poll_interval = config['REALTIME_POLL_INTERVAL']
+        self.event_ttl = config['REALTIME_EVENT_TTL']
+        # The Flask session is server-side, so let every event read it through the session interface
+        self.socketio = SocketIO(app, manage_session=False)
+        self._last_prune = time.monotonic()
+        self.socketio.on_event('connect', self._on_connect)
+        for signal in CALL_SIGNALS:
+            self.socketio.on_event(signal, functools.partial(self._relay_signal, signal))
+
+    def _on_connect(self, auth=None):
+        if not current_user.is_authenticated:
+            return False
+        from app.services.identity import get_profile
+        from app.services.messaging import unread_total
+
+        for room in user_rooms(current_user, get_profile()):
+            join_room(room)
+        self._ensure_poller()
+        self.socketio.emit('unread_count', {'count': unread_total(current_user.id)}, to=request.sid)
+
+    def _relay_signal(self, signal, data):
+        if not current_user.is_authenticated or not isinstance(data, dict):
+            return
+        try:
+            recipient_id = int(data.get('to'))
+        except (TypeError, ValueError):
+            return
+        from app.services.messaging import in_conversation
+
+        if recipient_id == current_user.id or not in_conversation(current_user.id, recipient_id):
+            return
+        payload = {key: data[key] for key in CALL_SIGNALS[signal] if key in data}
+        payload['from'] = current_user.id
+        self.publish(f'user_{recipient_id}', signal, payload)
+
+    def publish(self, room, event, payload):
+        self.publish_many([(room, event, payload)])
+
+    def publish_many(self, events):
+        """Queue (room, event, payload) triples for every worker; call after the data is committed."""
+        if not self.enabled or not events:
+            return
+        try:
+            self.store.append(events, time.time())
+            self._prune_if_due()
+        except sqlite3.Error:
+            # A lost push only delays what the next page load shows anyway
+            logger.exception('Could not publish %d real-time events', len(events))
+
+    def _prune_if_due(self):
+        if time.monotonic() - self._last_prune < min(PRUNE_INTERVAL, self.event_ttl):
+            return
+        self._last_prune = time.monotonic()
+        self.store.prune(time.time() - self.event_ttl)
+
+    def _ensure_poller(self):
+        # Started on the first connection so each forked worker gets its own task
+        if self._poller_pid == os.getpid():
+            return
+        with self._poller_lock:
+            if self._poller_pid == os.getpid():
+                return
+            self._poller_pid = os.getpid()
+            self.socketio.start_background_task(self._poll_forever, self.store.last_id())
+
+    def _poll_forever(self, last_id):
+        while True:
+            self.socketio.sleep(self.poll_interval)
+            try:
+                last_id = self.deliver(last_id)
+                self._prune_if_due()
+            except Exception:
+                logger.exception('Real-time delivery failed')
+
+    def deliver(self, last_id):
+        """Emit events newer than ``last_id`` to this worker's clients; returns the new position."""
+        while True:
+            events = self.store.read_after(last_id)
+            for event_id, room, event, payload in events:
+                self.socketio.emit(event, payload, to=room)
+                last_id = event_id
+            if len(events) < READ_BATCH:
+                return last_id
+
+
+realtime = RealtimeBus()
@@ -0,0 +1,125 @@
+"""Size-bounded cache for generated report files (text and PDF).
+
+Keys are built from a student's data version (``services.data_versions``),
+so a cached report is never stale and nothing is invalidated; old versions
+simply age out. ``REPORT_CACHE_BACKEND`` picks where the bytes live:
+
+* ``memory``: a per-worker LRU holding at most ``REPORT_CACHE_MAX_BYTES``.
+* ``disk``: files under ``REPORT_CACHE_DIR`` shared by every worker; the
+  least recently read files are removed once the directory grows past
+  ``REPORT_CACHE_MAX_BYTES``.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+BACKENDS = ('memory', 'disk')
+
+
+class ReportCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.backend = 'memory'
+        self.max_bytes = max_bytes
+        self.directory = None
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def init_app(self, app):
+        app.config.setdefault('REPORT_CACHE_BACKEND', self.backend)
+        app.config.setdefault('REPORT_CACHE_MAX_BYTES', self.max_bytes)
+        app.config.setdefault('REPORT_CACHE_DIR', os.path.join(app.instance_path, 'report_cache'))
+        if app.config['REPORT_CACHE_BACKEND'] not in BACKENDS:
+            raise ValueError(f"REPORT_CACHE_BACKEND must be one of {BACKENDS}")
+        self.backend = app.config['REPORT_CACHE_BACKEND']
+        self.max_bytes = app.config['REPORT_CACHE_MAX_BYTES']
+        self.directory = app.config['REPORT_CACHE_DIR']
+        self.clear()
+
+    @staticmethod
+    def _name(key):
+        return hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def get(self, key):
+        name = self._name(key)
+        if self.backend == 'disk':
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, 'rb') as handle:
+                    data = handle.read()
+                # The modification time doubles as the last-read time for eviction
+                os.utime(path)
+            except FileNotFoundError:
+                return None
+            return data
+        with self._lock:
+            data = self._entries.get(name)
+            if data is not None:
+                self._entries.move_to_end(name)
+            return data
+
+    def set(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        name = self._name(key)
+        if self.backend == 'disk':
+            self._write_file(name, data)
+            self._prune_directory()
+            return
+        with self._lock:
+            previous = self._entries.pop(name, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[name] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def get_or_compute(self, key, compute):
+        data = self.get(key)
+        if data is None:
+            data = compute()
+            self.set(key, data)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _write_file(self, name, data):
+        os.makedirs(self.directory, exist_ok=True)
+        # Write then rename, so other workers never read a partial file
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(handle, 'wb') as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, os.path.join(self.directory, name))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def _prune_directory(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith('.tmp-'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+report_cache = ReportCache()
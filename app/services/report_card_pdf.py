@@ -0,0 +1,81 @@
+"""Render one report card as a PDF with reportlab.
+
+This module only imports reportlab: ``render_report_card`` runs in the
+report-card process pool, and each worker process imports it on its own.
+A payload is the plain dict built by ``report_cards.report_card_payloads``.
+"""
+import io
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+SCHOOL_NAME = 'EduSync'
+
+TERM_COLUMNS = (('term1', 'Term 1'), ('term2', 'Term 2'), ('term3', 'Term 3'), ('final_term', 'Final'))
+
+GRID_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#343a40')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f2f2f2')]),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+])
+
+
+def _percent(value):
+    return '-' if value is None else f'{value:.1f}%'
+
+
+def render_report_card(payload):
+    """PDF bytes for one student's report card."""
+    styles = getSampleStyleSheet()
+    buffer = io.BytesIO()
+    document = SimpleDocTemplate(buffer, pagesize=A4, title=f"Report card - {payload['name']}",
+                                 leftMargin=15 * mm, rightMargin=15 * mm,
+                                 topMargin=15 * mm, bottomMargin=15 * mm)
+
+    attendance = payload['attendance']
+    story = [
+        Paragraph(f'Academic Report Card - {SCHOOL_NAME}', styles['Title']),
+        Table([
+            ['Student Name', payload['name'], 'Student ID', payload['code']],
+            ['Class', payload['class_name'], 'Roll No', payload['roll_number'] or 'N/A'],
+            ['Attendance', f"{attendance['percentage']:.1f}% ({attendance['present']}/{attendance['total']} days)",
+             'Date', payload['date']],
+        ], colWidths=[28 * mm, 62 * mm, 25 * mm, 65 * mm], style=TableStyle([
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ])),
+        Spacer(1, 6 * mm),
+        Paragraph('Grades Summary', styles['Heading2']),
+    ]
+
+    subjects = payload['subjects']
+    if not subjects:
+        story.append(Paragraph('No subjects assigned.', styles['Normal']))
+    else:
+        summary = [['Subject', 'Teacher'] + [label for _, label in TERM_COLUMNS] + ['Average', 'Grade']]
+        for subject in subjects:
+            summary.append([subject['subject'], subject['teacher']]
+                           + [_percent(subject['terms'][key]) for key, _ in TERM_COLUMNS]
+                           + [_percent(subject['average']), subject['grade']])
+        story.append(Table(summary, repeatRows=1, style=GRID_STYLE))
+
+        details = [['Subject', 'Exam', 'Marks', 'Percentage', 'Remarks']]
+        for subject in subjects:
+            for result in subject['results']:
+                total = '' if result['total_marks'] is None else f" / {result['total_marks']:g}"
+                details.append([subject['subject'], result['title'], f"{result['marks']:g}{total}",
+                                _percent(result['percentage']), result['remarks'] or ''])
+        if len(details) > 1:
+            story += [Spacer(1, 6 * mm), Paragraph('Exam Results', styles['Heading2']),
+                      Table(details, repeatRows=1, style=GRID_STYLE)]
+
+    document.build(story)
+    return buffer.getvalue()
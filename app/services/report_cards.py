@@ -0,0 +1,314 @@
+"""Batch PDF report cards for a class or a whole grade level, streamed as a ZIP.
+
+``report_card_payloads`` loads everything the cards show with bulk queries
+(students, attendance totals and ``class_gradebooks``) into plain dicts
+before any rendering starts. ``stream_report_cards`` then renders the PDFs
+in a process pool of ``REPORT_CARD_WORKERS`` processes and writes each one
+into the ZIP as it arrives, so the download starts with the first card.
+
+A card whose payload is unchanged since it was last rendered is served from
+``report_card_cache`` (keyed per student, checked against a digest of the
+payload). Progress for a batch is saved to ``report_jobs`` under a job id the
+client can poll. With ``REPORT_JOBS_BACKEND = 'sqlite'`` (the default) it is
+a table in ``REPORT_JOBS_SQLITE_PATH`` that every worker reads, so a poll
+answered by another worker than the one streaming the ZIP still sees it;
+``'memory'`` keeps it in the worker's own ``TTLCache``.
+"""
+import atexit
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from multiprocessing import get_context
+
+from flask import current_app
+from sqlalchemy import select
+
+from app.models.models import db, Class, Student, User
+from app.services.attendance import attendance_totals
+from app.services.cache import TTLCache
+from app.services.database import SideDatabase
+from app.services.gradebook import class_gradebooks
+from app.services.report_card_pdf import render_report_card
+
+report_card_cache = TTLCache('REPORT_CARD_CACHE', ttl=3600, max_size=2000)
+
+JOB_BACKENDS = ('sqlite', 'memory')
+JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+JOB_SAVE_INTERVAL = 0.5  # seconds between progress writes while rendering
+CHUNK_SIZE = 64 * 1024
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _class_label(name, section):
+    if name is None:
+        return 'Not Assigned'
+    return f'{name}-{section}' if section else name
+
+
+def report_card_payloads(class_ids=None, student_ids=None):
+    """One plain dict per student in ``class_ids`` (or in ``student_ids``), ordered by class, roll number and name."""
+    query = (
+        select(Student.id, Student.student_id, Student.roll_number, Student.class_id,
+               User.full_name, Class.name.label('class_name'), Class.section)
+        .join(User, Student.user_id == User.id)
+        .outerjoin(Class, Student.class_id == Class.id)
+        .order_by(Class.name, Class.section, Student.roll_number, User.full_name)
+    )
+    if class_ids is not None:
+        query = query.where(Student.class_id.in_(list(class_ids)))
+    if student_ids is not None:
+        query = query.where(Student.id.in_(list(student_ids)))
+    students = db.session.execute(query).all()
+    if not students:
+        return []
+    totals = attendance_totals([student.id for student in students])
+    gradebooks = class_gradebooks([(student.id, student.class_id) for student in students])
+    today = date.today().isoformat()
+
+    payloads = []
+    for student in students:
+        attendance = totals[student.id]
+        payloads.append({
+            'student_id': student.id,
+            'code': student.student_id,
+            'name': student.full_name,
+            'roll_number': student.roll_number,
+            'class_name': _class_label(student.class_name, student.section),
+            'date': today,
+            'attendance': {key: attendance[key] for key in ('present', 'total', 'percentage')},
+            'subjects': [
+                {
+                    'subject': entry['subject'],
+                    'teacher': entry['teacher'],
+                    'terms': entry['terms'],
+                    'average': entry['average'],
+                    'grade': entry['grade'].letter,
+                    'results': [
+                        {key: result[key] for key in ('title', 'marks', 'total_marks', 'percentage', 'remarks')}
+                        for result in entry['results']
+                    ],
+                }
+                for entry in gradebooks[student.id]
+            ],
+        })
+    return payloads
+
+
+def payload_digest(payload):
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _executor():
+    """The worker's shared render pool, or None to render in-process."""
+    global _pool
+    workers = current_app.config['REPORT_CARD_WORKERS']
+    if workers <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded web worker can copy held locks into the children
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'))
+            atexit.register(_pool.shutdown, cancel_futures=True)
+        return _pool
+
+
+def render_cards(payloads, job=None):
+    """Yield (payload, pdf bytes) in order, reusing cached cards and rendering the rest in the pool."""
+    cached = {}
+    pending = []
+    for payload in payloads:
+        digest = payload_digest(payload)
+        hit = report_card_cache.get(payload['student_id'])
+        if hit is not None and hit[0] == digest:
+            cached[payload['student_id']] = hit[1]
+        else:
+            pending.append((payload, digest))
+    if job is not None:
+        job.cached = len(cached)
+
+    executor = _executor() if len(pending) > 1 else None
+    if executor is None:
+        rendered = map(render_report_card, (payload for payload, _ in pending))
+    else:
+        chunksize = max(1, len(pending) // (current_app.config['REPORT_CARD_WORKERS'] * 4))
+        rendered = executor.map(render_report_card, [payload for payload, _ in pending], chunksize=chunksize)
+
+    pending = iter(pending)
+    for payload in payloads:
+        pdf = cached.get(payload['student_id'])
+        if pdf is None:
+            _, digest = next(pending)
+            pdf = next(rendered)
+            report_card_cache.set(payload['student_id'], (digest, pdf))
+        if job is not None:
+            job.advance()
+        yield payload, pdf
+
+
+class ReportJobStore:
+    """Batch progress by job id, kept for ``REPORT_JOBS_TTL`` seconds."""
+
+    def __init__(self):
+        self.backend = 'sqlite'
+        self.ttl = 3600
+        self._memory = TTLCache('REPORT_JOBS', ttl=self.ttl, max_size=200)
+        self._db = None
+
+    def init_app(self, app):
+        config = app.config
+        config.setdefault('REPORT_JOBS_BACKEND', self.backend)
+        config.setdefault('REPORT_JOBS_SQLITE_PATH', os.path.join(app.instance_path, 'report_jobs.db'))
+        if config['REPORT_JOBS_BACKEND'] not in JOB_BACKENDS:
+            raise ValueError(f'REPORT_JOBS_BACKEND must be one of {JOB_BACKENDS}')
+        self._memory.init_app(app)
+        self.backend = config['REPORT_JOBS_BACKEND']
+        self.ttl = config['REPORT_JOBS_TTL']
+        self._db = None
+        if self.backend == 'sqlite':
+            self._db = SideDatabase(config['REPORT_JOBS_SQLITE_PATH'], [
+                'CREATE TABLE IF NOT EXISTS report_jobs ('
+                ' id TEXT PRIMARY KEY,'
+                ' state TEXT NOT NULL,'
+                ' expires REAL NOT NULL)',
+                'CREATE INDEX IF NOT EXISTS ix_report_jobs_expires ON report_jobs (expires)',
+            ])
+
+    def get(self, job_id):
+        if self._db is None:
+            return self._memory.get(job_id)
+        row = self._db.connect().execute(
+            'SELECT state FROM report_jobs WHERE id = ? AND expires > ?', (job_id, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, job_id, state):
+        if self._db is None:
+            self._memory.set(job_id, state)
+            return
+        self._db.connect().execute(
+            'INSERT INTO report_jobs (id, state, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET state = excluded.state, expires = excluded.expires',
+            (job_id, json.dumps(state), time.time() + self.ttl),
+        )
+
+    def prune(self):
+        if self._db is not None:
+            self._db.connect().execute('DELETE FROM report_jobs WHERE expires <= ?', (time.time(),))
+
+
+report_jobs = ReportJobStore()
+
+
+class ReportJob:
+    """Progress of one batch; saved to ``report_jobs`` as it advances."""
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = 'loading'
+        self.total = 0
+        self.done = 0
+        self.cached = 0
+        self._saved_at = 0
+
+    def as_dict(self):
+        return {'status': self.status, 'total': self.total, 'done': self.done, 'cached': self.cached}
+
+    def save(self, force=False):
+        now = time.monotonic()
+        if force or now - self._saved_at >= JOB_SAVE_INTERVAL:
+            self._saved_at = now
+            report_jobs.set(self.id, self.as_dict())
+
+    def start(self, total):
+        """The cards are loaded; rendering ``total`` of them starts."""
+        self.status = 'rendering'
+        self.total = total
+        self.save(force=True)
+
+    def advance(self):
+        self.done += 1
+        self.save(force=self.done == self.total)
+
+    def finish(self, status):
+        self.status = status
+        self.save(force=True)
+
+
+def start_job(job_id=None):
+    """Register a batch before its data is loaded; ``job_id`` may come from the client."""
+    if not job_id or not JOB_ID.match(job_id):
+        job_id = uuid.uuid4().hex
+    report_jobs.prune()
+    job = ReportJob(job_id)
+    job.save(force=True)
+    return job
+
+
+def job_progress(job_id):
+    return report_jobs.get(job_id)
+
+
+class _ZipStream:
+    """Write-only file object for ``zipfile`` that hands back what was written."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def _safe_name(text):
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', text).strip('_') or 'unnamed'
+
+
+def _card_name(payload):
+    label = f"{payload['roll_number'] or payload['code']}-{payload['name']}"
+    return f"{_safe_name(payload['class_name'])}/{_safe_name(label)}.pdf"
+
+
+def stream_report_cards(payloads, job=None):
+    """Yield a ZIP of report cards, one entry per payload, in ``CHUNK_SIZE``-ish chunks.
+
+    ``job`` ends as 'done', 'failed', or 'cancelled' when the client drops
+    the download (the generator is closed with ``GeneratorExit``).
+    """
+    stream = _ZipStream()
+    finished = False
+    try:
+        with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for payload, pdf in render_cards(payloads, job):
+                archive.writestr(_card_name(payload), pdf)
+                if len(stream.buffer) >= CHUNK_SIZE:
+                    yield stream.take()
+        # Everything is rendered; a client that disconnects during the last chunk is not a cancellation
+        finished = True
+        if job is not None:
+            job.finish('done')
+        yield stream.take()
+    except GeneratorExit:
+        if job is not None and not finished:
+            job.finish('cancelled')
+        raise
+    except Exception:
+        if job is not None and not finished:
+            job.finish('failed')
+        raise
@@ -0,0 +1,153 @@
+"""Import an exam's marks from an uploaded XLSX or CSV file.
+
+The file needs a header row with ``student_id`` and ``marks`` columns
+(``remarks`` is optional, other columns such as a name are ignored).
+Rows are read one at a time, with openpyxl's ``read_only`` mode for XLSX
+and the csv module for CSV, and validated in chunks of ``CHUNK_ROWS``:
+
+* student IDs (the ``Student.student_id`` code) are resolved with one
+  query per chunk and must belong to the exam's class;
+* marks go through ``gradebook.parse_marks`` against ``Exam.total_marks``;
+* a student listed twice keeps the first row.
+
+Only the validated ``{student_id: (marks, remarks)}`` entries are kept, and
+they are written by one ``save_results`` upsert. Rows that fail validation
+are skipped and listed in the report with their row number.
+"""
+import csv
+import io
+import os
+
+from sqlalchemy import select
+
+from app.models.models import db, Student
+from app.services.gradebook import count_outcomes, parse_marks, save_results
+
+IMPORT_EXTENSIONS = ('csv', 'xlsx')
+CHUNK_ROWS = 1000
+# The report lists this many errors; the rest are only counted
+MAX_REPORTED_ERRORS = 500
+
+REQUIRED_COLUMNS = ('student_id', 'marks')
+
+
+class ImportFileError(ValueError):
+    """The upload cannot be read as a results file at all."""
+
+
+def _column_name(value):
+    return str(value or '').strip().lower().replace(' ', '_')
+
+
+def _cell_text(value):
+    # Spreadsheets turn numeric IDs into floats (1001 -> 1001.0)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return '' if value is None else str(value).strip()
+
+
+def _xlsx_rows(stream):
+    from openpyxl import load_workbook
+    from openpyxl.utils.exceptions import InvalidFileException
+    from zipfile import BadZipFile
+
+    try:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+    except (InvalidFileException, BadZipFile, KeyError) as exc:
+        raise ImportFileError('The file is not a valid XLSX workbook.') from exc
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _csv_rows(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.reader(text)
+    except UnicodeDecodeError as exc:
+        raise ImportFileError('The CSV file must be UTF-8 encoded.') from exc
+    finally:
+        text.detach()
+
+
+def read_rows(stream, filename):
+    """Yield (row_number, {'student_id', 'marks', 'remarks'}) for each non-blank data row."""
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if extension not in IMPORT_EXTENSIONS:
+        raise ImportFileError('Upload a .csv or .xlsx file.')
+    rows = _xlsx_rows(stream) if extension == 'xlsx' else _csv_rows(stream)
+
+    columns = None
+    for row_number, row in enumerate(rows, start=1):
+        if columns is None:
+            names = [_column_name(value) for value in row]
+            missing = [name for name in REQUIRED_COLUMNS if name not in names]
+            if missing:
+                raise ImportFileError(f"The header row must include {', '.join(missing)}.")
+            columns = {name: names.index(name) for name in REQUIRED_COLUMNS + ('remarks',) if name in names}
+            continue
+        values = {name: (row[index] if index < len(row) else None) for name, index in columns.items()}
+        if all(_cell_text(value) == '' for value in values.values()):
+            continue
+        values.setdefault('remarks', None)
+        yield row_number, values
+    if columns is None:
+        raise ImportFileError('The file is empty.')
+
+
+def _validate_chunk(exam, chunk, entries, report):
+    codes = {_cell_text(values['student_id']) for _, values in chunk}
+    students = {
+        code: (student_id, class_id)
+        for code, student_id, class_id in db.session.execute(
+            select(Student.student_id, Student.id, Student.class_id).where(Student.student_id.in_(codes))
+        )
+    }
+    for row_number, values in chunk:
+        code = _cell_text(values['student_id'])
+        error = None
+        if not code:
+            error = 'missing student ID'
+        elif code not in students:
+            error = 'unknown student ID'
+        elif students[code][1] != exam.class_id:
+            error = "student is not in this exam's class"
+        elif students[code][0] in entries:
+            error = 'student appears more than once; the first row was used'
+        else:
+            marks, error = parse_marks(exam, values['marks'])
+            if error is None and marks is None:
+                error = 'missing marks'
+        if error:
+            report['error_count'] += 1
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'].append({'row': row_number, 'student_id': code, 'error': error})
+            continue
+        remarks = _cell_text(values['remarks'])[:200]
+        entries[students[code][0]] = (marks, remarks)
+
+
+def validate_results_file(exam, stream, filename):
+    """Parse and validate an upload; returns (entries, report) without writing anything.
+
+    Raises :class:`ImportFileError` when the file itself is unreadable.
+    """
+    entries = {}
+    report = {'rows': 0, 'valid': 0, 'error_count': 0, 'errors': []}
+    chunk = []
+    for row in read_rows(stream, filename):
+        report['rows'] += 1
+        chunk.append(row)
+        if len(chunk) >= CHUNK_ROWS:
+            _validate_chunk(exam, chunk, entries, report)
+            chunk = []
+    if chunk:
+        _validate_chunk(exam, chunk, entries, report)
+    report['valid'] = len(entries)
+    return entries, report
+
+
+def import_results(exam, entries):
+    """Upsert validated entries without committing; returns the inserted/changed/unchanged counts."""
+    return count_outcomes(save_results(exam, entries))
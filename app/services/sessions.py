@@ -0,0 +1,250 @@
+"""Server-side session backends selectable through ``SESSION_TYPE``.
+
+``'sqlite'``  sessions live in one table (indexed on expiry) in a separate
+              SQLite file, so they never contend with the main database.
+``'memory'``  a bounded in-process LRU, for single-process development.
+
+Any other value is handed to Flask-Session unchanged (e.g. ``'filesystem'``).
+
+Both stores skip the write when a request did not modify the session; the
+expiry is only pushed forward once every ``SESSION_TOUCH_INTERVAL`` seconds.
+A daemon thread per worker deletes expired sessions every
+``SESSION_SWEEP_INTERVAL`` seconds.
+"""
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from flask_session import Session
+from flask_session.sessions import ServerSideSession, SessionInterface
+from itsdangerous import BadSignature, want_bytes
+
+from app.services.database import SideDatabase
+
+logger = logging.getLogger(__name__)
+
+
+class StoredSession(ServerSideSession):
+    def __init__(self, initial=None, sid=None, permanent=None, stored_expiry=None):
+        ServerSideSession.__init__(self, initial, sid=sid, permanent=permanent)
+        # Expiry currently recorded in the store; None for a new session
+        self.stored_expiry = stored_expiry
+
+
+class SqliteSessionStore:
+    def __init__(self, path):
+        self.path = path
+        self._db = SideDatabase(path, [
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            ' sid TEXT PRIMARY KEY,'
+            ' data BLOB NOT NULL,'
+            ' expiry REAL NOT NULL)',
+            'CREATE INDEX IF NOT EXISTS ix_sessions_expiry ON sessions (expiry)',
+        ])
+
+    def _connect(self):
+        return self._db.connect()
+
+    def get(self, key, now):
+        row = self._connect().execute(
+            'SELECT data, expiry FROM sessions WHERE sid = ? AND expiry > ?', (key, now)
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def set(self, key, data, expiry):
+        self._connect().execute(
+            'INSERT INTO sessions (sid, data, expiry) VALUES (?, ?, ?) '
+            'ON CONFLICT(sid) DO UPDATE SET data = excluded.data, expiry = excluded.expiry',
+            (key, data, expiry),
+        )
+
+    def touch(self, key, expiry):
+        self._connect().execute('UPDATE sessions SET expiry = ? WHERE sid = ?', (expiry, key))
+
+    def delete(self, key):
+        self._connect().execute('DELETE FROM sessions WHERE sid = ?', (key,))
+
+    def sweep(self, now, batch_size=1000):
+        # Small batches keep each write transaction short
+        conn = self._connect()
+        removed = 0
+        while True:
+            deleted = conn.execute(
+                'DELETE FROM sessions WHERE sid IN '
+                '(SELECT sid FROM sessions WHERE expiry <= ? LIMIT ?)',
+                (now, batch_size),
+            ).rowcount
+            removed += deleted
+            if deleted < batch_size:
+                return removed
+
+
+class MemorySessionStore:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, data, expiry):
+        with self._lock:
+            self._entries[key] = (data, expiry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def touch(self, key, expiry):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], expiry)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def sweep(self, now):
+        with self._lock:
+            expired = [key for key, (_, expiry) in self._entries.items() if expiry <= now]
+            for key in expired:
+                del self._entries[key]
+        return len(expired)
+
+
+class StoreSessionInterface(SessionInterface):
+    """Flask session interface on top of one of the stores above."""
+
+    serializer = pickle
+    session_class = StoredSession
+
+    def __init__(self, store, key_prefix, use_signer=False, permanent=True,
+                 touch_interval=3600, sweep_interval=600):
+        self.store = store
+        self.key_prefix = key_prefix
+        self.use_signer = use_signer
+        self.permanent = permanent
+        self.touch_interval = touch_interval
+        self.sweep_interval = sweep_interval
+        self._sweeper_pid = None
+        self._sweeper_lock = threading.Lock()
+
+    def open_session(self, app, request):
+        self._ensure_sweeper()
+        sid = request.cookies.get(app.config['SESSION_COOKIE_NAME'])
+        if not sid:
+            return self.session_class(sid=self._generate_sid(), permanent=self.permanent)
+        if self.use_signer:
+            signer = self._get_signer(app)
+            if signer is None:
+                return None
+            try:
+                sid = signer.unsign(sid).decode()
+            except BadSignature:
+                return self.session_class(sid=self._generate_sid(), permanent=self.permanent)
+
+        stored = self.store.get(self.key_prefix + sid, time.time())
+        if stored is not None:
+            try:
+                data = self.serializer.loads(stored[0])
+                return self.session_class(data, sid=sid, stored_expiry=stored[1])
+            except Exception:
+                logger.warning('Discarding unreadable session %s', sid)
+        return self.session_class(sid=sid, permanent=self.permanent)
+
+    def save_session(self, app, session, response):
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        key = self.key_prefix + session.sid
+
+        if not session:
+            if session.modified:
+                self.store.delete(key)
+                response.delete_cookie(app.config['SESSION_COOKIE_NAME'], domain=domain, path=path)
+            return
+
+        now = time.time()
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        expiry = now + lifetime
+
+        if not session.modified and session.stored_expiry is not None:
+            # Nothing changed: leave the row (and the cookie) alone unless the
+            # expiry is due to slide forward.
+            if expiry - session.stored_expiry < self.touch_interval:
+                return
+            self.store.touch(key, expiry)
+        else:
+            self.store.set(key, self.serializer.dumps(dict(session)), expiry)
+
+        if self.use_signer:
+            session_id = self._get_signer(app).sign(want_bytes(session.sid)).decode()
+        else:
+            session_id = session.sid
+        response.set_cookie(
+            app.config['SESSION_COOKIE_NAME'], session_id,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain, path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def _ensure_sweeper(self):
+        # Started lazily so each forked worker gets its own thread
+        if self._sweeper_pid == os.getpid() or self.sweep_interval <= 0:
+            return
+        with self._sweeper_lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+            thread = threading.Thread(target=self._sweep_forever, name='session-sweeper', daemon=True)
+            thread.start()
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                removed = self.store.sweep(time.time())
+                if removed:
+                    logger.info('Removed %d expired sessions', removed)
+            except Exception:
+                logger.exception('Session sweep failed')
+
+
+def init_sessions(app):
+    """Install the session backend named by ``SESSION_TYPE``."""
+    config = app.config
+    config.setdefault('SESSION_TOUCH_INTERVAL', 3600)
+    config.setdefault('SESSION_SWEEP_INTERVAL', 600)
+    config.setdefault('SESSION_MEMORY_MAX_ENTRIES', 10000)
+    session_type = config.get('SESSION_TYPE')
+
+    if session_type == 'sqlite':
+        store = SqliteSessionStore(config['SESSION_SQLITE_PATH'])
+    elif session_type == 'memory':
+        store = MemorySessionStore(config['SESSION_MEMORY_MAX_ENTRIES'])
+    else:
+        Session(app)
+        return app.session_interface
+
+    app.session_interface = StoreSessionInterface(
+        store,
+        key_prefix=config.get('SESSION_KEY_PREFIX', 'session:'),
+        use_signer=config.get('SESSION_USE_SIGNER', False),
+        permanent=config.get('SESSION_PERMANENT', True),
+        touch_interval=config['SESSION_TOUCH_INTERVAL'],
+        sweep_interval=config['SESSION_SWEEP_INTERVAL'],
+    )
+    return app.session_interface
